@@ -0,0 +1,218 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+
+from fake_vehicle import FakeVehicle, FAKE_CAPACITY_MAH
+from sim_data import OffloadingMethod, load_sim_data, save_sim_data_npz, validate_data_json_file
+import sim_drone_workload
+from workload_model import WorkloadGenerator, WorkloadMode
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA_DIR = os.path.join(REPO_DIR, "final_jsons")
+
+# Simulation data files in the pair format (the simulation_*.json files use an older layout)
+DATA_FILES = ["all_data.json", "full.json", "onboard.json", "partial.json"]
+
+# Scaling parameters: mission length in simulated seconds and number of drones in one process
+MISSION_LENGTHS_S = [600, 3600, 14400]
+DRONE_COUNTS = [1, 4, 16]
+
+
+def measure(run : Callable[[], None], ops : int, repeat : int) -> Dict[str, float]:
+    '''
+    Time a benchmark body, printing is redirected so the simulation logs do not dominate the timings
+
+    :param run: Benchmark body, performs ops operations per call
+    :type: Callable[[], None]
+    :param ops: Number of operations per call of run
+    :type: int
+    :param repeat: Number of timed calls
+    :type: int
+    :return: Best and median time of a call and the best time per operation
+    :rtype: Dict[str, float]
+    '''
+    times = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+    best = min(times)
+    return {"ops": ops, "repeat": repeat, "best_s": best, "median_s": statistics.median(times), "per_op_us": best / ops * 1e6}
+
+
+def bench_get_current_cpu_util(sim_data, ops : int, repeat : int) -> Dict[str, float]:
+    vehicle = FakeVehicle(sim_data, OffloadingMethod.PARTIAL_OFFLOAD)
+
+    def run():
+        for _ in range(ops):
+            vehicle.get_current_cpu_util()
+
+    return measure(run, ops, repeat)
+
+
+def bench_get_js_for_util(sim_data, ops : int, repeat : int) -> Dict[str, float]:
+    vehicle = FakeVehicle(sim_data, OffloadingMethod.PARTIAL_OFFLOAD)
+    battery = vehicle._custom_battery
+    cpu_utils = np.random.default_rng(0).uniform(0, 100, ops).tolist()
+
+    def run():
+        for cpu_util in cpu_utils:
+            battery.get_js_for_util(cpu_util, 0)
+
+    return measure(run, ops, repeat)
+
+
+def bench_sample_battery(sim_data, ops : int, repeat : int, workload_mode : WorkloadMode = WorkloadMode.TRACE) -> Dict[str, float]:
+    vehicle = FakeVehicle(sim_data, OffloadingMethod.PARTIAL_OFFLOAD, workload_mode=workload_mode)
+
+    def run():
+        for _ in range(ops):
+            vehicle.heartbeat()
+
+    return measure(run, ops, repeat)
+
+
+def bench_workload_generate(sim_data, ops : int, repeat : int) -> Dict[str, float]:
+    # Markov bins of a whole replay (energy_replay.py/monte_carlo.py --workload markov), fresh generator per call
+    model = sim_data["pair_1"].workload_model()
+    rng = np.random.default_rng(0)
+    return measure(lambda: WorkloadGenerator(model, rng).generate(ops), ops, repeat)
+
+
+def bench_load_validate(data_path : str, repeat : int) -> Dict[str, float]:
+    # Parsing and full validation, without the validation cache of load_sim_data
+    def run():
+        with open(data_path, 'r') as data_file:
+            validate_data_json_file(json.load(data_file))
+
+    return measure(run, 1, repeat)
+
+
+def bench_load_npz(sim_data, repeat : int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        npz_path = os.path.join(tmp_dir, "sim_data.npz")
+        save_sim_data_npz(sim_data, npz_path)
+        return measure(lambda: load_sim_data(npz_path), 1, repeat)
+
+
+def bench_update_graph(sim_data, samples : int, repeat : int) -> Dict[str, float]:
+    vehicle = FakeVehicle(sim_data, OffloadingMethod.PARTIAL_OFFLOAD)
+    rng = np.random.default_rng(0)
+    battery_percents = np.linspace(100, 50, samples)
+    cpu_utils = rng.uniform(0, 100, samples)
+
+    sim_drone_workload.vehicle = vehicle
+    sim_drone_workload.renderer = None
+    sim_drone_workload.graph_min_interval = 0
+
+    # First frame creates the figure
+    sim_drone_workload._update_graph(battery_percents[:1], cpu_utils[:1])
+
+    return measure(lambda: sim_drone_workload._update_graph(battery_percents, cpu_utils), 1, repeat)
+
+
+def bench_mission(sim_data, mission_s : int, drones : int, repeat : int) -> Dict[str, float]:
+    def run():
+        vehicles = [FakeVehicle(sim_data, OffloadingMethod.PARTIAL_OFFLOAD, drone_idx, FAKE_CAPACITY_MAH * 100) for drone_idx in range(drones)]
+        for _ in range(mission_s):
+            for vehicle in vehicles:
+                vehicle.heartbeat()
+
+    return measure(run, mission_s * drones, repeat)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmarks(quick : bool = False, only : List[str] = None) -> Dict[str, Any]:
+    '''
+    Run every benchmark
+
+    :param quick: Use fewer operations and repeats (smoke test)
+    :type: bool
+    :param only: Names of the benchmarks to run, all if not provided
+    :type: List[str]
+    :return: Metadata and results (one entry per benchmark and parameter set)
+    :rtype: Dict[str, Any]
+    '''
+    ops = 2000 if quick else 20000
+    repeat = 3 if quick else 7
+    mission_lengths = MISSION_LENGTHS_S[:1] if quick else MISSION_LENGTHS_S
+    drone_counts = DRONE_COUNTS[:2] if quick else DRONE_COUNTS
+
+    sim_data = load_sim_data(os.path.join(DATA_DIR, "partial.json"))
+
+    benchmarks = [
+        ("get_current_cpu_util", {}, lambda: bench_get_current_cpu_util(sim_data, ops, repeat)),
+        ("get_js_for_util", {}, lambda: bench_get_js_for_util(sim_data, ops, repeat)),
+        ("sample_battery", {}, lambda: bench_sample_battery(sim_data, ops, repeat)),
+        ("sample_battery_markov", {}, lambda: bench_sample_battery(sim_data, ops, repeat, WorkloadMode.MARKOV)),
+        ("workload_generate", {}, lambda: bench_workload_generate(sim_data, ops * 10, repeat)),
+        ("load_npz", {}, lambda: bench_load_npz(sim_data, repeat)),
+    ]
+    for data_file in DATA_FILES:
+        benchmarks.append(("load_validate_json", {"file": data_file},
+                           lambda data_file=data_file: bench_load_validate(os.path.join(DATA_DIR, data_file), repeat)))
+    for mission_s in mission_lengths:
+        benchmarks.append(("update_graph", {"samples": mission_s}, lambda mission_s=mission_s: bench_update_graph(sim_data, mission_s, repeat)))
+        for drones in drone_counts:
+            benchmarks.append(("mission", {"mission_s": mission_s, "drones": drones},
+                               lambda mission_s=mission_s, drones=drones: bench_mission(sim_data, mission_s, drones, 1 if quick else 3)))
+
+    results = []
+    for name, params, bench in benchmarks:
+        if only is not None and name not in only:
+            continue
+        result = bench()
+        results.append({"name": name, "params": params, **result})
+        params_str = ", ".join(f"{key}={value}" for key, value in params.items())
+        print(f"{name}({params_str}): {result['per_op_us']:.2f} us/op, best {result['best_s'] * 1000:.2f} ms")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "machine": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmarks the energy simulation hot paths offline with a fake vehicle (no SITL)")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="JSON file the results are written to")
+    parser.add_argument("--quick", action="store_true", help="Fewer operations and repeats, for a fast smoke test")
+    parser.add_argument("--only", type=str, nargs='+', default=None, help="Names of the benchmarks to run")
+
+    args = parser.parse_args()
+
+    bench_results = run_benchmarks(args.quick, args.only)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(bench_results, output_file, indent=4)
+    print(f"Results saved to {args.output}")
@@ -0,0 +1,150 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Set
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CLI_PATH = os.path.join(REPO_DIR, "src", "league_sim.py")
+DATA_PATH = os.path.join(REPO_DIR, "final_jsons", "all_data.json")
+
+# Top level packages that make up most of the startup time (or need a display)
+HEAVY_MODULES = ["numpy", "matplotlib", "PyQt5", "dronekit", "pymavlink", "geopy"]
+
+
+def imported_modules(command : List[str], env : Dict[str, str]) -> Set[str]:
+    '''
+    Top level packages imported by a command, from the -X importtime report (PYTHONPROFILEIMPORTTIME also reaches the
+    scripts the CLI replaces itself with)
+
+    :param command: Command line
+    :type: List[str]
+    :param env: Environment of the command
+    :type: Dict[str, str]
+    :return: Names of the imported top level packages
+    :rtype: Set[str]
+    '''
+    process = subprocess.run(command, env={**env, "PYTHONPROFILEIMPORTTIME": "1"}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        modules.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+def bench_command(name : str, command : List[str], allowed_heavy : List[str], repeat : int, env : Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Time a command from process start to exit and check that it only imports the allowed heavy packages
+
+    :param name: Benchmark name
+    :type: str
+    :param command: Command line
+    :type: List[str]
+    :param allowed_heavy: Heavy packages the subcommand needs
+    :type: List[str]
+    :param repeat: Number of timed runs
+    :type: int
+    :param env: Environment of the command
+    :type: Dict[str, str]
+    :return: Benchmark result (bench_energy.py format, one operation per run)
+    :rtype: Dict[str, Any]
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+
+    heavy = sorted(module for module in imported_modules(command, env) if module in HEAVY_MODULES)
+    unexpected = [module for module in heavy if module not in allowed_heavy]
+
+    best = min(times)
+    return {"name": name, "params": {"args": " ".join(command[2:])}, "ops": 1, "repeat": repeat, "best_s": best,
+            "median_s": statistics.median(times), "per_op_us": best * 1e6, "heavy_modules": heavy, "unexpected_modules": unexpected}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmarks(repeat : int, tmp_dir : str) -> Dict[str, Any]:
+    '''
+    Time the startup of every subcommand
+
+    :param repeat: Number of timed runs per command
+    :type: int
+    :param tmp_dir: Directory the converted data file is written to
+    :type: str
+    :return: Metadata and results
+    :rtype: Dict[str, Any]
+    '''
+    env = dict(os.environ)
+    npz_path = os.path.join(tmp_dir, "all_data.npz")
+
+    # Subcommands and the heavy packages they may import
+    commands = [
+        ("help", ["--help"], []),
+        ("validate_json", ["validate", DATA_PATH], []),
+        ("convert", ["convert", DATA_PATH, npz_path], ["numpy"]),
+        ("validate_npz", ["validate", npz_path], ["numpy"]),
+        ("launch_help", ["launch", "--help"], []),
+        ("world_help", ["world", "--help"], []),
+        ("simulate_help", ["simulate", "--help"], ["numpy"]),
+        ("sweep_help", ["sweep", "--help"], ["numpy"]),
+        ("fly_help", ["fly", "--help"], HEAVY_MODULES),
+    ]
+
+    # Interpreter startup alone, the floor of every command
+    benchmarks = [("python", [sys.executable, "-c", "pass"], [])]
+    benchmarks += [(name, [sys.executable, CLI_PATH] + cli_args, allowed_heavy) for name, cli_args, allowed_heavy in commands]
+
+    results = []
+    for name, command, allowed_heavy in benchmarks:
+        result = bench_command(name, command, allowed_heavy, repeat, env)
+        results.append(result)
+
+        marker = f"  UNEXPECTED {', '.join(result['unexpected_modules'])}" if len(result["unexpected_modules"]) > 0 else ""
+        print(f"{name}: best {result['best_s'] * 1000:.1f} ms, median {result['median_s'] * 1000:.1f} ms, "
+              f"heavy imports: {', '.join(result['heavy_modules']) or 'none'}{marker}")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Times the startup of every league_sim.py subcommand and checks which heavy packages it imports")
+    parser.add_argument("--output", type=str, default="startup_results.json", help="JSON file the results are written to (compare.py format)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per command")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench_results = run_benchmarks(args.repeat, tmp_dir)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(bench_results, output_file, indent=4)
+    print(f"Results saved to {args.output}")
+
+    if any(len(result["unexpected_modules"]) > 0 for result in bench_results["results"]):
+        print("A subcommand imported a heavy package it does not need!")
+        exit(1)
@@ -0,0 +1,47 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import json
+from typing import Any, Dict, Tuple
+
+
+def result_key(result : Dict[str, Any]) -> Tuple[str, str]:
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compares two benchmark result files (bench_energy.py --output)")
+    parser.add_argument("baseline_path", type=str, help="Results of the baseline commit")
+    parser.add_argument("current_path", type=str, help="Results of the commit to compare")
+    parser.add_argument("--threshold", type=float, default=1.10, help="Time ratio above which a benchmark counts as a regression")
+
+    args = parser.parse_args()
+
+    with open(args.baseline_path, 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current_path, 'r') as current_file:
+        current = json.load(current_file)
+
+    print(f"Baseline {baseline['meta']['commit'][:10]} vs current {current['meta']['commit'][:10]}")
+
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    regressions = 0
+
+    for result in current["results"]:
+        base_result = baseline_results.get(result_key(result))
+        if base_result is None:
+            continue
+
+        ratio = result["per_op_us"] / base_result["per_op_us"]
+        marker = ""
+        if ratio > args.threshold:
+            marker = "  REGRESSION"
+            regressions += 1
+
+        params_str = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['name']}({params_str}): {base_result['per_op_us']:.2f} -> {result['per_op_us']:.2f} us/op ({ratio:.2f}x){marker}")
+
+    if regressions > 0:
+        print(f"{regressions} regressions above {args.threshold:.2f}x")
+        exit(1)
@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import dronekit as dk
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from energy_vehicle import EnergyVehicle
+from custom_battery import CustomBattery
+from message_store import MessageStore
+from sim_clock import SimClock
+from sim_data import OffloadingMethod, PairData
+from telemetry_buffer import TelemetryBuffer
+from workload_model import WorkloadMode
+
+# Battery reported by the fake vehicle (dk.Battery takes the voltage in mV)
+FAKE_VOLTAGE_MV = 12600
+FAKE_CAPACITY_MAH = 5000
+
+
+class FakeVehicle(EnergyVehicle):
+    '''
+    EnergyVehicle without a MAVLink connection. dk.Vehicle.__init__ is skipped, only the state used by the
+    energy simulation is set up, so the simulation methods run unchanged without SITL.
+    '''
+
+    # Static battery and location instead of the dk.Vehicle properties backed by MAVLink messages
+    battery = dk.Battery(FAKE_VOLTAGE_MV, 0, 100)
+    location = SimpleNamespace(global_relative_frame=dk.LocationGlobalRelative(-35.363261, 149.165230, 20))
+
+    def __init__(self, sim_data : Dict[str, PairData], offloading_method : OffloadingMethod, drone_idx : int = 0,
+                 capacity_mah : int = FAKE_CAPACITY_MAH, seed : Optional[int] = 0, workload_mode : WorkloadMode = WorkloadMode.TRACE):
+        '''
+        Initialize the FakeVehicle object (same attributes as EnergyVehicle.__init__ without the listeners)
+
+        :param sim_data: Loaded simulation data
+        :type: Dict[str, PairData]
+        :param offloading_method: Offloading method used for the simulation
+        :type: OffloadingMethod
+        :param drone_idx: Index of the drone
+        :type: int
+        :param capacity_mah: Battery capacity in mAh
+        :type: int
+        :param seed: Seed of the noise stream (fixed by default so benchmark runs draw the same noise)
+        :type: Optional[int]
+        :param workload_mode: Replay the recorded bin orderings or generate bins from the Markov models
+        :type: WorkloadMode
+        '''
+        self.messages_dict = MessageStore()
+        self.queue_method = None
+        self.battery_depleted_callback = lambda: None
+        self.sim_clock = SimClock()
+        self._curr_pair_idx = 0
+        self._curr_bin_idx = 0
+        self._video_data_pairs = []
+        self.telemetry = TelemetryBuffer()
+        self.recorder = None
+        self.publisher = None
+        self._energy_lock = threading.Lock()
+
+        self._custom_battery = CustomBattery(self.battery, capacity_mah)
+        self.set_sim_data(sim_data, offloading_method, drone_idx, seed, workload_mode)
+
+        # Vehicle time in ms, advanced by heartbeat()
+        self.time_boot_ms = 0
+        self.sim_clock.observe(self.time_boot_ms)
+
+    def heartbeat(self, elapsed_ms : int = 1000):
+        '''
+        Advance the vehicle time and run the energy worker body synchronously
+
+        :param elapsed_ms: Vehicle time since the previous heartbeat in ms
+        :type: int
+        '''
+        self.time_boot_ms += elapsed_ms
+        self.sim_clock.observe(self.time_boot_ms)
+        self.sample_battery()
@@ -0,0 +1,241 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from sim_data import compact_pair_dict, compile_pair, save_sim_data_npz, validate_data_json_file
+
+# Number of equal width CPU utilization bins per pair
+CPU_BIN_COUNT = 10
+
+# Degree of the CPU utilization -> wattage regression
+REGRESSION_DEGREE = 1
+
+# One wattage std per integer CPU utilization (0-99)
+POLY_STD_COUNT = 100
+
+# Trace columns, the first two columns are used if the trace has no header with these names
+CPU_UTIL_COLUMN = "cpu_util"
+WATTS_COLUMN = "watts"
+
+
+@dataclass
+class CalibrationJob:
+    '''
+    Calibration of a single pair from one trace file, executed by one worker process
+    '''
+
+    name : str
+    trace_path : str
+    bin_count : int
+    degree : int
+
+
+def load_trace(trace_path : str) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Load a per-second CSV trace of CPU utilization (percent) and power (watts)
+
+    :param trace_path: Path of the CSV trace
+    :type: str
+    :return: CPU utilizations and wattages, rows with missing values are dropped
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    '''
+
+    with open(trace_path, 'r') as trace_file:
+        header = [column.strip() for column in trace_file.readline().split(',')]
+
+    try:
+        columns = (header.index(CPU_UTIL_COLUMN), header.index(WATTS_COLUMN))
+        skip_rows = 1
+    except ValueError:
+        # No named header, the first line is a header only if it is not numeric
+        columns = (0, 1)
+        try:
+            [float(value) for value in header[:2]]
+            skip_rows = 0
+        except ValueError:
+            skip_rows = 1
+
+    trace = np.loadtxt(trace_path, delimiter=',', skiprows=skip_rows, usecols=columns, ndmin=2)
+    trace = trace[~np.isnan(trace).any(axis=1)]
+    return trace[:, 0], trace[:, 1]
+
+
+def bin_cpu_utils(cpu_utils : np.ndarray, bin_count : int = CPU_BIN_COUNT) -> Tuple[np.ndarray, Dict[str, Dict[str, Any]]]:
+    '''
+    Split the CPU utilizations into equal width bins between their minimum and maximum
+
+    :param cpu_utils: Per-second CPU utilizations
+    :type: np.ndarray
+    :param bin_count: Number of bins
+    :type: int
+    :return: Per-second bin index and the statistics of every non-empty bin (keys in order of first appearance)
+    :rtype: Tuple[np.ndarray, Dict[str, Dict[str, Any]]]
+    '''
+
+    edges = np.linspace(cpu_utils.min(), cpu_utils.max(), bin_count + 1)
+    bin_ordering = np.clip(np.searchsorted(edges, cpu_utils, side='right') - 1, 0, bin_count - 1)
+
+    bin_n = np.bincount(bin_ordering, minlength=bin_count)
+    bin_sums = np.bincount(bin_ordering, weights=cpu_utils, minlength=bin_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bin_means = bin_sums / bin_n
+        deviations = cpu_utils - bin_means[bin_ordering]
+        bin_stds = np.sqrt(np.bincount(bin_ordering, weights=deviations * deviations, minlength=bin_count) / bin_n)
+
+    _, first_seen = np.unique(bin_ordering, return_index=True)
+    bins_in_order = bin_ordering[np.sort(first_seen)]
+
+    cpu_bins = {str(bin_idx): {"mean": float(bin_means[bin_idx]), "std": float(bin_stds[bin_idx]), "n": int(bin_n[bin_idx])}
+                for bin_idx in bins_in_order.tolist()}
+    return bin_ordering, cpu_bins
+
+
+def fit_regression(cpu_utils : np.ndarray, watts : np.ndarray, degree : int = REGRESSION_DEGREE,
+                   std_count : int = POLY_STD_COUNT) -> Dict[str, Any]:
+    '''
+    Fit the CPU utilization -> wattage polynomial and the residual std of every integer CPU utilization.
+    Utilizations with less than 2 samples get the std interpolated from their neighbours.
+
+    :param cpu_utils: Per-second CPU utilizations
+    :type: np.ndarray
+    :param watts: Per-second wattages
+    :type: np.ndarray
+    :param degree: Degree of the polynomial
+    :type: int
+    :param std_count: Number of integer CPU utilizations to compute a std for
+    :type: int
+    :return: Regression dictionary ("coefs", "poly_stds" and "r_2")
+    :rtype: Dict[str, Any]
+    '''
+
+    coefs = np.polyfit(cpu_utils, watts, degree)
+    residuals = watts - np.polyval(coefs, cpu_utils)
+
+    total_variance = np.sum((watts - watts.mean()) ** 2)
+    r_2 = 1 - np.sum(residuals ** 2) / total_variance if total_variance > 0 else 1.0
+
+    std_idx = np.clip(cpu_utils.astype(np.int64), 0, std_count - 1)
+    std_n = np.bincount(std_idx, minlength=std_count)
+    std_sums = np.bincount(std_idx, weights=residuals, minlength=std_count)
+    std_sq_sums = np.bincount(std_idx, weights=residuals * residuals, minlength=std_count)
+
+    known = std_n > 1
+    if not known.any():
+        poly_stds = np.full(std_count, residuals.std())
+    else:
+        known_means = std_sums[known] / std_n[known]
+        known_stds = np.sqrt(np.maximum(std_sq_sums[known] / std_n[known] - known_means * known_means, 0))
+        poly_stds = np.interp(np.arange(std_count), np.flatnonzero(known), known_stds)
+
+    return {"coefs": coefs.tolist(), "poly_stds": poly_stds.tolist(), "r_2": float(r_2)}
+
+
+def calibrate_pair(job : CalibrationJob) -> Dict[str, Any]:
+    '''
+    Build the pair dictionary of the simulation data JSON from a trace
+
+    :param job: Calibration to run
+    :type: CalibrationJob
+    :return: Pair dictionary containing "bin_ordering", "cpu_bins" and "regression"
+    :rtype: Dict[str, Any]
+    '''
+
+    cpu_utils, watts = load_trace(job.trace_path)
+    if len(cpu_utils) <= job.degree:
+        raise ValueError(f"{job.trace_path} has {len(cpu_utils)} samples, at least {job.degree + 1} are required")
+
+    bin_ordering, cpu_bins = bin_cpu_utils(cpu_utils, job.bin_count)
+
+    return {
+        "bin_ordering": bin_ordering.tolist(),
+        "cpu_bins": cpu_bins,
+        "regression": fit_regression(cpu_utils, watts, job.degree),
+    }
+
+
+def calibrate(trace_paths : Dict[str, str], bin_count : int = CPU_BIN_COUNT, degree : int = REGRESSION_DEGREE,
+              workers : Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    '''
+    Calibrate every pair from its trace on all CPU cores
+
+    :param trace_paths: Trace path of every pair, by pair name
+    :type: Dict[str, str]
+    :param bin_count: Number of CPU bins per pair
+    :type: int
+    :param degree: Degree of the regression polynomial
+    :type: int
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :type: Optional[int]
+    :return: Simulation data dictionary (same format as the final_jsons files)
+    :rtype: Dict[str, Dict[str, Any]]
+    '''
+
+    jobs = [CalibrationJob(name, trace_path, bin_count, degree) for name, trace_path in trace_paths.items()]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pair_dicts = list(executor.map(calibrate_pair, jobs))
+
+    return {job.name: pair_dict for job, pair_dict in zip(jobs, pair_dicts)}
+
+
+def parse_trace_args(trace_args : List[str]) -> Dict[str, str]:
+    '''
+    Parse "name=path" trace arguments, the pair name defaults to the file name without extension
+
+    :param trace_args: Trace arguments
+    :type: List[str]
+    :return: Trace path of every pair, by pair name
+    :rtype: Dict[str, str]
+    '''
+    trace_paths = {}
+    for trace_arg in trace_args:
+        name, sep, trace_path = trace_arg.partition('=')
+        if sep == '':
+            trace_path = trace_arg
+            name = os.path.splitext(os.path.basename(trace_arg))[0]
+        trace_paths[name] = trace_path
+    return trace_paths
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generates a simulation data file (CPU bins, bin ordering and regression) from raw per-second traces")
+    parser.add_argument("output_path", type=str, help="The path of the simulation data file to create (.json, or .npz for the binary format)")
+    parser.add_argument("traces", type=str, nargs='+', help="CSV traces with cpu_util and watts columns, as name=path (the name defaults to the file name)")
+    parser.add_argument("--bins", type=int, default=CPU_BIN_COUNT, help="Number of equal width CPU bins per pair")
+    parser.add_argument("--degree", type=int, default=REGRESSION_DEGREE, help="Degree of the CPU utilization -> wattage regression")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (defaults to the CPU count)")
+    parser.add_argument("--model-only", action="store_true", help="Store the Markov workload model of every pair instead of its bin ordering")
+
+    args = parser.parse_args()
+
+    trace_paths = parse_trace_args(args.traces)
+    for trace_path in trace_paths.values():
+        if not os.path.exists(trace_path):
+            print(f"{trace_path} does not exist!")
+            exit(1)
+
+    start_time = time.time()
+    sim_data = calibrate(trace_paths, args.bins, args.degree, args.workers)
+
+    if not validate_data_json_file(sim_data):
+        print("Generated simulation data is not valid!")
+        exit(1)
+
+    if args.output_path.endswith(".npz"):
+        save_sim_data_npz({name: compile_pair(name, pair_dict) for name, pair_dict in sim_data.items()}, args.output_path,
+                          model_only=args.model_only)
+    else:
+        output_data = {name: compact_pair_dict(pair_dict) for name, pair_dict in sim_data.items()} if args.model_only else sim_data
+        with open(args.output_path, 'w') as output_file:
+            json.dump(output_data, output_file, indent=4)
+
+    print(f"Calibrated {len(sim_data)} pairs in {time.time() - start_time:.2f} s, saved to {args.output_path}")
+    for name, pair_dict in sim_data.items():
+        print(f"{name}: {len(pair_dict['bin_ordering'])} samples, {len(pair_dict['cpu_bins'])} bins, r^2 {pair_dict['regression']['r_2']:.3f}")
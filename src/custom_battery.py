@@ -1,7 +1,9 @@
 import dronekit as dk
-from typing import Dict, List
+from typing import Dict, List, Optional
 import numpy as np
-import random
+from noise_source import NoiseSource
+from power_model import POLY_STD_ODDS, PowerModel
+from sim_data import PairData
 
 
 class CustomBattery(dk.Battery):
@@ -26,7 +28,54 @@ class CustomBattery(dk.Battery):
         self._max_cap_j = 0
         
         self._all_data_lin_reg_params : Dict[str, float] = {}
-        self.pairs_lin_reg_params : List[Dict[str, float]] = []
+        self._pairs_lin_reg_params : List[Dict[str, float]] = []
+
+        # Regressions compiled when pairs_lin_reg_params is assigned (None for invalid regressions)
+        self._power_models : List[Optional[PowerModel]] = []
+
+        # Random stream of the poly std noise (replaced by the vehicle with its seeded stream)
+        self.noise = NoiseSource()
+
+    @property
+    def pairs_lin_reg_params(self) -> List[Dict[str, float]]:
+        '''
+        Linear regression parameters ("coefs", "poly_stds", "r_2") for every pair
+        '''
+        return self._pairs_lin_reg_params
+
+    @pairs_lin_reg_params.setter
+    def pairs_lin_reg_params(self, lin_reg_params : List[Dict[str, float]]):
+        '''
+        Set the linear regression parameters and compile them into power models
+
+        :param lin_reg_params: Linear regression dictionary for every pair
+        :type: List[Dict[str, float]]
+        '''
+        self._pairs_lin_reg_params = lin_reg_params
+
+        self._power_models = []
+        for lin_reg in lin_reg_params:
+            try:
+                self._power_models.append(PowerModel.from_regression(lin_reg))
+            except KeyError:
+                self._power_models.append(None)
+
+    @property
+    def power_models(self) -> List[Optional[PowerModel]]:
+        '''
+        Compiled power model for every pair (None for invalid regressions)
+        '''
+        return self._power_models
+
+    def set_pair_data(self, pairs : List[PairData]):
+        '''
+        Set the regressions from array backed pairs, the coefficient arrays are used as is
+
+        :param pairs: Pairs to take the regressions from
+        :type: List[PairData]
+        '''
+        self._pairs_lin_reg_params = [{"coefs": pair.coefs, "poly_stds": pair.poly_stds, "r_2": pair.r_2} for pair in pairs]
+        self._power_models = [PowerModel.from_pair(pair) for pair in pairs]
 
     def update_cap_mah(self, battery_cap_mah : int):
         '''
@@ -69,28 +118,49 @@ class CustomBattery(dk.Battery):
         :rtype: float
         '''
         try:
-            curr_lin_reg = self.pairs_lin_reg_params[pair_idx]
+            power_model = self._power_models[pair_idx]
         except IndexError:
             return 0
-        
-        try:
-            reg_coefs = curr_lin_reg["coefs"]
-            regression = np.poly1d(reg_coefs)
 
-            reg_watts = regression(cpu_utilization)
+        if power_model is None:
+            return 0
 
-            # Add poly stds
-            rand_poly_std_watt = 0
-            if random.randint(0, 10) == 5:
-                reg_poly_stds = curr_lin_reg["poly_stds"]
-                cpu_std_idx = int(cpu_utilization) if cpu_utilization < 100 else 99
-                rand_poly_std_watt = np.random.normal(0, reg_poly_stds[cpu_std_idx])
+        reg_watts = power_model.base_watts(cpu_utilization)
 
-                print(f"    {reg_watts:.2f} + {rand_poly_std_watt:.2f} = {reg_watts + rand_poly_std_watt:.2f} W")
+        # Add poly stds
+        rand_poly_std_watt = 0
+        if self.noise.uniform() < POLY_STD_ODDS:
+            rand_poly_std_watt = self.noise.normal(0, power_model.poly_std(cpu_utilization))
 
-            return reg_watts + rand_poly_std_watt
-        except KeyError:
-            return 0
+            print(f"    {reg_watts:.2f} + {rand_poly_std_watt:.2f} = {reg_watts + rand_poly_std_watt:.2f} W")
+
+        return reg_watts + rand_poly_std_watt
+
+    def get_js_for_utils(self, cpu_utilizations : np.ndarray, pair_idx : int, rng : Optional[np.random.Generator] = None,
+                         out : Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        Get the Joules/second (Wattage) consumption for an array of CPU utilizations and a pair
+
+        :param cpu_utilizations: CPU utilizations to get the Joules/second consumption for
+        :type: np.ndarray
+        :param pair_idx: Index of the pair to get the regression parameters for
+        :type: int
+        :param rng: Random generator for the poly std noise, no noise is added if not provided
+        :type: Optional[np.random.Generator]
+        :param out: Optional array to write the consumptions to
+        :type: Optional[np.ndarray]
+        :return: Joules/second consumption for every CPU utilization
+        :rtype: np.ndarray
+        '''
+        power_model = self._power_models[pair_idx] if 0 <= pair_idx < len(self._power_models) else None
+
+        if power_model is None:
+            if out is None:
+                return np.zeros(np.shape(cpu_utilizations))
+            out.fill(0)
+            return out
+
+        return power_model.watts_batch(cpu_utilizations, rng, out)
 
     def update(self, battery : dk.Battery):
         '''
@@ -0,0 +1,351 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import mmap
+import time
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Every DataFlash message starts with these two bytes followed by the message type
+HEAD1 = 0xA3
+HEAD2 = 0x95
+HEADER_LEN = 3
+
+# FMT messages describe every other message type and have a fixed layout
+FMT_TYPE = 128
+FMT_LEN = 89
+
+# DataFlash format characters to NumPy types (little endian, packed)
+FORMAT_DTYPES = {
+    'a': ('<i2', (32,)),
+    'b': 'i1',
+    'B': 'u1',
+    'h': '<i2',
+    'H': '<u2',
+    'i': '<i4',
+    'I': '<u4',
+    'f': '<f4',
+    'd': '<f8',
+    'n': 'S4',
+    'N': 'S16',
+    'Z': 'S64',
+    'c': '<i2',
+    'C': '<u2',
+    'e': '<i4',
+    'E': '<u4',
+    'L': '<i4',
+    'M': 'u1',
+    'q': '<i8',
+    'Q': '<u8',
+}
+
+# Format characters stored as scaled integers (centi-units and 1e-7 degrees)
+FORMAT_SCALES = {'c': 0.01, 'C': 0.01, 'e': 0.01, 'E': 0.01, 'L': 1.0e-7}
+
+# Messages decoded per fancy indexing pass, bounds the temporary index array
+DECODE_BATCH = 1 << 20
+
+
+@dataclass
+class DataFlashFormat:
+    '''
+    Message format defined by a FMT message
+    '''
+
+    type_id : int
+    length : int
+    name : str
+    format : str
+    columns : List[str]
+
+    def dtype(self, scaled : bool = False) -> Optional[np.dtype]:
+        '''
+        Structured dtype of the message payload
+
+        :param scaled: Use float64 for the scaled format characters instead of their raw integer type
+        :type: bool
+        :return: Packed dtype, None if the format is not supported or does not match the message length
+        :rtype: Optional[np.dtype]
+        '''
+        if len(self.format) != len(self.columns) or any(char not in FORMAT_DTYPES for char in self.format):
+            return None
+
+        fields = []
+        for char, column in zip(self.format, self.columns):
+            if scaled and char in FORMAT_SCALES:
+                fields.append((column, '<f8'))
+            else:
+                fields.append((column,) + ((FORMAT_DTYPES[char],) if isinstance(FORMAT_DTYPES[char], str) else FORMAT_DTYPES[char]))
+
+        try:
+            dtype = np.dtype(fields)
+        except (TypeError, ValueError):
+            # Duplicate or empty column names
+            return None
+
+        if not scaled and dtype.itemsize != self.length - HEADER_LEN:
+            return None
+        return dtype
+
+
+class DataFlashLog:
+    '''
+    ArduPilot DataFlash (.BIN) log backed by a memory map.
+    Message boundaries are indexed once for the whole file with array operations,
+    message types are then decoded straight into NumPy structured arrays.
+    '''
+
+    def __init__(self, path : str):
+        '''
+        Initialize the DataFlashLog object and index the log
+
+        :param path: Path of the .BIN log
+        :type: str
+        '''
+        self.path = path
+
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data = np.frombuffer(self._mmap, dtype=np.uint8)
+
+        self.formats : Dict[str, DataFlashFormat] = {}
+        self._formats_by_id : Dict[int, DataFlashFormat] = {}
+
+        # Offset of every message (sorted) and its type
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.types = np.zeros(0, dtype=np.uint8)
+
+        self._index()
+
+    def __enter__(self) -> 'DataFlashLog':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        Release the memory map. Arrays returned by messages() are copies and stay valid
+        '''
+        if self._mmap is None:
+            return
+        self._data = None
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+
+    def message_counts(self) -> Dict[str, int]:
+        '''
+        Number of messages of every type in the log
+
+        :return: Message counts by name
+        :rtype: Dict[str, int]
+        '''
+        type_counts = np.bincount(self.types, minlength=256)
+        return {fmt.name: int(type_counts[type_id]) for type_id, fmt in self._formats_by_id.items() if type_counts[type_id] > 0}
+
+    def messages(self, name : str, scaled : bool = True) -> np.ndarray:
+        '''
+        Decode every message of a type
+
+        :param name: Message name (e.g. BAT, CURR, POWR, GPS, PM)
+        :type: str
+        :param scaled: Convert the scaled integer fields (centi-units, 1e-7 degrees) to float64
+        :type: bool
+        :return: Structured array with one field per column (empty if the type is not in the log)
+        :rtype: np.ndarray
+        '''
+        fmt = self.formats.get(name)
+        if fmt is None:
+            return np.zeros(0)
+
+        raw_dtype = fmt.dtype()
+        if raw_dtype is None:
+            raise ValueError(f"Unsupported format {fmt.format} for message {name}")
+
+        msg_offsets = self.offsets[self.types == fmt.type_id]
+        # A message cut short at the end of the log cannot be decoded
+        msg_offsets = msg_offsets[msg_offsets + fmt.length <= len(self._data)]
+
+        payload_len = fmt.length - HEADER_LEN
+        raw = np.empty(len(msg_offsets), dtype=raw_dtype)
+        raw_bytes = raw.view(np.uint8).reshape(len(msg_offsets), payload_len)
+
+        payload_range = np.arange(HEADER_LEN, fmt.length)
+        for batch_start in range(0, len(msg_offsets), DECODE_BATCH):
+            batch_offsets = msg_offsets[batch_start:batch_start + DECODE_BATCH]
+            raw_bytes[batch_start:batch_start + len(batch_offsets)] = self._data[batch_offsets[:, None] + payload_range]
+
+        if not scaled:
+            return raw
+
+        result = np.empty(len(raw), dtype=fmt.dtype(scaled=True))
+        for char, column in zip(fmt.format, fmt.columns):
+            if char in FORMAT_SCALES:
+                result[column] = raw[column] * FORMAT_SCALES[char]
+            else:
+                result[column] = raw[column]
+        return result
+
+    def _index(self):
+        '''
+        Find every message boundary. Header byte pairs inside payloads are rejected by only keeping
+        the chain of messages that starts at the first header (each message ends where the next begins).
+        '''
+        data = self._data
+        if len(data) < HEADER_LEN:
+            return
+
+        candidates = np.flatnonzero((data[:-2] == HEAD1) & (data[1:-1] == HEAD2)).astype(np.int64)
+        if len(candidates) == 0:
+            return
+
+        self._read_formats(candidates)
+
+        lengths = np.zeros(256, dtype=np.int64)
+        for type_id, fmt in self._formats_by_id.items():
+            lengths[type_id] = fmt.length
+
+        candidate_lengths = lengths[data[candidates + 2]]
+        known = candidate_lengths > 0
+        candidates = candidates[known]
+        candidate_lengths = candidate_lengths[known]
+
+        next_idx, depth = _chain_links(candidates, candidate_lengths)
+
+        offsets = []
+        segment_start = 0
+        while segment_start < len(candidates):
+            segment = _walk_chain(next_idx, depth, segment_start)
+
+            # Single messages after a corrupted region are header bytes in garbage data
+            if len(segment) > 1 or len(offsets) == 0:
+                offsets.append(candidates[segment])
+
+            # Resume after a corrupted region at the first header past the end of the last message
+            chain_end = candidates[segment[-1]] + candidate_lengths[segment[-1]]
+            segment_start = int(np.searchsorted(candidates, max(chain_end, candidates[segment_start] + 1)))
+
+        self.offsets = np.concatenate(offsets)
+        self.types = data[self.offsets + 2]
+
+    def _read_formats(self, candidates : np.ndarray):
+        '''
+        Decode the FMT messages (first definition of every type wins)
+
+        :param candidates: Offsets of every header byte pair
+        :type: np.ndarray
+        '''
+        data = self._data
+        fmt_offsets = candidates[(data[candidates + 2] == FMT_TYPE) & (candidates + FMT_LEN <= len(data))]
+
+        fmt_dtype = np.dtype([("type", "u1"), ("length", "u1"), ("name", "S4"), ("format", "S16"), ("columns", "S64")])
+        fmt_records = data[fmt_offsets[:, None] + np.arange(HEADER_LEN, FMT_LEN)].copy().view(fmt_dtype).ravel()
+
+        for record in fmt_records:
+            try:
+                name = record["name"].decode("ascii")
+                format_str = record["format"].decode("ascii")
+                columns = record["columns"].decode("ascii").split(",")
+            except UnicodeDecodeError:
+                continue
+
+            type_id, length = int(record["type"]), int(record["length"])
+            if type_id in self._formats_by_id or length < HEADER_LEN or not name.isprintable():
+                continue
+
+            fmt = DataFlashFormat(type_id, length, name, format_str, columns)
+            if type_id != FMT_TYPE and fmt.dtype() is None:
+                continue
+
+            self._formats_by_id[type_id] = fmt
+            self.formats.setdefault(name, fmt)
+
+
+def _chain_links(candidates : np.ndarray, candidate_lengths : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Link every candidate to the candidate where its message ends and rank the resulting chains
+
+    :param candidates: Sorted header offsets
+    :type: np.ndarray
+    :param candidate_lengths: Message length of every candidate
+    :type: np.ndarray
+    :return: Index of the next candidate (self for the last message of a chain) and the number of messages after every candidate
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    '''
+    count = len(candidates)
+    ends = candidates + candidate_lengths
+
+    next_idx = np.searchsorted(candidates, ends)
+    has_next = next_idx < count
+    has_next[has_next] = candidates[next_idx[has_next]] == ends[has_next]
+    next_idx = np.where(has_next, next_idx, np.arange(count))
+
+    # Pointer jumping list ranking, log2(chain length) passes
+    depth = has_next.astype(np.int64)
+    jump = next_idx
+    while True:
+        jump_next = jump[jump]
+        if np.array_equal(jump_next, jump):
+            break
+        depth = depth + depth[jump]
+        jump = jump_next
+
+    return next_idx, depth
+
+
+def _walk_chain(next_idx : np.ndarray, depth : np.ndarray, start : int) -> np.ndarray:
+    '''
+    Get the candidates on the chain start -> next -> next ... with array operations.
+    Step t of the chain is reached by composing the power of two jumps of the bits of t.
+
+    :param next_idx: Index of the next candidate (see _chain_links)
+    :type: np.ndarray
+    :param depth: Number of messages after every candidate (see _chain_links)
+    :type: np.ndarray
+    :param start: Index of the first candidate of the chain
+    :type: int
+    :return: Indices (into the candidates) of the chain, in order
+    :rtype: np.ndarray
+    '''
+    chain_len = int(depth[start]) + 1
+    steps = np.arange(chain_len)
+    chain = np.full(chain_len, start, dtype=np.int64)
+
+    jump = next_idx
+    bit = 0
+    while (1 << bit) < chain_len:
+        use_jump = (steps >> bit) & 1 == 1
+        chain[use_jump] = jump[chain[use_jump]]
+        jump = jump[jump]
+        bit += 1
+
+    return chain
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Decodes message types from an ArduPilot DataFlash (.BIN) log")
+    parser.add_argument("log_path", type=str, help="The path of the .BIN log")
+    parser.add_argument("--types", type=str, nargs='+', default=["BAT", "CURR", "POWR", "GPS", "PM"], help="Message types to decode")
+
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    with DataFlashLog(args.log_path) as log:
+        index_time = time.perf_counter() - start_time
+        print(f"Indexed {len(log.offsets)} messages ({len(log.formats)} formats) in {index_time * 1000:.1f} ms")
+
+        for msg_name in args.types:
+            decode_start = time.perf_counter()
+            msgs = log.messages(msg_name)
+            decode_ms = (time.perf_counter() - decode_start) * 1000
+            print(f"{msg_name}: {len(msgs)} messages decoded in {decode_ms:.2f} ms")
+
+        bat_msgs = log.messages("BAT")
+        if len(bat_msgs) > 1:
+            duration_s = (bat_msgs["TimeUS"][-1] - bat_msgs["TimeUS"][0]) / 1.0e6
+            mean_watts = float(np.mean(bat_msgs["Volt"] * bat_msgs["Curr"]))
+            print(f"Battery: {duration_s:.1f} s, {bat_msgs['Volt'][0]:.2f} V -> {bat_msgs['Volt'][-1]:.2f} V, "
+                  f"{bat_msgs['CurrTot'][-1]:.1f} mAh used, mean power {mean_watts:.2f} W")
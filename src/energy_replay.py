@@ -0,0 +1,167 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import time
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional
+from sim_data import PairData, load_sim_data
+from power_model import PowerModel
+from workload_model import WorkloadGenerator, WorkloadMode
+
+# Nominal voltage of a fully charged 3S LiPo, used when no vehicle voltage is available
+DEFAULT_VOLTAGE = 12.6
+
+
+@dataclass
+class ReplayResult:
+    '''
+    Trajectory generated by an offline energy replay. Index i holds the values for simulation step i
+    '''
+
+    cpu_utils : np.ndarray
+    watts : np.ndarray
+    capacity_j : np.ndarray
+    battery_percents : np.ndarray
+
+    # First step where the battery capacity reached 0 (None if the battery outlasted the replay)
+    depletion_step : Optional[int]
+
+
+def sample_cpu_utils(pair : PairData, bin_indices : np.ndarray, rng : np.random.Generator, trials : Optional[int] = None) -> np.ndarray:
+    '''
+    Generate CPU utilizations for a sequence of CPU bins (vectorized EnergyVehicle.get_current_cpu_util)
+
+    :param pair: Pair to take the CPU bin statistics from
+    :type: PairData
+    :param bin_indices: CPU bin for every step
+    :type: np.ndarray
+    :param rng: Random generator used for the bin noise
+    :type: np.random.Generator
+    :param trials: If set, generate an independent row of CPU utilizations for each of the trials
+    :type: Optional[int]
+    :return: Generated CPU utilizations, clipped to [0, 100]
+    :rtype: np.ndarray
+    '''
+
+    size = None if trials is None else (trials, len(bin_indices))
+    cpu_utils = rng.normal(pair.bin_means[bin_indices], pair.bin_stds[bin_indices], size=size)
+    return np.clip(cpu_utils, 0, 100, out=cpu_utils)
+
+
+def sample_watts(pair : PairData, cpu_utils : np.ndarray, rng : np.random.Generator) -> np.ndarray:
+    '''
+    Generate the wattage for every CPU utilization (vectorized CustomBattery.get_js_for_util)
+
+    :param pair: Pair to take the regression parameters from
+    :type: PairData
+    :param cpu_utils: CPU utilizations to get the wattage for
+    :type: np.ndarray
+    :param rng: Random generator used for the poly std noise
+    :type: np.random.Generator
+    :return: Joules/second consumption for every CPU utilization
+    :rtype: np.ndarray
+    '''
+
+    return PowerModel.from_pair(pair).watts_batch(cpu_utils, rng)
+
+
+def replay_pair(pair : PairData, capacity_mah : float, voltage : float = DEFAULT_VOLTAGE, num_steps : Optional[int] = None,
+                step_s : float = 1.0, start_bin_idx : int = 0, rng : Optional[np.random.Generator] = None,
+                workload_mode : WorkloadMode = WorkloadMode.TRACE) -> ReplayResult:
+    '''
+    Compute the CPU utilization, wattage and battery trajectory for a pair without a vehicle.
+    Each step corresponds to one entry of the bin ordering (one HEARTBEAT in the live simulation),
+    the ordering wraps around when the replay is longer than the pair. In the Markov workload mode
+    (or for pairs stored without a bin ordering) the bins are generated from the workload model instead.
+
+    :param pair: Pair to replay
+    :type: PairData
+    :param capacity_mah: Initial battery capacity in mAh
+    :type: float
+    :param voltage: Battery voltage used to convert mAh to Joules
+    :type: float
+    :param num_steps: Number of steps to simulate (defaults to the length of the bin ordering)
+    :type: Optional[int]
+    :param step_s: Duration of one step in seconds
+    :type: float
+    :param start_bin_idx: Index in the bin ordering to start from
+    :type: int
+    :param rng: Random generator (a fresh unseeded generator is used if not provided)
+    :type: Optional[np.random.Generator]
+    :param workload_mode: Replay the recorded bin ordering or generate bins from the Markov model of the pair
+    :type: WorkloadMode
+    :return: Generated trajectory
+    :rtype: ReplayResult
+    '''
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    ordering_len = len(pair.bin_ordering)
+    if num_steps is None:
+        num_steps = pair.length
+
+    if pair.length == 0 or num_steps == 0:
+        empty = np.zeros(0)
+        return ReplayResult(empty, empty, empty, empty, None)
+
+    if workload_mode == WorkloadMode.MARKOV or ordering_len == 0:
+        bin_indices = WorkloadGenerator(pair.workload_model(), rng).generate(num_steps)
+    else:
+        bin_indices = pair.bin_ordering[(start_bin_idx + np.arange(num_steps)) % ordering_len]
+
+    cpu_utils = sample_cpu_utils(pair, bin_indices, rng)
+    watts = sample_watts(pair, cpu_utils, rng)
+
+    # Same conversion as CustomBattery._joules
+    initial_capacity_j = voltage * capacity_mah * 3.6
+    capacity_j = initial_capacity_j - np.cumsum(watts * step_s)
+    battery_percents = capacity_j / initial_capacity_j * 100
+
+    depleted = np.flatnonzero(capacity_j <= 0)
+    depletion_step = int(depleted[0]) if len(depleted) > 0 else None
+
+    return ReplayResult(cpu_utils, watts, capacity_j, battery_percents, depletion_step)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replays the energy simulation for a pair offline (no vehicle or SITL required)")
+    parser.add_argument("data_json_path", type=str, help="The path to the json (or converted .npz) file containing simulation data")
+    parser.add_argument("--pair", type=str, default="all_data", help="The pair (JSON key) to replay")
+    parser.add_argument("--capacity-mah", type=float, default=1000, help="Initial battery capacity in mAh")
+    parser.add_argument("--voltage", type=float, default=DEFAULT_VOLTAGE, help="Battery voltage used to convert mAh to Joules")
+    parser.add_argument("--steps", type=int, default=None, help="Number of 1 second steps to simulate (defaults to the pair length)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the random generator")
+    parser.add_argument("--workload", type=str, default="trace", choices=[mode.value for mode in WorkloadMode], help="Replay the recorded bin ordering ('trace') or generate bins from the Markov model of the pair ('markov')")
+    parser.add_argument("--output", type=str, default=None, help="Optional .npz file to save the trajectory to")
+
+    args = parser.parse_args()
+
+    sim_data = load_sim_data(args.data_json_path)
+    if sim_data is None:
+        print("Data JSON file is not valid!")
+        exit(1)
+
+    if args.pair not in sim_data:
+        print(f"Pair {args.pair} is not in {args.data_json_path}! Options are: {', '.join(sim_data.keys())}")
+        exit(1)
+
+    replay_pair_data = sim_data[args.pair]
+
+    start_time = time.perf_counter()
+    result = replay_pair(replay_pair_data, args.capacity_mah, args.voltage, args.steps, rng=np.random.default_rng(args.seed),
+                         workload_mode=WorkloadMode(args.workload))
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    print(f"Replayed {len(result.watts)} steps of {args.pair} in {elapsed_ms:.2f} ms")
+    print(f"Mean CPU utilization: {result.cpu_utils.mean():.2f}%, mean power: {result.watts.mean():.2f} W")
+    print(f"Final battery: {result.capacity_j[-1]:.2f} J ({result.battery_percents[-1]:.2f}%)")
+    if result.depletion_step is not None:
+        print(f"Battery depleted after {result.depletion_step} steps")
+
+    if args.output is not None:
+        np.savez(args.output, cpu_utils=result.cpu_utils, watts=result.watts,
+                 capacity_j=result.capacity_j, battery_percents=result.battery_percents)
+        print(f"Saved trajectory to {args.output}")
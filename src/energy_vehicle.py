@@ -1,22 +1,27 @@
 import dronekit as dk
 import numpy as np
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Union
 from pymavlink.dialects.v20.ardupilotmega import MAVLink_message
 from custom_battery import CustomBattery
-from enum import Enum
-import os, signal
-import time
+from sim_data import OffloadingMethod, PairData, compile_pair
+from message_store import MessageStore
+from telemetry_buffer import TelemetryBuffer
+from telemetry_recorder import TelemetryRecorder
+from shared_telemetry import TelemetryPublisher
+from stream_config import StreamConfig, apply_stream_config
+from sim_clock import SimClock
+from noise_source import NoiseSource
+from workload_model import WorkloadGenerator, WorkloadMode
+import instrumentation
+import os, signal, threading, time
+from event_queue import BoundedEventQueue, EventWorker
+
+# Maximum number of HEARTBEAT events waiting for the energy worker (later ones are coalesced)
+ENERGY_QUEUE_SIZE = 8
 
 #matplotlib.use('TkAgg')
 # HERELINK_TELEM
 
-class OffloadingMethod(Enum):
-    NONE = "none"
-    ONBOARD = "onboard"
-    PARTIAL_OFFLOAD = "partial"
-    FULL_OFFLOAD = "full"
-
-
 class EnergyVehicle(dk.Vehicle):
     '''
     Vehicle class with CPU Workload Energy Simulation Capabilities
@@ -26,61 +31,100 @@ class EnergyVehicle(dk.Vehicle):
     def __init__(self, *args):
         super(EnergyVehicle, self).__init__(*args)
 
-        # Collected MAVLink Messages
-        self.messages_dict : Dict[str, List[MAVLink_message]] = {}
+        # Collected MAVLink Messages (bounded per message type)
+        self.messages_dict : MessageStore = MessageStore()
 
-        # Method to queue the generated CPU and battery data
-        self.queue_method : Optional[Callable[[List[float], List[float]]]] = None
+        # Method to queue the index range [start, stop) of new samples in the telemetry buffer
+        self.queue_method : Optional[Callable[[int, int], None]] = None
+
+        # Called when the simulated battery is depleted (the process receives SIGUSR1 if not set)
+        self.battery_depleted_callback : Optional[Callable[[], None]] = None
 
         # Custom Battery object
         self._custom_battery : Optional[CustomBattery] = None
 
-        # Last time (in seconds) the workload was sampled
-        self._last_sample_time : int = 0
+        # Vehicle time (time_boot_ms) driven clock, energy is integrated in fixed steps of simulated time
+        self.sim_clock = SimClock()
 
+        # Random stream of the CPU utilization and power noise (seeded per drone in set_sim_data)
+        self.noise = NoiseSource()
 
         self._curr_pair_idx = 0
         self._curr_bin_idx = 0
-        self._video_data_pairs : List[Dict[str, Any]] = []
+        self._video_data_pairs : List[PairData] = []
+
+        # Markov generated bins of the current pair (None when the recorded bin ordering is replayed)
+        self.workload_mode = WorkloadMode.TRACE
+        self._workload : Optional[WorkloadGenerator] = None
+        self._workload_bin = 0
 
 
         # Generated data for graphing
-        self._graph_battery_percents : List[float] = []
-        self._graph_cpu_utils : List[float] = []
+        self.telemetry = TelemetryBuffer()
+
+        # Optional on-disk recorder of every energy sample
+        self.recorder : Optional[TelemetryRecorder] = None
+
+        # Optional shared memory ring every energy sample is published to (read by fleet_dashboard.py)
+        self.publisher : Optional[TelemetryPublisher] = None
+
+        # The energy simulation runs on its own worker thread, the receive thread only posts HEARTBEAT events.
+        # Events arriving while the queue is full are coalesced: the clock catches up on every missed step anyway.
+        self._energy_lock = threading.Lock()
+        self.energy_events = BoundedEventQueue(ENERGY_QUEUE_SIZE, merge=lambda queued_event, event: event)
+        self.energy_worker = EventWorker("energy-worker", self.energy_events, self._handle_energy_events)
+        self.energy_worker.start()
         
 
-        # Message listener. Collects all messages for future analysis
-        @self.on_message('*')
+        # Message listener. Collects all messages for future analysis (only the configured types, see configure_streams)
+        @instrumentation.timed("listener")
         def listener(self, name, message : MAVLink_message):
-            msg_type : str = message.get_type()
-            self.messages_dict[msg_type] = self.messages_dict.get(msg_type, []) + [message]
+            self.messages_dict.add(message)
+
+            # SYSTEM_TIME, ATTITUDE, GLOBAL_POSITION_INT, etc. carry the vehicle time since boot
+            time_boot_ms = getattr(message, 'time_boot_ms', None)
+            if time_boot_ms is not None:
+                self.sim_clock.observe(time_boot_ms)
 
+        # Per type message rates, only registered when instrumentation is enabled
+        def count_listener(self, name, message : MAVLink_message):
+            instrumentation.count_message(name)
+
+        self._collect_listeners = [listener]
+        if instrumentation.is_enabled():
+            self._collect_listeners.append(count_listener)
+        self._listened_types = ['*']
+        for listener_fn in self._collect_listeners:
+            self.add_message_listener('*', listener_fn)
 
         @self.on_message('HEARTBEAT')
+        @instrumentation.timed("beat_heart")
         def beat_heart(self, name : str,  message : MAVLink_message):
             '''
-            HEARTBEAT message listener. Used to sample the CPU workload and battery.
-            Expected to send 1 time per second (1 Hz), should work either way
+            HEARTBEAT message listener. Triggers the CPU workload and battery sampling on the energy worker.
+            Expected to send 1 time per second (1 Hz), should work either way (samples follow the vehicle time)
             '''
-            self.sample_battery()
-
-            self._last_sample_time = time.time()
+            self.energy_events.put(name)
 
         @self.on_attribute('battery')
+        @instrumentation.timed("main_battery_callback")
         def main_battery_callback(self, attr_name : str, value : dk.Battery):
             '''
             Drone battery updated callback. Used to update the custom battery object with external battery data
             '''
-            if self._custom_battery is None:
-                # 1,000 mAh default capacity
-                self._custom_battery = CustomBattery(value, 1000)
+            # Runs on the receive thread, the energy worker and set_sim_data use the battery concurrently
+            with self._energy_lock:
+                if self._custom_battery is None:
+                    # 1,000 mAh default capacity
+                    self._custom_battery = CustomBattery(value, 1000)
+                    self._custom_battery.noise = self.noise
 
-            # Update battery with new data
-            self._custom_battery.update(value)
+                # Update battery with new data
+                self._custom_battery.update(value)
 
-            # If linear regression data has not been set, set it
-            if len(self._custom_battery.pairs_lin_reg_params) == 0:
-                self._custom_battery.pairs_lin_reg_params = [pair_dict["regression"] for pair_dict in self._video_data_pairs]
+                # If linear regression data has not been set, set it
+                if len(self._custom_battery.power_models) == 0:
+                    self._custom_battery.set_pair_data(self._video_data_pairs)
 
         @self.parameters.on_attribute('BATT_CAPACITY')
         def update_battery_capacity(self, attr_name, value):
@@ -88,35 +132,100 @@ class EnergyVehicle(dk.Vehicle):
             BATT_CAPACITY MAVLink message callback. Updates custom battery capacity with new value
             '''
 
-            if self._vehicle._custom_battery is None:
-                return
-            self._vehicle._custom_battery.update_cap_mah(value)
+            # Not applied in the middle of an energy step, whose capacity update would overwrite it
+            with self._vehicle._energy_lock:
+                if self._vehicle._custom_battery is None:
+                    return
+                self._vehicle._custom_battery.update_cap_mah(value)
 
 
-    def set_sim_data(self, data : Dict[str, Any], offloading_method : OffloadingMethod, drone_idx : int):
+    def set_sim_data(self, data : Dict[str, Union[Dict[str, Any], PairData]], offloading_method : OffloadingMethod, drone_idx : int,
+                     seed : Optional[int] = None, workload_mode : WorkloadMode = WorkloadMode.TRACE):
         '''
-        Sets the simulation data for the vehicle from JSON.
+        Sets the simulation data for the vehicle from JSON or from already loaded pairs (see sim_data.load_sim_data).
+        The noise stream is seeded from the seed and the drone index, so runs with the same seed are reproducible
+        and the drones of a fleet draw independent noise.
 
-        :param data: JSON data from the simulation
-        :type: Dict[str, Any]
+        :param data: JSON data from the simulation, or array backed pairs (can be shared between vehicles)
+        :type: Dict[str, Union[Dict[str, Any], PairData]]
         :param offloading_method: Offloading method used for the simulation
         :type: OffloadingMethod
         :param drone_idx: Index of the drone in the simulation
         :type: int
+        :param seed: Seed of the noise stream, fresh OS entropy if not provided
+        :type: Optional[int]
+        :param workload_mode: Replay the recorded bin orderings or generate bins from the Markov model of every pair
+        :type: WorkloadMode
         '''
 
-        self.offloading_method = offloading_method
-        self.drone_idx = drone_idx
+        # The energy worker does not sample while the data is replaced
+        with self._energy_lock:
+            self.offloading_method = offloading_method
+            self.drone_idx = drone_idx
+            self.noise = NoiseSource.for_drone(seed, drone_idx)
+            self.workload_mode = workload_mode
+            self._workload_rng = np.random.default_rng(self.noise.seed_seq.spawn(1)[0])
+
+            # Includes all data for all videos
+            for key, value in data.items():
+                self._video_data_pairs.append(value if isinstance(value, PairData) else compile_pair(key, value))
 
-        # Includes all data for all videos
-        for key, value in data.items():
-            self._video_data_pairs.append(value)
+            if self._custom_battery is not None:
+                self._custom_battery.noise = self.noise
+                self._custom_battery.set_pair_data(self._video_data_pairs)
 
-        if self._custom_battery is not None:
-            self._custom_battery.pairs_lin_reg_params = [pair_dict["regression"] for pair_dict in self._video_data_pairs]
+            self._start_pair_workload()
 
         
 
+    def configure_message_store(self, capacity : int = 1000, allowed_types : Optional[List[str]] = None, spill_path : Optional[str] = None):
+        '''
+        Replace the collected message store, closing the previous one
+
+        :param capacity: Maximum number of messages kept in memory for every message type
+        :type: int
+        :param allowed_types: Message types to collect, all types are collected if not provided
+        :type: Optional[List[str]]
+        :param spill_path: Path of the tlog file evicted messages are appended to
+        :type: Optional[str]
+        '''
+        old_store = self.messages_dict
+        self.messages_dict = MessageStore(capacity, allowed_types, spill_path)
+        # The receive thread may still be adding a message to the old store, its spill lock keeps the close safe
+        old_store.close()
+
+    def configure_streams(self, config : StreamConfig):
+        '''
+        Request only the configured message types from the autopilot, then collect only those types
+        (the listeners are registered per type instead of for every message)
+
+        :param config: Stream configuration of the drone (see stream_config.load_stream_config)
+        :type: StreamConfig
+        '''
+        message_types = config.message_types
+        for msg_type in self._listened_types:
+            for listener_fn in self._collect_listeners:
+                self.remove_message_listener(msg_type, listener_fn)
+        for msg_type in message_types:
+            for listener_fn in self._collect_listeners:
+                self.add_message_listener(msg_type, listener_fn)
+        self._listened_types = message_types
+        self.messages_dict.allowed_types = set(message_types)
+
+        apply_stream_config(self, config)
+
+    def close(self):
+        '''
+        Close the vehicle connection, the energy worker and the collected message store
+        '''
+        self.energy_worker.stop()
+        super(EnergyVehicle, self).close()
+        self.messages_dict.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.publisher is not None:
+            self.publisher.close()
+
     def print_msg_dict(self, full : bool):
         '''
         Print collected messages, either full or just the type and length
@@ -125,12 +234,26 @@ class EnergyVehicle(dk.Vehicle):
         :type: bool
         '''
         for msg_type,msg_list in self.messages_dict.items():
-            print(f"{msg_type} ({len(msg_list)}):")
+            print(f"{msg_type} ({len(msg_list)}/{self.messages_dict.count(msg_type)}, {self.messages_dict.rate(msg_type):.2f} Hz):")
             if not full:
                 continue
             for msg in msg_list:
                 print(f"    {msg}")
 
+    def _start_pair_workload(self):
+        '''
+        Start generating the bins of the current pair from its Markov model, if the workload mode (or a pair stored
+        without a bin ordering) requires it
+        '''
+        self._workload = None
+        if self._curr_pair_idx >= len(self._video_data_pairs):
+            return
+
+        curr_pair = self._video_data_pairs[self._curr_pair_idx]
+        if self.workload_mode == WorkloadMode.MARKOV or len(curr_pair.bin_ordering) == 0:
+            self._workload = WorkloadGenerator(curr_pair.workload_model(), self._workload_rng)
+            self._workload_bin = self._workload.next_bin()
+
     def get_current_cpu_util(self) -> float:
         '''
         Generates a CPU utilization for the current time based on the current CPU bin
@@ -141,21 +264,20 @@ class EnergyVehicle(dk.Vehicle):
 
 
         try:
-            curr_pair_dict = self._video_data_pairs[self._curr_pair_idx]
+            curr_pair = self._video_data_pairs[self._curr_pair_idx]
         except IndexError:
             return 0
         
-        curr_bin_ordering = curr_pair_dict["bin_ordering"]
-        curr_bins =  curr_pair_dict["cpu_bins"]
-
-        if len(curr_bins) == 0 or len(curr_bin_ordering) == 0:
+        if len(curr_pair.bin_means) == 0 or curr_pair.length == 0:
             return 0
 
         # Get Bin for time
-        current_cpu_bin = curr_bin_ordering[self._curr_bin_idx]
+        if self._workload is not None:
+            current_cpu_bin = self._workload_bin
+        else:
+            current_cpu_bin = curr_pair.bin_ordering[self._curr_bin_idx]
 
-        curr_bin_data = curr_bins[str(current_cpu_bin)]
-        rand_cpu_util = np.random.normal(curr_bin_data["mean"], curr_bin_data["std"])
+        rand_cpu_util = self.noise.normal(curr_pair.bin_means[current_cpu_bin], curr_pair.bin_stds[current_cpu_bin])
         if rand_cpu_util < 0:
             rand_cpu_util = 0
         if rand_cpu_util > 100:
@@ -164,55 +286,103 @@ class EnergyVehicle(dk.Vehicle):
         return rand_cpu_util
 
 
+    def _handle_energy_events(self, events : List[str]):
+        '''
+        Energy worker handler, a single sample_battery call integrates every step completed since the previous batch
+        '''
+        instrumentation.record_depth("energy_queue", len(events))
+        start_time = time.perf_counter()
+        with self._energy_lock:
+            self.sample_battery()
+        instrumentation.record_latency("sample_battery", time.perf_counter() - start_time)
+
     def sample_battery(self):
         '''
-        Generates a CPU utilization for the current time and updates the custom battery object based on the corresponding power consumption
+        Integrates the CPU workload energy for every simulation step completed since the last call (vehicle time),
+        updating the custom battery object based on the corresponding power consumption
         '''
 
-        if self.battery is None:
+        # Steps completed before the battery and simulation data are available are skipped
+        step_count = self.sim_clock.advance()
+
+        # The custom battery is created by the first battery callback
+        if self.battery is None or self._custom_battery is None:
             return
 
         self._custom_battery.update(self.battery)
 
-        if len(self._video_data_pairs) == 0:
+        if len(self._video_data_pairs) == 0 or step_count == 0:
             return
-        
-        
+
+        first_sample_idx = len(self.telemetry)
+        J_total = 0.0
+        for step in range(step_count):
+            step_time = self.sim_clock.sim_time_s - (step_count - 1 - step) * self.sim_clock.step_s
+            J_total += self._integrate_step(step_time)
+
+            if self._custom_battery.capacity_J <= 0:
+                break
+
+        capacity_percent = self._custom_battery.get_capacity_percentage() * 100
+        print(f"Battery decreased {J_total:.2f}J to {self._custom_battery.capacity_J:.2f}J ({capacity_percent:.2f}%)")
+
+        # Notify the main thread of the new samples
+        if self.queue_method is not None:
+            self.queue_method(first_sample_idx, len(self.telemetry))
+
+        if capacity_percent <= 0:
+            print("Battery is dead, ending simulation")
+            if self.battery_depleted_callback is not None:
+                self.battery_depleted_callback()
+            else:
+                os.kill(os.getpid(), signal.SIGUSR1)
+
+    def _integrate_step(self, step_time : float) -> float:
+        '''
+        Generates a CPU utilization for a single simulation step and drains the corresponding energy from the custom battery
+
+        :param step_time: Vehicle time (in seconds) at the end of the step
+        :type: float
+        :return: Energy consumed during the step in Joules
+        :rtype: float
+        '''
+
         # Get current CPU utilization and corresponding J/s consumption
         curr_cpu_util = self.get_current_cpu_util()
-        
+
         J_s_util = self._custom_battery.get_js_for_util(curr_cpu_util, self._curr_pair_idx)
 
         # Overall J/s consumption difference
         J_s_delta : float = 0
         J_s_delta += J_s_util
 
-        # Convert J/s to J
-        J_delta = J_s_delta * (time.time() - self._last_sample_time)
- 
+        # Convert J/s to J over one fixed step
+        J_delta = J_s_delta * self.sim_clock.step_s
+
         # Decrease battery capacity by J_delta and calculate capacity percentage
         self._custom_battery.update_cap_j(self._custom_battery.capacity_J - J_delta)
         capacity_percent = self._custom_battery.get_capacity_percentage() * 100
 
-        print(f"Battery decreased {J_delta:.2f}J to {self._custom_battery.capacity_J:.2f}J ({capacity_percent:.2f}%)")
-
-        if capacity_percent <= 0:
-            print("Battery is dead, ending simulation")
-            os.kill(os.getpid(), signal.SIGUSR1)
+        if self.recorder is not None:
+            location = self.location.global_relative_frame
+            self.recorder.record(step_time, self.drone_idx, self._curr_pair_idx, self._curr_bin_idx, curr_cpu_util, J_s_util,
+                                 J_delta, self._custom_battery.capacity_J, location.lat, location.lon, location.alt)
 
         # Add to graph data
-        self._graph_battery_percents.append(capacity_percent)
-        self._graph_cpu_utils.append(curr_cpu_util)
-
-        # Add graph data to main thread queue
-        if self.queue_method is not None:
-            self.queue_method(np.array(self._graph_battery_percents), np.array(self._graph_cpu_utils))
+        self.telemetry.append(capacity_percent, curr_cpu_util)
+        if self.publisher is not None:
+            self.publisher.publish(step_time, capacity_percent, curr_cpu_util, J_s_util)
 
         # Cycles bins and (if necsessary) cycle pairs
         self._curr_bin_idx += 1
-        curr_pair_dict = self._video_data_pairs[self._curr_pair_idx]
-        if self._curr_bin_idx >= len(curr_pair_dict["bin_ordering"]):
+        curr_pair = self._video_data_pairs[self._curr_pair_idx]
+        if self._curr_bin_idx >= curr_pair.length:
             self._curr_bin_idx = 0
             self._curr_pair_idx += 1
             if self._curr_pair_idx >= len(self._video_data_pairs):
-                self._curr_pair_idx = 0
\ No newline at end of file
+                self._curr_pair_idx = 0
+            self._start_pair_workload()
+        elif self._workload is not None:
+            self._workload_bin = self._workload.next_bin()
+
+        return J_delta
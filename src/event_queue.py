@@ -0,0 +1,125 @@
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional
+
+
+class BoundedEventQueue:
+    '''
+    Bounded, never blocking event queue between a producer callback (e.g. the MAVLink receive thread) and a consumer thread.
+    When the queue is full a new event is merged into the newest queued one (coalesce policy, if a merge function is given)
+    or dropped (drop policy). Consumers take every queued event at once.
+    '''
+
+    def __init__(self, maxsize : int, merge : Optional[Callable[[Any, Any], Any]] = None):
+        '''
+        Initialize the BoundedEventQueue object
+
+        :param maxsize: Maximum number of queued events
+        :type: int
+        :param merge: Combines the newest queued event with a new one when the queue is full, new events are dropped if not provided
+        :type: Optional[Callable[[Any, Any], Any]]
+        '''
+        self.maxsize = max(maxsize, 1)
+        self.merge = merge
+
+        # Number of events merged into a queued event and number of dropped events
+        self.coalesced = 0
+        self.dropped = 0
+
+        self._events : Deque[Any] = deque()
+        self._closed = False
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def put(self, event : Any) -> bool:
+        '''
+        Queue an event without blocking
+
+        :param event: Event to queue
+        :type: Any
+        :return: False if the event was coalesced or dropped because the queue is full
+        :rtype: bool
+        '''
+        with self._not_empty:
+            if len(self._events) < self.maxsize:
+                self._events.append(event)
+                self._not_empty.notify()
+                return True
+
+            if self.merge is not None:
+                self._events[-1] = self.merge(self._events[-1], event)
+                self.coalesced += 1
+            else:
+                self.dropped += 1
+            return False
+
+    def get_all(self, timeout : Optional[float] = None) -> List[Any]:
+        '''
+        Wait for at least one event and take every queued event
+
+        :param timeout: Maximum time to wait in seconds, waits until an event is queued or the queue is closed if not provided
+        :type: Optional[float]
+        :return: Queued events in order, empty if the timeout elapsed or the queue was closed
+        :rtype: List[Any]
+        '''
+        with self._not_empty:
+            if len(self._events) == 0 and not self._closed:
+                self._not_empty.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        '''
+        Wake up every waiting consumer, get_all no longer waits
+        '''
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class EventWorker(threading.Thread):
+    '''
+    Thread that hands every batch of queued events to a handler until the queue is closed
+    '''
+
+    def __init__(self, name : str, events : BoundedEventQueue, handler : Callable[[List[Any]], None]):
+        '''
+        Initialize the EventWorker object (call start to begin handling events)
+
+        :param name: Name of the thread
+        :type: str
+        :param events: Queue the events are taken from
+        :type: BoundedEventQueue
+        :param handler: Called with every batch of events (in order)
+        :type: Callable[[List[Any]], None]
+        '''
+        super().__init__(name=name, daemon=True)
+        self.events = events
+        self.handler = handler
+
+    def run(self):
+        while True:
+            events = self.events.get_all()
+            if len(events) == 0:
+                if self.events.closed:
+                    return
+                continue
+            try:
+                self.handler(events)
+            except Exception as e:
+                print(f"{self.name}: Failed to handle events with error: {e}")
+
+    def stop(self):
+        '''
+        Close the queue and wait for the events already queued to be handled
+        '''
+        self.events.close()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
@@ -0,0 +1,348 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import math
+import os
+import time
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from live_plot import minmax_decimate, graph_title, setup_axes, grow_limits, COLOR_BLUE
+from shared_telemetry import TelemetryReader, DEFAULT_FLEET_NAME
+
+# Samples (seconds) used to estimate the drain rate of every drone
+DRAIN_WINDOW_S = 60
+
+
+@dataclass
+class DroneSummary:
+    drone_idx : int
+    samples : int
+    battery_percent : float
+    mean_cpu_util : float
+    mean_watts : float
+    # Estimated seconds until the battery is depleted at the recent drain rate (None while not draining)
+    remaining_s : Optional[float]
+    finished : bool
+
+
+def summarize_drone(reader : TelemetryReader, columns : Dict[str, np.ndarray], drain_window_s : int = DRAIN_WINDOW_S) -> Optional[DroneSummary]:
+    '''
+    Summary statistics of a drone
+
+    :param reader: Reader of the drone
+    :type: TelemetryReader
+    :param columns: Latest samples of the drone (see TelemetryReader.window)
+    :type: Dict[str, np.ndarray]
+    :param drain_window_s: Number of latest samples the drain rate is estimated from
+    :type: int
+    :return: Summary, None before the first sample
+    :rtype: Optional[DroneSummary]
+    '''
+    battery_percents = columns["battery_percent"]
+    if len(battery_percents) == 0:
+        return None
+
+    battery_percent = float(battery_percents[-1])
+    recent = battery_percents[-drain_window_s:]
+    remaining_s = None
+    if len(recent) > 1 and recent[0] > recent[-1] and battery_percent > 0:
+        drain_per_s = (recent[0] - recent[-1]) / (len(recent) - 1)
+        remaining_s = battery_percent / drain_per_s
+
+    return DroneSummary(reader.drone_idx, reader.count, battery_percent, float(columns["cpu_util"].mean()),
+                        float(columns["watts"].mean()), remaining_s, reader.finished)
+
+
+def fleet_series(windows : List[Dict[str, np.ndarray]], first_idxs : List[int], column : str, length : int) -> np.ndarray:
+    '''
+    Align a column of every drone by sample index (seconds since the drone's first sample) over the latest samples of the fleet
+
+    :param windows: Latest samples of every drone
+    :type: List[Dict[str, np.ndarray]]
+    :param first_idxs: Index of the first sample of every window
+    :type: List[int]
+    :param column: Column to align
+    :type: str
+    :param length: Number of latest sample indices
+    :type: int
+    :return: Drones x sample indices matrix, NaN where a drone has no sample
+    :rtype: np.ndarray
+    '''
+    stop_idx = max((first_idx + len(window[column]) for window, first_idx in zip(windows, first_idxs)), default=0)
+    start_idx = max(stop_idx - length, min(first_idxs, default=0))
+
+    series = np.full((len(windows), stop_idx - start_idx), np.nan)
+    for row, (window, first_idx) in enumerate(zip(windows, first_idxs)):
+        values = window[column]
+        copy_start = max(start_idx, first_idx)
+        copy_stop = first_idx + len(values)
+        if copy_stop > copy_start:
+            series[row, copy_start - start_idx:copy_stop - start_idx] = values[copy_start - first_idx:]
+    return series
+
+
+def _nan_reduce(series : np.ndarray):
+    '''
+    Mean, minimum and maximum of every column, ignoring NaN (columns without values stay NaN, without warnings)
+    '''
+    valid = ~np.isnan(series)
+    valid_count = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, series, 0).sum(axis=0) / valid_count
+    minimum = np.where(valid, series, np.inf).min(axis=0, initial=np.inf)
+    maximum = np.where(valid, series, -np.inf).max(axis=0, initial=-np.inf)
+    minimum[valid_count == 0] = np.nan
+    maximum[valid_count == 0] = np.nan
+    return mean, minimum, maximum
+
+
+def format_remaining(remaining_s : Optional[float]) -> str:
+    if remaining_s is None:
+        return "-"
+    return f"{int(remaining_s // 3600)}:{int(remaining_s % 3600 // 60):02d}:{int(remaining_s % 60):02d}"
+
+
+class FleetDashboard:
+    '''
+    Single window (or off-screen image) with the battery percentage & CPU utilization of every drone of a fleet
+    and fleet wide panels, read from the shared memory rings the drone processes publish (see shared_telemetry.py)
+    '''
+
+    def __init__(self, drone_idxs : List[int], fleet_name : str = DEFAULT_FLEET_NAME, window_s : int = 3600, headless : bool = False,
+                 size_px : Optional[List[int]] = None, dpi : int = 100):
+        '''
+        Initialize the FleetDashboard object and create its figure
+
+        :param drone_idxs: Indices of the drones shown
+        :type: List[int]
+        :param fleet_name: Name shared by every drone of the fleet
+        :type: str
+        :param window_s: Latest samples (seconds) shown in the fleet panels
+        :type: int
+        :param headless: Render off-screen (Agg) instead of showing a window
+        :type: bool
+        :param size_px: Width and height of the figure in pixels, grows with the number of drones if not provided
+        :type: Optional[List[int]]
+        :param dpi: Resolution of the figure
+        :type: int
+        '''
+        self.drone_idxs = drone_idxs
+        self.fleet_name = fleet_name
+        self.window_s = window_s
+        self.headless = headless
+        self.readers : Dict[int, TelemetryReader] = {}
+
+        cols = math.ceil(math.sqrt(len(drone_idxs)))
+        rows = math.ceil(len(drone_idxs) / cols)
+        if size_px is None:
+            size_px = [max(1280, 420 * cols), 360 + 260 * rows]
+
+        if headless:
+            self.fig = Figure(figsize=(size_px[0] / dpi, size_px[1] / dpi), dpi=dpi)
+            FigureCanvasAgg(self.fig)
+        else:
+            plt.ion()
+            self.fig = plt.figure(figsize=(size_px[0] / dpi, size_px[1] / dpi), dpi=dpi)
+            plt.get_current_fig_manager().set_window_title("Fleet Battery & CPU Dashboard")
+            plt.show()
+
+        grid = self.fig.add_gridspec(2, 1, height_ratios=[1.4, rows], hspace=0.3)
+        drone_grid = grid[1].subgridspec(rows, cols, hspace=0.6, wspace=0.45)
+
+        # Fleet panel: mean battery with the min/max band, mean CPU utilization
+        self.fleet_ax1 = self.fig.add_subplot(grid[0])
+        self.fleet_ax2, self.fleet_battery_line, self.fleet_cpu_line = setup_axes(self.fleet_ax1, "Fleet", animated=False)
+        self.fleet_ax1.set_xlabel("Mission Time (s)")
+        self.fleet_band = None
+
+        self.drone_axes = {}
+        for panel_idx, drone_idx in enumerate(drone_idxs):
+            ax1 = self.fig.add_subplot(drone_grid[panel_idx // cols, panel_idx % cols])
+            ax2, battery_line, cpu_line = setup_axes(ax1, f"Drone {drone_idx}: waiting", animated=False)
+            for ax in (ax1, ax2):
+                ax.tick_params(labelsize=7)
+                ax.set_ylabel("")
+            ax1.set_xlabel("")
+            ax1.title.set_fontsize(9)
+            self.drone_axes[drone_idx] = (ax1, ax2, battery_line, cpu_line)
+
+    def attach(self):
+        '''
+        Attach to drones that published their segment since the last frame, and to restarted drones
+        '''
+        for drone_idx in self.drone_idxs:
+            reader = self.readers.get(drone_idx)
+            if reader is not None and not reader.finished:
+                continue
+
+            new_reader = TelemetryReader.attach(drone_idx, self.fleet_name)
+            if new_reader is None:
+                continue
+            if reader is not None and new_reader.started == reader.started:
+                new_reader.close()
+                continue
+
+            if reader is not None:
+                reader.close()
+            self.readers[drone_idx] = new_reader
+
+    def render_frame(self) -> List[DroneSummary]:
+        '''
+        Read the latest samples of every drone and redraw the figure
+
+        :return: Summary of every drone with samples
+        :rtype: List[DroneSummary]
+        '''
+        self.attach()
+
+        summaries = []
+        windows = []
+        first_idxs = []
+        for drone_idx, (ax1, ax2, battery_line, cpu_line) in self.drone_axes.items():
+            reader = self.readers.get(drone_idx)
+            if reader is None:
+                continue
+
+            first_idx, columns = reader.window()
+            summary = summarize_drone(reader, columns)
+            if summary is None:
+                continue
+            summaries.append(summary)
+            windows.append(columns)
+            first_idxs.append(first_idx)
+
+            width_px = int(ax1.bbox.width)
+            battery_x, battery_y = minmax_decimate(columns["battery_percent"], width_px)
+            cpu_x, cpu_y = minmax_decimate(columns["cpu_util"], width_px)
+            # Copies, the lines must not keep views of the shared buffer
+            battery_line.set_data(battery_x + first_idx, np.array(battery_y))
+            cpu_line.set_data(cpu_x + first_idx, np.array(cpu_y))
+            grow_limits(ax1, columns["battery_percent"])
+            ax1.set_xlim(first_idx, max(ax1.get_xlim()[1], first_idx + len(columns["battery_percent"])))
+
+            state = "finished" if summary.finished else format_remaining(summary.remaining_s)
+            ax1.set_title(f"{graph_title(drone_idx, reader.offloading_method)}\n{summary.battery_percent:.2f}%, "
+                          f"{summary.mean_watts:.2f} W avg, {state}", fontsize=9)
+
+        if len(windows) > 0:
+            self._update_fleet(windows, first_idxs, summaries)
+
+        if self.headless:
+            self.fig.canvas.draw()
+        else:
+            self.fig.canvas.draw_idle()
+            self.fig.canvas.flush_events()
+
+        # Views of the shared buffers are not kept between frames
+        windows.clear()
+        return summaries
+
+    def _update_fleet(self, windows : List[Dict[str, np.ndarray]], first_idxs : List[int], summaries : List[DroneSummary]):
+        battery_mean, battery_min, battery_max = _nan_reduce(fleet_series(windows, first_idxs, "battery_percent", self.window_s))
+        cpu_mean, _, _ = _nan_reduce(fleet_series(windows, first_idxs, "cpu_util", self.window_s))
+
+        start_idx = max(first_idx + len(window["battery_percent"]) for window, first_idx in zip(windows, first_idxs)) - len(battery_mean)
+        x_values = np.arange(start_idx, start_idx + len(battery_mean))
+
+        self.fleet_battery_line.set_data(x_values, battery_mean)
+        self.fleet_cpu_line.set_data(x_values, cpu_mean)
+        if self.fleet_band is not None:
+            self.fleet_band.remove()
+        self.fleet_band = self.fleet_ax1.fill_between(x_values, battery_min, battery_max, color=COLOR_BLUE, alpha=0.2, linewidth=0)
+
+        valid_min = battery_min[~np.isnan(battery_min)]
+        if len(valid_min) > 0:
+            grow_limits(self.fleet_ax1, np.concatenate((valid_min, battery_max[~np.isnan(battery_max)])))
+        self.fleet_ax1.set_xlim(start_idx, max(self.fleet_ax1.get_xlim()[1], start_idx + len(battery_mean)))
+
+        flying = [summary for summary in summaries if not summary.finished]
+        remaining = [summary.remaining_s for summary in flying if summary.remaining_s is not None]
+        self.fleet_ax1.set_title(f"Fleet: {len(flying)}/{len(summaries)} flying, battery mean {np.mean([s.battery_percent for s in summaries]):.2f}% "
+                                 f"(min {min(s.battery_percent for s in summaries):.2f}%), "
+                                 f"{sum(s.mean_watts for s in flying):.2f} W total, first depletion in {format_remaining(min(remaining, default=None))}")
+
+    def save(self, path : str):
+        '''
+        Write the current frame to an image file
+
+        :param path: Image file (replaced atomically)
+        :type: str
+        '''
+        tmp_path = f"{path}.tmp.png"
+        self.fig.savefig(tmp_path)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        for reader in self.readers.values():
+            reader.close()
+        self.readers.clear()
+
+
+def print_summaries(summaries : List[DroneSummary]):
+    '''
+    Print a table with the summary of every drone
+    '''
+    print(f"{'Drone':>5} {'Samples':>8} {'Battery':>8} {'CPU avg':>8} {'W avg':>7} {'Remaining':>10}")
+    for summary in summaries:
+        state = "finished" if summary.finished else format_remaining(summary.remaining_s)
+        print(f"{summary.drone_idx:>5} {summary.samples:>8} {summary.battery_percent:>7.2f}% {summary.mean_cpu_util:>7.2f}% "
+              f"{summary.mean_watts:>7.2f} {state:>10}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Shows the battery and CPU telemetry of every drone of a fleet in a single dashboard")
+    parser.add_argument("num_drones", type=int, help="Number of drones to show (indices 0 to num_drones - 1)")
+    parser.add_argument("--fleet-name", type=str, default=DEFAULT_FLEET_NAME, help="Fleet name the drones publish with (--publish)")
+    parser.add_argument("--frame-rate", type=float, default=1, help="Frames rendered per second")
+    parser.add_argument("--window-s", type=int, default=3600, help="Latest seconds shown in the fleet panel")
+    parser.add_argument("--status-interval", type=float, default=10, help="Time between two summary table prints in seconds")
+    parser.add_argument("--headless", action="store_true", help="Render off-screen (Agg) instead of showing a window, exits once every drone finished")
+    parser.add_argument("--snapshot-path", type=str, default=None, help="PNG file replaced with the latest frame")
+
+    args = parser.parse_args()
+
+    if args.num_drones <= 0:
+        print("Number of drones must be positive!")
+        exit(1)
+
+    if args.headless:
+        matplotlib.use("Agg")
+    else:
+        matplotlib.use("Qt5agg")
+
+    dashboard = FleetDashboard(list(range(args.num_drones)), args.fleet_name, args.window_s, args.headless)
+    frame_interval_s = 1 / args.frame_rate
+    last_status_time = 0.0
+
+    try:
+        while True:
+            frame_start = time.monotonic()
+            summaries = dashboard.render_frame()
+            if args.snapshot_path is not None:
+                dashboard.save(args.snapshot_path)
+
+            if frame_start - last_status_time >= args.status_interval:
+                last_status_time = frame_start
+                print_summaries(summaries)
+
+            all_finished = len(summaries) == args.num_drones and all(summary.finished for summary in summaries)
+            if args.headless and all_finished:
+                print_summaries(summaries)
+                break
+
+            remaining_s = frame_interval_s - (time.monotonic() - frame_start)
+            if remaining_s > 0:
+                if args.headless:
+                    time.sleep(remaining_s)
+                else:
+                    plt.pause(remaining_s)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dashboard.close()
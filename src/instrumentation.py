@@ -0,0 +1,331 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import functools
+import json
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Latency bucket i holds durations in [2^(i-1), 2^i) microseconds (bucket 0 is below 1 us)
+LATENCY_BUCKETS = 32
+
+# Percentiles reported for every histogram
+REPORT_PERCENTILES = [50, 90, 99]
+
+# Signal that dumps a snapshot when instrumentation is enabled
+DUMP_SIGNAL = signal.SIGUSR2
+
+# Instrumentation is disabled unless enable() is called, the recording functions then return immediately
+_enabled = False
+_registry : Optional['Registry'] = None
+_dump_path : Optional[str] = None
+
+# Set by the dump signal handler, the dump itself runs on the dump thread: the handler interrupts the main thread,
+# which may be holding a histogram lock (graph frame times, data queue depth)
+_dump_requested = threading.Event()
+
+
+class Histogram:
+    '''
+    Thread safe histogram with power of two buckets, recording a value is a few integer operations
+    '''
+
+    def __init__(self, bucket_count : int = LATENCY_BUCKETS):
+        '''
+        Initialize the Histogram object
+
+        :param bucket_count: Number of buckets, larger values are counted in the last bucket
+        :type: int
+        '''
+        self.buckets = [0] * bucket_count
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def record(self, value : int):
+        '''
+        Record a single value
+
+        :param value: Non-negative integer value (microseconds for latencies)
+        :type: int
+        '''
+        bucket = min(value.bit_length(), len(self.buckets) - 1)
+        with self._lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent : float) -> int:
+        '''
+        Approximate percentile (upper bound of the bucket that contains it)
+
+        :param percent: Percentile to get (0-100)
+        :type: float
+        :return: Upper bound of the percentile bucket, 0 if nothing was recorded
+        :rtype: int
+        '''
+        if self.count == 0:
+            return 0
+        target = self.count * percent / 100
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(1 << bucket, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        '''
+        Summary of the recorded values
+
+        :return: Count, mean, max, percentiles and the non-empty buckets (by upper bound)
+        :rtype: Dict[str, Any]
+        '''
+        with self._lock:
+            summary : Dict[str, Any] = {
+                "count": self.count,
+                "mean": self.total / self.count if self.count > 0 else 0,
+                "max": self.max,
+            }
+            for percent in REPORT_PERCENTILES:
+                summary[f"p{percent}"] = self.percentile(percent)
+            summary["buckets"] = {str(1 << bucket): bucket_count for bucket, bucket_count in enumerate(self.buckets) if bucket_count > 0}
+        return summary
+
+
+class Registry:
+    '''
+    Named latency histograms (microseconds), message counters and depth histograms
+    '''
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.latencies : Dict[str, Histogram] = {}
+        self.depths : Dict[str, Histogram] = {}
+        self.message_counts : Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, histograms : Dict[str, Histogram], name : str) -> Histogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(name, Histogram())
+        return histogram
+
+    def snapshot(self) -> Dict[str, Any]:
+        '''
+        Summary of everything recorded since instrumentation was enabled
+
+        :return: JSON serializable snapshot
+        :rtype: Dict[str, Any]
+        '''
+        now = time.time()
+        elapsed = max(now - self.start_time, 1e-9)
+        return {
+            "time": now,
+            "elapsed_s": elapsed,
+            "latency_us": {name: histogram.summary() for name, histogram in list(self.latencies.items())},
+            "depth": {name: histogram.summary() for name, histogram in list(self.depths.items())},
+            "message_rates_hz": {msg_type: count / elapsed for msg_type, count in sorted(self.message_counts.items())},
+        }
+
+
+def enable(dump_path : Optional[str] = None, dump_interval : Optional[float] = None, dump_signal : Optional[int] = DUMP_SIGNAL):
+    '''
+    Enable instrumentation. Must be called before the vehicles are created, callbacks created while disabled are not wrapped.
+
+    :param dump_path: File snapshots are appended to (one JSON object per line), printed if not provided
+    :type: Optional[str]
+    :param dump_interval: Time between two periodic dumps in seconds, no periodic dump if not provided
+    :type: Optional[float]
+    :param dump_signal: Signal that dumps a snapshot (must be called from the main thread), None to not install a handler
+    :type: Optional[int]
+    '''
+    global _enabled, _registry, _dump_path
+
+    _registry = Registry()
+    _dump_path = dump_path
+    _enabled = True
+
+    periodic = dump_interval is not None and dump_interval > 0
+
+    if dump_signal is not None:
+        signal.signal(dump_signal, lambda signum, frame: _dump_requested.set())
+
+    if dump_signal is not None or periodic:
+        def dump_loop():
+            while True:
+                # Dumps when requested by the signal or after the interval elapsed
+                _dump_requested.wait(dump_interval if periodic else None)
+                _dump_requested.clear()
+                dump()
+
+        threading.Thread(target=dump_loop, name="instrumentation-dump", daemon=True).start()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def timed(name : str) -> Callable[[Callable], Callable]:
+    '''
+    Decorator recording the latency of every call of the decorated function.
+    The function is returned unchanged when instrumentation is disabled at decoration time.
+
+    :param name: Name of the latency histogram
+    :type: str
+    :return: Decorator
+    :rtype: Callable[[Callable], Callable]
+    '''
+
+    def decorator(fn : Callable) -> Callable:
+        if not _enabled:
+            return fn
+
+        histogram = _registry.histogram(_registry.latencies, name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.record((time.perf_counter_ns() - start) // 1000)
+
+        return wrapper
+
+    return decorator
+
+
+def record_latency(name : str, seconds : float):
+    '''
+    Record a latency measured by the caller
+
+    :param name: Name of the latency histogram
+    :type: str
+    :param seconds: Measured latency in seconds
+    :type: float
+    '''
+    if not _enabled:
+        return
+    _registry.histogram(_registry.latencies, name).record(max(int(seconds * 1e6), 0))
+
+
+def record_depth(name : str, depth : int):
+    '''
+    Record the depth of a queue
+
+    :param name: Name of the queue
+    :type: str
+    :param depth: Number of items waiting in the queue
+    :type: int
+    '''
+    if not _enabled:
+        return
+    _registry.histogram(_registry.depths, name).record(depth)
+
+
+def count_message(msg_type : str):
+    '''
+    Count a received message, rates are reported per type
+
+    :param msg_type: MAVLink message type
+    :type: str
+    '''
+    if not _enabled:
+        return
+    # Lost increments between threads only skew the rate slightly, no lock on the receive path
+    message_counts = _registry.message_counts
+    message_counts[msg_type] = message_counts.get(msg_type, 0) + 1
+
+
+def snapshot() -> Optional[Dict[str, Any]]:
+    '''
+    Summary of everything recorded since instrumentation was enabled
+
+    :return: JSON serializable snapshot, None if instrumentation is disabled
+    :rtype: Optional[Dict[str, Any]]
+    '''
+    if not _enabled:
+        return None
+    return _registry.snapshot()
+
+
+def dump(dump_path : Optional[str] = None):
+    '''
+    Append a snapshot to the dump file (one JSON object per line) or print it. Does nothing if instrumentation is disabled.
+
+    :param dump_path: File to append the snapshot to, defaults to the path given to enable() (printed if neither is provided)
+    :type: Optional[str]
+    '''
+    current = snapshot()
+    if current is None:
+        return
+
+    if dump_path is None:
+        dump_path = _dump_path
+
+    if dump_path is None:
+        print_snapshot(current)
+        return
+
+    with open(dump_path, 'a') as dump_file:
+        dump_file.write(json.dumps(current) + "\n")
+
+
+def print_snapshot(current : Dict[str, Any]):
+    '''
+    Print a snapshot as tables
+
+    :param current: Snapshot to print (see snapshot())
+    :type: Dict[str, Any]
+    '''
+    print(f"Instrumentation over {current['elapsed_s']:.1f} s")
+
+    for title, histograms in (("Latency (us)", current["latency_us"]), ("Depth", current["depth"])):
+        if len(histograms) == 0:
+            continue
+        print(f"  {title}:")
+        for name, summary in histograms.items():
+            percentiles = ", ".join(f"p{percent} {summary[f'p{percent}']}" for percent in REPORT_PERCENTILES)
+            print(f"    {name}: {summary['count']} samples, mean {summary['mean']:.1f}, {percentiles}, max {summary['max']}")
+
+    if len(current["message_rates_hz"]) > 0:
+        print("  Message rates (Hz):")
+        for msg_type, rate in current["message_rates_hz"].items():
+            print(f"    {msg_type}: {rate:.2f}")
+
+
+def read_dumps(dump_path : str) -> List[Dict[str, Any]]:
+    '''
+    Load every snapshot appended to a dump file
+
+    :param dump_path: Path of the dump file
+    :type: str
+    :return: Snapshots in dump order
+    :rtype: List[Dict[str, Any]]
+    '''
+    with open(dump_path, 'r') as dump_file:
+        return [json.loads(line) for line in dump_file if line.strip() != ""]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Prints the snapshots of an instrumentation dump file")
+    parser.add_argument("dump_path", type=str, help="The path of the dump file written with --instrument-path")
+    parser.add_argument("--all", action="store_true", help="Print every snapshot instead of only the last one")
+
+    args = parser.parse_args()
+
+    snapshots = read_dumps(args.dump_path)
+    if len(snapshots) == 0:
+        print(f"{args.dump_path} does not contain any snapshot!")
+        exit(1)
+
+    for current in (snapshots if args.all else snapshots[-1:]):
+        print_snapshot(current)
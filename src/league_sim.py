@@ -0,0 +1,158 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Tuple
+
+# Only the standard library is imported here, every subcommand imports its own dependencies
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(SRC_DIR, "..")
+
+# Subcommands running a script with the remaining arguments (see the --help of every subcommand): script path and description
+SCRIPT_COMMANDS : Dict[str, Tuple[str, str]] = {
+    "launch": (os.path.join(PROJECT_DIR, "startup_sim.py"), "Start Gazebo and one SITL instance per drone (startup_sim.py)"),
+    "fly": (os.path.join(SRC_DIR, "sim_drone_workload.py"), "Fly the mission of one drone and graph its energy (sim_drone_workload.py)"),
+    "fleet": (os.path.join(SRC_DIR, "orchestrator.py"), "Fly every drone from a single process (orchestrator.py)"),
+    "dashboard": (os.path.join(SRC_DIR, "fleet_dashboard.py"), "Show the energy published by a fleet (fleet_dashboard.py)"),
+    "convert": (os.path.join(SRC_DIR, "sim_data.py"), "Convert a simulation data JSON file to .npz (sim_data.py)"),
+    "simulate": (os.path.join(SRC_DIR, "energy_replay.py"), "Simulate the energy of a pair offline (energy_replay.py)"),
+    "monte-carlo": (os.path.join(SRC_DIR, "monte_carlo.py"), "Run seeded offline trials of every pair (monte_carlo.py)"),
+    "sweep": (os.path.join(SRC_DIR, "sweep.py"), "Run, serve or export a parameter sweep (sweep.py)"),
+    "calibrate": (os.path.join(SRC_DIR, "calibrate.py"), "Create simulation data from raw CPU and power traces (calibrate.py)"),
+    "replay": (os.path.join(SRC_DIR, "mavlink_replay.py"), "Replay a recorded log over MAVLink instead of SITL (mavlink_replay.py)"),
+    "world": (os.path.join(SRC_DIR, "world_generator.py"), "Generate an N drone world and its models (world_generator.py)"),
+    "telemetry": (os.path.join(SRC_DIR, "telemetry_recorder.py"), "Summarize a recorded telemetry file (telemetry_recorder.py)"),
+    "dataflash": (os.path.join(SRC_DIR, "dataflash.py"), "Decode the messages of a DataFlash log (dataflash.py)"),
+    "instrumentation": (os.path.join(SRC_DIR, "instrumentation.py"), "Print an instrumentation snapshot (instrumentation.py)"),
+}
+
+
+def run_script(script_path : str, script_args : List[str]):
+    '''
+    Replace this process with a script, so it runs exactly as if it was started directly
+    (signals, multiprocessing workers and exit codes are unchanged)
+
+    :param script_path: Path of the script
+    :type: str
+    :param script_args: Arguments passed to the script
+    :type: List[str]
+    '''
+    sys.stdout.flush()
+    try:
+        os.execv(sys.executable, [sys.executable, script_path] + script_args)
+    except OSError as oe:
+        print(f"Failed to run {script_path} with error: {oe}")
+        exit(1)
+
+
+def validate_data_file(data_path : str) -> bool:
+    '''
+    Validate a simulation data file, JSON files are validated without NumPy
+
+    :param data_path: Path of a .json or .npz file
+    :type: str
+    :return: True if the file is valid, False otherwise
+    :rtype: bool
+    '''
+    if data_path.endswith(".npz"):
+        import zipfile
+        from sim_data import load_sim_data_npz
+        try:
+            load_sim_data_npz(data_path)
+            return True
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Failed to load {data_path} with error: {e}")
+            return False
+
+    from sim_data_validation import load_sim_data_json
+    try:
+        return load_sim_data_json(data_path) is not None
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Failed to load {data_path} with error: {e}")
+        return False
+
+
+def validate_mission_file(mission_path : str) -> bool:
+    '''
+    Validate a mission file (imports dronekit, used by the mission steps)
+    '''
+    from mission import load_mission
+    return load_mission(mission_path) is not None
+
+
+def validate_streams_file(streams_path : str) -> bool:
+    '''
+    Validate a stream configuration file (imports pymavlink for the message types)
+    '''
+    from stream_config import load_stream_config
+    return load_stream_config(streams_path, 0) is not None
+
+
+def validate(data_paths : List[str], mission_paths : List[str], streams_paths : List[str]) -> bool:
+    '''
+    Validate every file, printing the result of each one
+
+    :param data_paths: Simulation data files (.json or .npz)
+    :type: List[str]
+    :param mission_paths: Mission files
+    :type: List[str]
+    :param streams_paths: Stream configuration files
+    :type: List[str]
+    :return: True if every file is valid
+    :rtype: bool
+    '''
+    checks = [(path, validate_data_file) for path in data_paths] + [(path, validate_mission_file) for path in mission_paths] + \
+             [(path, validate_streams_file) for path in streams_paths]
+
+    all_valid = True
+    for path, check in checks:
+        if not os.path.exists(path):
+            print(f"{path} does not exist!")
+            all_valid = False
+            continue
+
+        valid = check(path)
+        print(f"{path}: {'valid' if valid else 'NOT VALID'}")
+        all_valid = all_valid and valid
+
+    return all_valid
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="LEAGUE simulation tools, every subcommand only imports the dependencies it needs")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>", required=True)
+
+    validate_parser = subparsers.add_parser("validate", help="Validate simulation data, mission and stream configuration files",
+                                            description="Validates files without connecting to a vehicle. JSON simulation data is validated "
+                                                        "with the standard library only, .npz files need NumPy, missions dronekit and "
+                                                        "stream configurations pymavlink.")
+    validate_parser.add_argument("data_paths", type=str, nargs="*", help="Simulation data files (.json or .npz)")
+    validate_parser.add_argument("--mission", type=str, action="append", default=[], help="Mission file to validate (repeatable)")
+    validate_parser.add_argument("--streams", type=str, action="append", default=[], help="Stream configuration file to validate (repeatable)")
+
+    # Only listed in the help, their arguments are parsed by the scripts
+    for command, (_, description) in SCRIPT_COMMANDS.items():
+        subparsers.add_parser(command, help=description, add_help=False)
+
+    return parser
+
+
+if __name__ == "__main__":
+
+    parser = build_parser()
+
+    # Script subcommands are dispatched before parsing so every argument (including --help) reaches the script
+    if len(sys.argv) > 1 and sys.argv[1] in SCRIPT_COMMANDS:
+        run_script(SCRIPT_COMMANDS[sys.argv[1]][0], sys.argv[2:])
+
+    args = parser.parse_args()
+
+    if args.command == "validate":
+        if len(args.data_paths) + len(args.mission) + len(args.streams) == 0:
+            print("No file to validate!")
+            exit(1)
+
+        if not validate(args.data_paths, args.mission, args.streams):
+            exit(1)
@@ -0,0 +1,325 @@
+import os
+import threading
+import time
+import numpy as np
+import matplotlib.animation as manimation
+import matplotlib.pyplot as plt
+import matplotlib.ticker as mtick
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from typing import Optional, Tuple
+from sim_data import OffloadingMethod
+from telemetry_buffer import TelemetryBuffer
+
+COLOR_RED = 'tab:red'
+COLOR_BLUE = 'tab:blue'
+
+
+def minmax_decimate(values : np.ndarray, buckets : int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Downsample a series to at most 2 points per bucket while keeping the minimum and maximum of every bucket,
+    so spikes stay visible at pixel resolution
+
+    :param values: Series to downsample (x values are the sample indices)
+    :type: np.ndarray
+    :param buckets: Number of buckets (usually the plot width in pixels)
+    :type: int
+    :return: x and y values of the downsampled series
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    '''
+    count = len(values)
+    if buckets <= 0 or count <= 2 * buckets:
+        return np.arange(count), values
+
+    bucket_size = count // buckets
+    bucket_values = values[:buckets * bucket_size].reshape(buckets, bucket_size)
+
+    bucket_offsets = np.arange(buckets) * bucket_size
+    min_idx = bucket_offsets + np.argmin(bucket_values, axis=1)
+    max_idx = bucket_offsets + np.argmax(bucket_values, axis=1)
+
+    # Keep the min/max of every bucket in sample order, then the samples that did not fill a bucket
+    x_values = np.concatenate((np.sort(np.stack((min_idx, max_idx), axis=1), axis=1).ravel(),
+                               np.arange(buckets * bucket_size, count)))
+    return x_values, values[x_values]
+
+
+def graph_title(drone_idx : int, offloading_method : OffloadingMethod) -> str:
+    '''
+    Title of the battery & CPU graph of a drone
+
+    :param drone_idx: Index of the drone
+    :type: int
+    :param offloading_method: Offloading method used for the simulation
+    :type: OffloadingMethod
+    :return: Graph title
+    :rtype: str
+    '''
+    method_name = offloading_method.value.capitalize()
+    if offloading_method == OffloadingMethod.FULL_OFFLOAD or offloading_method == OffloadingMethod.PARTIAL_OFFLOAD:
+        method_name += " Offloading"
+    return f"Drone {drone_idx}, {method_name} Method"
+
+
+def setup_axes(ax1 : Axes, title : str, animated : bool) -> Tuple[Axes, Line2D, Line2D]:
+    '''
+    Set up the battery percentage (left) and CPU utilization (right) axes and create their lines
+
+    :param ax1: Axes of the battery percentage
+    :type: Axes
+    :param title: Title of the graph
+    :type: str
+    :param animated: Exclude the lines from full draws (blitting)
+    :type: bool
+    :return: Axes of the CPU utilization, battery line and CPU line
+    :rtype: Tuple[Axes, Line2D, Line2D]
+    '''
+    ax1.set_title(title)
+
+    ax1.set_xlabel('Running Time')
+    ax1.set_ylabel('Battery Percentage', color=COLOR_BLUE)
+    ax1.tick_params(axis='y', labelcolor=COLOR_BLUE)
+    ax1.yaxis.set_major_formatter(mtick.PercentFormatter(xmax=100, decimals=2))
+
+    ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
+    ax2.set_ylabel('CPU Utilization', color=COLOR_RED)
+    ax2.tick_params(axis='y', labelcolor=COLOR_RED)
+    ax2.yaxis.set_major_formatter(mtick.PercentFormatter(xmax=100, decimals=2))
+
+    battery_line, = ax1.plot([], [], COLOR_BLUE, animated=animated)
+    cpu_line, = ax2.plot([], [], COLOR_RED, animated=animated)
+
+    ax1.set_xlim(0, 60)
+    ax1.set_ylim(99, 100)
+    ax2.set_ylim(0, 100)
+
+    return ax2, battery_line, cpu_line
+
+
+def grow_limits(ax1 : Axes, battery_percents : np.ndarray) -> bool:
+    '''
+    Grow the axes limits (with headroom, so this rarely happens) when the data no longer fits
+
+    :param ax1: Axes of the battery percentage (shares the x axis with the CPU utilization)
+    :type: Axes
+    :param battery_percents: All battery percentages
+    :type: np.ndarray
+    :return: True if a limit changed
+    :rtype: bool
+    '''
+    changed = False
+
+    x_max = ax1.get_xlim()[1]
+    if len(battery_percents) > x_max:
+        ax1.set_xlim(0, max(2 * x_max, len(battery_percents)))
+        changed = True
+
+    bat_min, bat_max = ax1.get_ylim()
+    data_min, data_max = float(battery_percents.min()), float(battery_percents.max())
+    if data_min < bat_min or data_max > bat_max:
+        padding = max((max(data_max, bat_max) - min(data_min, bat_min)) * 0.25, 0.01)
+        ax1.set_ylim(min(data_min, bat_min) - padding, max(data_max, bat_max))
+        changed = True
+
+    return changed
+
+
+class LivePlotRenderer:
+    '''
+    Battery percentage & CPU utilization graph that creates its lines once and updates them in place.
+    Only the lines are redrawn (blitted) unless the axes limits have to grow.
+    '''
+
+    def __init__(self, title : str, window_title : Optional[str] = None, min_interval_s : float = 0):
+        '''
+        Initialize the LivePlotRenderer object and show the figure
+
+        :param title: Title of the graph
+        :type: str
+        :param window_title: Title of the window, if supported by the backend
+        :type: Optional[str]
+        :param min_interval_s: Minimum time between two rendered frames, updates arriving faster are skipped
+        :type: float
+        '''
+
+        self.min_interval_s = min_interval_s
+        self._last_render_time = 0.0
+
+        plt.ion()
+
+        self.fig, self.ax1 = plt.subplots()
+        if window_title is not None:
+            plt.get_current_fig_manager().set_window_title(window_title)
+
+        # Lines are only drawn explicitly (blitting), not as part of the background
+        self.ax2, self.battery_line, self.cpu_line = setup_axes(self.ax1, title, animated=True)
+
+        self.fig.tight_layout()  # otherwise the right y-label is slightly clipped
+        plt.show()
+
+        self._background = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.fig.canvas.draw()
+
+    def update(self, battery_percents : np.ndarray, cpu_utils : np.ndarray, force : bool = False) -> bool:
+        '''
+        Update the lines with the full series
+
+        :param battery_percents: All battery percentages
+        :type: np.ndarray
+        :param cpu_utils: All CPU utilizations
+        :type: np.ndarray
+        :param force: Render even if the minimum interval has not elapsed
+        :type: bool
+        :return: True if a frame was rendered
+        :rtype: bool
+        '''
+
+        now = time.monotonic()
+        if not force and now - self._last_render_time < self.min_interval_s:
+            return False
+        self._last_render_time = now
+
+        if len(battery_percents) == 0:
+            return False
+
+        width_px = int(self.ax1.bbox.width)
+        self.battery_line.set_data(*minmax_decimate(battery_percents, width_px))
+        self.cpu_line.set_data(*minmax_decimate(cpu_utils, width_px))
+
+        if grow_limits(self.ax1, battery_percents) or self._background is None:
+            # Full redraw, the background is captured again in _on_draw
+            self.fig.canvas.draw()
+        else:
+            self.fig.canvas.restore_region(self._background)
+            self._draw_lines()
+            self.fig.canvas.blit(self.fig.bbox)
+
+        self.fig.canvas.flush_events()
+        return True
+
+    def _draw_lines(self):
+        self.ax1.draw_artist(self.battery_line)
+        self.ax2.draw_artist(self.cpu_line)
+
+    def _on_draw(self, event):
+        '''
+        Capture the background (everything except the lines) after every full draw, including window resizes
+        '''
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+
+class HeadlessRenderer(threading.Thread):
+    '''
+    Off-screen (Agg) battery percentage & CPU utilization graph rendered on a background thread at a fixed frame rate.
+    Every frame reads the vehicle telemetry buffer directly, so sampling and mission control never wait for rendering.
+    Frames are written as a PNG snapshot (replaced on every frame) and/or appended to a video file.
+    '''
+
+    def __init__(self, telemetry : TelemetryBuffer, title : str, frame_rate : float = 1, snapshot_path : Optional[str] = None,
+                 video_path : Optional[str] = None, size_px : Tuple[int, int] = (1280, 720), dpi : int = 100):
+        '''
+        Initialize the HeadlessRenderer object (call start to begin rendering)
+
+        :param telemetry: Telemetry buffer of the vehicle (single producer, read without locking)
+        :type: TelemetryBuffer
+        :param title: Title of the graph
+        :type: str
+        :param frame_rate: Frames rendered per second
+        :type: float
+        :param snapshot_path: PNG file replaced with the latest frame
+        :type: Optional[str]
+        :param video_path: Video file the frames are encoded to with ffmpeg (GIF is not supported, Pillow keeps every frame in memory)
+        :type: Optional[str]
+        :param size_px: Width and height of the frames in pixels
+        :type: Tuple[int, int]
+        :param dpi: Resolution of the frames
+        :type: int
+        '''
+        super().__init__(name="headless-renderer", daemon=True)
+
+        self.telemetry = telemetry
+        self.frame_interval_s = 1 / frame_rate
+        self.snapshot_path = snapshot_path
+        self.video_path = video_path
+        self.dpi = dpi
+
+        self.frames = 0
+        self._stop_event = threading.Event()
+
+        # Figure without pyplot, pyplot is not thread safe and would select an interactive backend
+        self.fig = Figure(figsize=(size_px[0] / dpi, size_px[1] / dpi), dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        self.ax1 = self.fig.add_subplot()
+        self.ax2, self.battery_line, self.cpu_line = setup_axes(self.ax1, title, animated=False)
+        self.fig.tight_layout()
+
+        self._writer : Optional[manimation.AbstractMovieWriter] = None
+        if video_path is not None:
+            if video_path.endswith(".gif"):
+                print(f"GIF frames are kept in memory until the end of the run, {video_path} will not be written (use an .mp4 path)")
+            elif manimation.FFMpegWriter.isAvailable():
+                self._writer = manimation.FFMpegWriter(fps=max(int(round(frame_rate)), 1))
+            else:
+                print(f"ffmpeg is not available, {video_path} will not be written (use --snapshot-path)")
+
+    def run(self):
+        if self._writer is not None:
+            self._writer.setup(self.fig, self.video_path, self.dpi)
+
+        rendered_len = -1
+        try:
+            next_frame_time = time.monotonic()
+            while not self._stop_event.is_set():
+                # Frames are only rendered when new samples arrived
+                if len(self.telemetry) != rendered_len:
+                    rendered_len = self.render_frame()
+
+                next_frame_time += self.frame_interval_s
+                self._stop_event.wait(max(next_frame_time - time.monotonic(), 0))
+
+            # Final frame with every sample
+            if len(self.telemetry) != rendered_len:
+                self.render_frame()
+        finally:
+            if self._writer is not None:
+                self._writer.finish()
+
+    def render_frame(self) -> int:
+        '''
+        Render the current telemetry and write the frame
+
+        :return: Number of samples in the frame
+        :rtype: int
+        '''
+        battery_percents = self.telemetry.battery_percents
+        cpu_utils = self.telemetry.cpu_utils[:len(battery_percents)]
+
+        if len(battery_percents) > 0:
+            width_px = int(self.ax1.bbox.width)
+            self.battery_line.set_data(*minmax_decimate(battery_percents, width_px))
+            self.cpu_line.set_data(*minmax_decimate(cpu_utils, width_px))
+            grow_limits(self.ax1, battery_percents)
+
+        if self._writer is not None:
+            self._writer.grab_frame()
+
+        if self.snapshot_path is not None:
+            # Replaced atomically so readers never see a partial PNG
+            tmp_path = f"{self.snapshot_path}.tmp.png"
+            self.fig.savefig(tmp_path, dpi=self.dpi)
+            os.replace(tmp_path, self.snapshot_path)
+
+        self.frames += 1
+        return len(battery_percents)
+
+    def stop(self):
+        '''
+        Render the last frame, finish the video file and wait for the thread to exit
+        '''
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,482 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import copy
+import select
+import signal
+import socket
+import threading
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from pymavlink import mavutil
+from dataflash import DataFlashLog, HEAD1, HEAD2
+
+mavlink = mavutil.mavlink
+
+# Replayed vehicles use the SITL system/component ids
+VEHICLE_SYSID = 1
+VEHICLE_COMPID = 1
+
+# Drone idx is served to 127.0.0.1:(BASE_PORT + PORT_STRIDE * idx), same ports as startup_sim.py
+BASE_PORT = 14550
+PORT_STRIDE = 10
+
+# Interval of the messages synthesized for DataFlash logs (HEARTBEAT, SYSTEM_TIME, EKF_STATUS_REPORT)
+SYNTH_INTERVAL_US = 1000000
+
+# EKF_STATUS_REPORT flags of a healthy EKF (every estimate good, not in constant position mode)
+EKF_FLAGS_OK = (mavlink.EKF_ATTITUDE | mavlink.EKF_VELOCITY_HORIZ | mavlink.EKF_VELOCITY_VERT | mavlink.EKF_POS_HORIZ_REL |
+                mavlink.EKF_POS_HORIZ_ABS | mavlink.EKF_POS_VERT_ABS | mavlink.EKF_POS_VERT_AGL |
+                mavlink.EKF_PRED_POS_HORIZ_REL | mavlink.EKF_PRED_POS_HORIZ_ABS)
+
+# ArduCopter HEARTBEAT base modes
+BASE_MODE_DISARMED = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED | mavlink.MAV_MODE_FLAG_STABILIZE_ENABLED | mavlink.MAV_MODE_FLAG_MANUAL_INPUT_ENABLED
+BASE_MODE_ARMED = BASE_MODE_DISARMED | mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+
+# DataFlash EV ids
+EVENT_ARMED = 10
+EVENT_DISARMED = 11
+
+# Pause between the end of the log and the start of the next loop, in log time
+LOOP_GAP_US = 1000000
+
+
+@dataclass
+class ReplayLog:
+    '''
+    Vehicle messages of a recording sorted by time, shared (read only) by every replay server
+    '''
+
+    # Log time of every message in microseconds
+    times_us : np.ndarray
+    messages : List[mavlink.MAVLink_message]
+
+    # Vehicle parameters served on PARAM_REQUEST_LIST
+    params : Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def duration_us(self) -> int:
+        return int(self.times_us[-1] - self.times_us[0]) if len(self.times_us) > 0 else 0
+
+
+def _sorted_log(entries : List[Tuple[int, mavlink.MAVLink_message]], params : Dict[str, float]) -> ReplayLog:
+    times_us = np.asarray([entry[0] for entry in entries], dtype=np.int64)
+    order = np.argsort(times_us, kind='stable')
+    return ReplayLog(times_us[order], [entries[idx][1] for idx in order], params)
+
+
+def load_tlog(tlog_path : str) -> ReplayLog:
+    '''
+    Load the messages sent by the vehicle from a telemetry log (messages of the GCS are dropped)
+
+    :param tlog_path: Path of the .tlog file
+    :type: str
+    :return: Replay log
+    :rtype: ReplayLog
+    '''
+
+    tlog = mavutil.mavlink_connection(tlog_path, robust_parsing=True)
+    vehicle_sysid = None
+    entries = []
+    params : Dict[str, float] = {}
+
+    while True:
+        msg = tlog.recv_msg()
+        if msg is None:
+            break
+
+        msg_type = msg.get_type()
+        if msg_type == 'BAD_DATA':
+            continue
+
+        # The vehicle is the first system sending an autopilot HEARTBEAT
+        if vehicle_sysid is None:
+            if msg_type != 'HEARTBEAT' or msg.autopilot == mavlink.MAV_AUTOPILOT_INVALID:
+                continue
+            vehicle_sysid = msg.get_srcSystem()
+
+        if msg.get_srcSystem() != vehicle_sysid or msg.get_msgId() > 255:
+            continue
+
+        # Parameters are served from the table, the recorded indices would not match
+        if msg_type == 'PARAM_VALUE':
+            params[msg.param_id] = msg.param_value
+            continue
+
+        entries.append((int(msg._timestamp * 1e6), msg))
+
+    tlog.close()
+    return _sorted_log(entries, params)
+
+
+def _latest_before(times_us : np.ndarray, values : np.ndarray, query_us : np.ndarray, default : int) -> np.ndarray:
+    idx = np.searchsorted(times_us, query_us, side='right') - 1
+    return np.where(idx >= 0, values[np.maximum(idx, 0)] if len(values) > 0 else default, default)
+
+
+def load_dataflash(log_path : str) -> ReplayLog:
+    '''
+    Convert a DataFlash log to the MAVLink messages a vehicle would stream: ATT, POS, GPS and BAT become ATTITUDE,
+    GLOBAL_POSITION_INT, GPS_RAW_INT and SYS_STATUS, HEARTBEAT (mode and armed state from MODE/EV), SYSTEM_TIME
+    and EKF_STATUS_REPORT are synthesized at 1 Hz and PARM gives the parameters
+
+    :param log_path: Path of the .BIN log
+    :type: str
+    :return: Replay log
+    :rtype: ReplayLog
+    '''
+
+    entries : List[Tuple[int, mavlink.MAVLink_message]] = []
+
+    with DataFlashLog(log_path) as log:
+        params = {}
+        parm_msgs = log.messages("PARM")
+        for name, value in zip(parm_msgs["Name"] if len(parm_msgs) > 0 else [], parm_msgs["Value"] if len(parm_msgs) > 0 else []):
+            params[name.decode("ascii", errors="replace")] = float(value)
+
+        for att in log.messages("ATT"):
+            entries.append((int(att["TimeUS"]), mavlink.MAVLink_attitude_message(
+                int(att["TimeUS"] // 1000), np.radians(att["Roll"]), np.radians(att["Pitch"]), np.radians(att["Yaw"]), 0, 0, 0)))
+
+        for pos in log.messages("POS"):
+            entries.append((int(pos["TimeUS"]), mavlink.MAVLink_global_position_int_message(
+                int(pos["TimeUS"] // 1000), int(round(pos["Lat"] * 1e7)), int(round(pos["Lng"] * 1e7)),
+                int(pos["Alt"] * 1000), int(pos["RelHomeAlt"] * 1000), 0, 0, 0, 65535)))
+
+        for gps in log.messages("GPS"):
+            entries.append((int(gps["TimeUS"]), mavlink.MAVLink_gps_raw_int_message(
+                int(gps["TimeUS"]), int(gps["Status"]), int(round(gps["Lat"] * 1e7)), int(round(gps["Lng"] * 1e7)),
+                int(gps["Alt"] * 1000), int(min(gps["HDop"] * 100, 65535)), 65535, int(gps["Spd"] * 100),
+                int(gps["GCrs"] * 100) % 36000, int(gps["NSats"]))))
+
+        for bat in log.messages("BAT"):
+            if bat["Instance"] != 0:
+                continue
+            entries.append((int(bat["TimeUS"]), mavlink.MAVLink_sys_status_message(
+                0, 0, 0, 0, int(bat["Volt"] * 1000), int(bat["Curr"] * 100), int(bat["RemPct"]), 0, 0, 0, 0, 0, 0)))
+
+        if len(entries) == 0:
+            return _sorted_log(entries, params)
+
+        first_us = min(entry[0] for entry in entries)
+        last_us = max(entry[0] for entry in entries)
+        synth_times_us = np.arange(first_us, last_us + 1, SYNTH_INTERVAL_US)
+
+        mode_msgs = log.messages("MODE")
+        custom_modes = _latest_before(mode_msgs["TimeUS"].astype(np.int64) if len(mode_msgs) > 0 else np.zeros(0, dtype=np.int64),
+                                      mode_msgs["ModeNum"] if len(mode_msgs) > 0 else np.zeros(0), synth_times_us, 0)
+
+        ev_msgs = log.messages("EV")
+        if len(ev_msgs) > 0:
+            arm_events = ev_msgs[np.isin(ev_msgs["Id"], [EVENT_ARMED, EVENT_DISARMED])]
+            armed = _latest_before(arm_events["TimeUS"].astype(np.int64), arm_events["Id"] == EVENT_ARMED, synth_times_us, False)
+        else:
+            armed = np.zeros(len(synth_times_us), dtype=bool)
+
+    for synth_us, custom_mode, is_armed in zip(synth_times_us.tolist(), custom_modes.tolist(), armed.tolist()):
+        entries.append((synth_us, mavlink.MAVLink_heartbeat_message(
+            mavlink.MAV_TYPE_QUADROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA, BASE_MODE_ARMED if is_armed else BASE_MODE_DISARMED,
+            int(custom_mode), mavlink.MAV_STATE_ACTIVE if is_armed else mavlink.MAV_STATE_STANDBY, 3)))
+        entries.append((synth_us, mavlink.MAVLink_system_time_message(0, synth_us // 1000)))
+        entries.append((synth_us, mavlink.MAVLink_ekf_status_report_message(EKF_FLAGS_OK, 0, 0, 0, 0, 0)))
+
+    return _sorted_log(entries, params)
+
+
+def load_replay_log(log_path : str) -> ReplayLog:
+    '''
+    Load a tlog or DataFlash log (detected from the first bytes)
+
+    :param log_path: Path of the log
+    :type: str
+    :return: Replay log
+    :rtype: ReplayLog
+    '''
+    with open(log_path, 'rb') as log_file:
+        header = log_file.read(2)
+
+    if len(header) == 2 and header[0] == HEAD1 and header[1] == HEAD2:
+        return load_dataflash(log_path)
+    return load_tlog(log_path)
+
+
+class ReplayServer(threading.Thread):
+    '''
+    Serves a replay log to a single dronekit connection over UDP, answering the parameter protocol and
+    reflecting arm/mode commands in the replayed HEARTBEATs. The position and battery follow the recording.
+    '''
+
+    def __init__(self, replay_log : ReplayLog, drone_idx : int, speed : float = 1.0, loop : bool = False, host : str = "127.0.0.1"):
+        '''
+        Initialize the ReplayServer object
+
+        :param replay_log: Log to replay (shared between servers)
+        :type: ReplayLog
+        :param drone_idx: Index of the drone, messages are sent to port BASE_PORT + PORT_STRIDE * idx
+        :type: int
+        :param speed: Log time speed multiplier (vehicle time advances this many times faster than real time)
+        :type: float
+        :param loop: Restart at the beginning of the log (vehicle time keeps increasing) instead of stopping
+        :type: bool
+        :param host: Host the dronekit connection listens on
+        :type: str
+        '''
+        super().__init__(name=f"replay-{drone_idx}", daemon=True)
+
+        self.replay_log = replay_log
+        self.drone_idx = drone_idx
+        self.speed = speed
+        self.loop = loop
+        self.client_address = (host, BASE_PORT + PORT_STRIDE * drone_idx)
+
+        self.sent_count = 0
+        self.loop_count = 0
+        self.stop_event = threading.Event()
+
+        self._param_names = list(replay_log.params.keys())
+        self._params = dict(replay_log.params)
+
+        # Commanded state, overrides the recorded HEARTBEATs once set
+        self._armed : Optional[bool] = None
+        self._custom_mode : Optional[int] = None
+
+        # Requested streams: default streams stopped (REQUEST_DATA_STREAM) and intervals in log time per message type
+        # (SET_MESSAGE_INTERVAL, -1 disables a type, 0 replays it as recorded)
+        self._streams_stopped = False
+        self._intervals_us : Dict[str, int] = {}
+        self._last_sent_us : Dict[str, int] = {}
+        self.filtered_count = 0
+
+        self._mav = mavlink.MAVLink(None, srcSystem=VEHICLE_SYSID, srcComponent=VEHICLE_COMPID)
+        self._parser = mavlink.MAVLink(None)
+        self._parser.robust_parsing = True
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, 0))
+        self._sock.setblocking(False)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        times_us = self.replay_log.times_us
+        messages = self.replay_log.messages
+        if len(messages) == 0:
+            return
+
+        start_time = time.monotonic()
+        log_start_us = int(times_us[0])
+        loop_offset_us = 0
+        msg_idx = 0
+
+        while not self.stop_event.is_set():
+            log_now_us = log_start_us + (time.monotonic() - start_time) * self.speed * 1e6
+
+            # Send every message that is due
+            while msg_idx < len(messages) and times_us[msg_idx] + loop_offset_us <= log_now_us:
+                if self._stream_allows(messages[msg_idx].get_type(), int(times_us[msg_idx]) + loop_offset_us):
+                    self._send_replayed(messages[msg_idx], loop_offset_us)
+                else:
+                    self.filtered_count += 1
+                msg_idx += 1
+
+            if msg_idx == len(messages):
+                if not self.loop:
+                    return
+                loop_offset_us += self.replay_log.duration_us + LOOP_GAP_US
+                self.loop_count += 1
+                msg_idx = 0
+                continue
+
+            # Wait for the next message or a request from the client
+            wait_s = min((times_us[msg_idx] + loop_offset_us - log_now_us) / (self.speed * 1e6), 0.1)
+            readable, _, _ = select.select([self._sock], [], [], max(wait_s, 0))
+            if len(readable) > 0:
+                self._receive()
+
+    def _send(self, msg : mavlink.MAVLink_message):
+        try:
+            self._sock.sendto(msg.pack(self._mav, force_mavlink1=True), self.client_address)
+            self.sent_count += 1
+        except OSError:
+            # Nobody listening yet (connection refused), the next messages are sent anyway
+            pass
+
+    def _stream_allows(self, msg_type : str, log_time_us : int) -> bool:
+        '''
+        Whether a recorded message is sent with the requested streams (rate limited to its interval in log time)
+        '''
+        interval_us = self._intervals_us.get(msg_type)
+        if interval_us is None:
+            return not self._streams_stopped
+        if interval_us < 0:
+            return False
+
+        last_sent_us = self._last_sent_us.get(msg_type)
+        if interval_us > 0 and last_sent_us is not None and log_time_us - last_sent_us < interval_us:
+            return False
+        self._last_sent_us[msg_type] = log_time_us
+        return True
+
+    def _send_replayed(self, msg : mavlink.MAVLink_message, loop_offset_us : int):
+        # Messages are shared between servers, packing and overrides work on a copy
+        msg = copy.copy(msg)
+
+        if loop_offset_us > 0:
+            if hasattr(msg, 'time_boot_ms'):
+                msg.time_boot_ms += loop_offset_us // 1000
+            if hasattr(msg, 'time_usec'):
+                msg.time_usec += loop_offset_us
+
+        if msg.get_type() == 'HEARTBEAT':
+            if self._armed is not None:
+                msg.base_mode = BASE_MODE_ARMED if self._armed else (msg.base_mode & ~mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
+            if self._custom_mode is not None:
+                msg.custom_mode = self._custom_mode
+
+        self._send(msg)
+
+    def _send_param(self, param_idx : int):
+        name = self._param_names[param_idx]
+        self._send(mavlink.MAVLink_param_value_message(name.encode("ascii"), self._params[name], mavlink.MAV_PARAM_TYPE_REAL32,
+                                                       len(self._param_names), param_idx))
+
+    def _receive(self):
+        try:
+            data, _ = self._sock.recvfrom(65535)
+        except OSError:
+            return
+
+        try:
+            requests = self._parser.parse_buffer(data) or []
+        except mavlink.MAVError:
+            return
+
+        for request in requests:
+            self._handle_request(request)
+
+    def _handle_request(self, request : mavlink.MAVLink_message):
+        request_type = request.get_type()
+
+        if request_type == 'PARAM_REQUEST_LIST':
+            for param_idx in range(len(self._param_names)):
+                self._send_param(param_idx)
+
+        elif request_type == 'PARAM_REQUEST_READ':
+            param_id = request.param_id
+            if 0 <= request.param_index < len(self._param_names):
+                self._send_param(request.param_index)
+            elif param_id in self._params:
+                self._send_param(self._param_names.index(param_id))
+
+        elif request_type == 'PARAM_SET':
+            if request.param_id not in self._params:
+                self._param_names.append(request.param_id)
+            self._params[request.param_id] = request.param_value
+            self._send_param(self._param_names.index(request.param_id))
+
+        elif request_type == 'SET_MODE':
+            self._custom_mode = request.custom_mode
+
+        elif request_type == 'REQUEST_DATA_STREAM':
+            # Only the ALL stream is modeled, the recording is not split into stream groups
+            if request.req_stream_id == mavlink.MAV_DATA_STREAM_ALL:
+                self._streams_stopped = request.start_stop == 0
+
+        elif request_type == 'MISSION_REQUEST_LIST':
+            self._send(mavlink.MAVLink_mission_count_message(request.get_srcSystem(), request.get_srcComponent(), 0))
+
+        elif request_type == 'COMMAND_LONG':
+            result = mavlink.MAV_RESULT_ACCEPTED
+            if request.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+                self._armed = request.param1 == 1
+            elif request.command == mavlink.MAV_CMD_DO_SET_MODE:
+                self._custom_mode = int(request.param2)
+            elif request.command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL:
+                msg_class = mavlink.mavlink_map.get(int(request.param1))
+                if msg_class is None:
+                    result = mavlink.MAV_RESULT_DENIED
+                else:
+                    self._intervals_us[msg_class.msgname] = int(request.param2)
+            elif request.command == mavlink.MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES:
+                self._send(mavlink.MAVLink_autopilot_version_message(
+                    mavlink.MAV_PROTOCOL_CAPABILITY_PARAM_FLOAT | mavlink.MAV_PROTOCOL_CAPABILITY_MISSION_INT |
+                    mavlink.MAV_PROTOCOL_CAPABILITY_SET_POSITION_TARGET_GLOBAL_INT, 0, 0, 0, 0, [0] * 8, [0] * 8, [0] * 8, 0, 0, 0))
+            elif request.command != mavlink.MAV_CMD_NAV_TAKEOFF:
+                result = mavlink.MAV_RESULT_UNSUPPORTED
+            self._send(mavlink.MAVLink_command_ack_message(request.command, result))
+
+
+def run_replay(replay_log : ReplayLog, drone_idxs : List[int], speed : float = 1.0, loop : bool = False, status_interval : float = 5):
+    '''
+    Serve the log to several drones until the log ends (or forever when looping). SIGINT and SIGTERM stop every server.
+
+    :param replay_log: Log to replay
+    :type: ReplayLog
+    :param drone_idxs: Indices of the drones to serve
+    :type: List[int]
+    :param speed: Log time speed multiplier
+    :type: float
+    :param loop: Restart at the beginning of the log instead of stopping
+    :type: bool
+    :param status_interval: Time between two status prints in seconds
+    :type: float
+    '''
+
+    servers = [ReplayServer(replay_log, drone_idx, speed, loop) for drone_idx in drone_idxs]
+    stop_event = threading.Event()
+
+    def stop_signal_handler(signum, frame):
+        print("Stopping replay...")
+        stop_event.set()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, stop_signal_handler)
+
+    for server in servers:
+        server.start()
+        print(f"Drone {server.drone_idx}: replaying to {server.client_address[0]}:{server.client_address[1]}")
+
+    while any(server.is_alive() for server in servers):
+        if stop_event.wait(status_interval):
+            break
+        for server in servers:
+            print(f"Drone {server.drone_idx}: {server.sent_count} messages sent, {server.filtered_count} filtered by the requested streams, loop {server.loop_count}")
+
+    for server in servers:
+        server.stop()
+        server.join()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replays a recorded tlog or DataFlash log over UDP so dronekit/EnergyVehicle can connect without SITL")
+    parser.add_argument("log_path", type=str, help="The path of the .tlog or DataFlash .BIN log to replay")
+    parser.add_argument("--drones", type=int, default=1, help="Number of drones to serve (ports 14550, 14560, ...)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speed multiplier of the log time")
+    parser.add_argument("--loop", action="store_true", help="Restart at the beginning of the log instead of stopping")
+    parser.add_argument("--status-interval", type=float, default=5, help="Time between two status prints in seconds")
+
+    args = parser.parse_args()
+
+    if args.speed <= 0:
+        print("Speed must be positive!")
+        exit(1)
+
+    load_start = time.time()
+    try:
+        replay = load_replay_log(args.log_path)
+    except OSError as oe:
+        print(f"Failed to open {args.log_path} with error: {oe}")
+        exit(1)
+
+    if len(replay.messages) == 0:
+        print(f"{args.log_path} does not contain any vehicle message!")
+        exit(1)
+
+    print(f"Loaded {len(replay.messages)} messages ({replay.duration_us / 1e6:.1f} s) and {len(replay.params)} parameters "
+          f"in {time.time() - load_start:.2f} s")
+
+    run_replay(replay, list(range(args.drones)), args.speed, args.loop, args.status_interval)
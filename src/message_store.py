@@ -0,0 +1,164 @@
+import struct
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, Optional, Tuple, BinaryIO
+from pymavlink.dialects.v20.ardupilotmega import MAVLink_message
+
+# Write buffer of the spill file, evicted messages reach the disk in large writes instead of one write per few messages
+SPILL_BUFFER_SIZE = 1 << 20
+
+
+class MessageStore:
+    '''
+    Bounded store of received MAVLink messages. Keeps the most recent messages of every type in a fixed capacity
+    ring buffer along with per-type counters, evicted messages can be spilled to an append-only tlog file.
+    Behaves like a read-only Dict[str, Deque[MAVLink_message]].
+    '''
+
+    def __init__(self, capacity : int = 1000, allowed_types : Optional[Iterable[str]] = None, spill_path : Optional[str] = None):
+        '''
+        Initialize the MessageStore object
+
+        :param capacity: Maximum number of messages kept in memory for every message type
+        :type: int
+        :param allowed_types: Message types to store, all types are stored if not provided
+        :type: Optional[Iterable[str]]
+        :param spill_path: Path of the tlog file evicted messages are appended to, evicted messages are dropped if not provided
+        :type: Optional[str]
+        '''
+
+        self.capacity = capacity
+        self.allowed_types = set(allowed_types) if allowed_types is not None else None
+
+        self._messages : Dict[str, Deque[MAVLink_message]] = {}
+
+        # Total messages received per type and the (first, last) receive time of every type
+        self._counts : Dict[str, int] = {}
+        self._times : Dict[str, Tuple[float, float]] = {}
+
+        # Evictions happen on the MAVLink receive thread, close (and the store replacement) on another one
+        self._spill_lock = threading.Lock()
+        self._spill_file : Optional[BinaryIO] = open(spill_path, 'ab', buffering=SPILL_BUFFER_SIZE) if spill_path is not None else None
+
+    def add(self, message : MAVLink_message) -> bool:
+        '''
+        Store a message, evicting (and spilling) the oldest message of the same type if its buffer is full
+
+        :param message: Received message
+        :type: MAVLink_message
+        :return: True if the message was stored, False if its type is not allowed
+        :rtype: bool
+        '''
+        msg_type : str = message.get_type()
+        if self.allowed_types is not None and msg_type not in self.allowed_types:
+            return False
+
+        msg_time = getattr(message, "_timestamp", None) or time.time()
+
+        msg_buffer = self._messages.get(msg_type)
+        if msg_buffer is None:
+            msg_buffer = deque(maxlen=self.capacity)
+            self._messages[msg_type] = msg_buffer
+            self._counts[msg_type] = 0
+            self._times[msg_type] = (msg_time, msg_time)
+
+        if self._spill_file is not None and len(msg_buffer) == self.capacity:
+            with self._spill_lock:
+                # Checked again, the store may have been closed since
+                if self._spill_file is not None:
+                    self._spill(msg_buffer[0])
+
+        msg_buffer.append(message)
+        self._counts[msg_type] += 1
+        self._times[msg_type] = (self._times[msg_type][0], msg_time)
+        return True
+
+    def count(self, msg_type : str) -> int:
+        '''
+        Get the total number of messages received for a type (including evicted messages)
+
+        :param msg_type: Message type
+        :type: str
+        :return: Number of received messages
+        :rtype: int
+        '''
+        return self._counts.get(msg_type, 0)
+
+    def rate(self, msg_type : str) -> float:
+        '''
+        Get the average receive rate of a message type
+
+        :param msg_type: Message type
+        :type: str
+        :return: Messages per second (0 if fewer than two messages were received)
+        :rtype: float
+        '''
+        if self._counts.get(msg_type, 0) < 2:
+            return 0
+        first_time, last_time = self._times[msg_type]
+        if last_time <= first_time:
+            return 0
+        return (self._counts[msg_type] - 1) / (last_time - first_time)
+
+    def latest(self, msg_type : str) -> Optional[MAVLink_message]:
+        '''
+        Get the most recent message of a type
+
+        :param msg_type: Message type
+        :type: str
+        :return: Most recent message, None if no message of the type was received
+        :rtype: Optional[MAVLink_message]
+        '''
+        msg_buffer = self._messages.get(msg_type)
+        return msg_buffer[-1] if msg_buffer else None
+
+    def close(self):
+        '''
+        Spill all messages still in memory and close the spill file
+        '''
+        with self._spill_lock:
+            if self._spill_file is None:
+                return
+
+            for msg_buffer in list(self._messages.values()):
+                for message in list(msg_buffer):
+                    self._spill(message)
+
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _spill(self, message : MAVLink_message):
+        '''
+        Append a message to the spill file in tlog format (big endian microsecond timestamp followed by the raw message).
+        Called with the spill lock held.
+
+        :param message: Message to spill
+        :type: MAVLink_message
+        '''
+        msg_buf = message.get_msgbuf()
+        if msg_buf is None:
+            return
+        msg_time = getattr(message, "_timestamp", None) or time.time()
+        self._spill_file.write(struct.pack('>Q', int(msg_time * 1.0e6)) + bytes(msg_buf))
+
+    def items(self) -> Iterator[Tuple[str, Deque[MAVLink_message]]]:
+        return iter(list(self._messages.items()))
+
+    def keys(self) -> Iterator[str]:
+        return iter(list(self._messages.keys()))
+
+    def get(self, msg_type : str, default=None):
+        return self._messages.get(msg_type, default)
+
+    def __getitem__(self, msg_type : str) -> Deque[MAVLink_message]:
+        return self._messages[msg_type]
+
+    def __contains__(self, msg_type : str) -> bool:
+        return msg_type in self._messages
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def __len__(self) -> int:
+        return len(self._messages)
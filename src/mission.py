@@ -0,0 +1,394 @@
+import dronekit as dk
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Waits until the arrival event is set or the sleep time elapsed (forever if neither is provided),
+# returns False if the mission should be aborted
+WaitMethod = Callable[[Optional[threading.Event], Optional[float]], bool]
+
+# Distance (in meters) at which a location counts as reached
+ARRIVAL_DISTANCE_M = 1.5
+
+# Mission flown when no mission file is provided (takeoff, two waypoints offset by the drone index and RTL)
+DEFAULT_MISSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "missions", "default.json")
+
+# Mission actions and their required fields
+MISSION_ACTIONS = {
+    "takeoff": ["alt"],
+    "airspeed": ["speed"],
+    "groundspeed": ["speed"],
+    "goto": ["lat", "lon", "alt"],
+    "hold": ["time"],
+    "rtl": [],
+    "land": [],
+}
+
+# WGS84 ellipsoid
+EARTH_SEMI_MAJOR_M = 6378137.0
+EARTH_ECCENTRICITY_SQ = 6.69437999014e-3
+
+
+class LocalFrame:
+    '''
+    Local tangent plane (north/east meters) around an origin. The meters per degree are computed once,
+    converting a location is then two multiplications (accurate to centimeters within a few kilometers).
+    '''
+
+    def __init__(self, origin_lat : float, origin_lon : float):
+        '''
+        Initialize the LocalFrame object
+
+        :param origin_lat: Latitude of the origin in degrees
+        :type: float
+        :param origin_lon: Longitude of the origin in degrees
+        :type: float
+        '''
+        self.origin_lat = origin_lat
+        self.origin_lon = origin_lon
+
+        sin_lat = math.sin(math.radians(origin_lat))
+        curvature_denom = 1 - EARTH_ECCENTRICITY_SQ * sin_lat * sin_lat
+
+        # Meridional and prime vertical radii of curvature
+        self.m_per_deg_lat = math.radians(EARTH_SEMI_MAJOR_M * (1 - EARTH_ECCENTRICITY_SQ) / curvature_denom ** 1.5)
+        self.m_per_deg_lon = math.radians(EARTH_SEMI_MAJOR_M * math.cos(math.radians(origin_lat)) / math.sqrt(curvature_denom))
+
+    def to_ne(self, lat : float, lon : float) -> Tuple[float, float]:
+        '''
+        Convert a location to north/east meters from the origin
+
+        :param lat: Latitude in degrees
+        :type: float
+        :param lon: Longitude in degrees
+        :type: float
+        :return: North and east offsets in meters
+        :rtype: Tuple[float, float]
+        '''
+        return (lat - self.origin_lat) * self.m_per_deg_lat, (lon - self.origin_lon) * self.m_per_deg_lon
+
+
+class ArrivalMonitor:
+    '''
+    Checks every position update of the vehicle (on the MAVLink thread) against the current target
+    in a local tangent plane and sets an event on arrival, so waits do not have to poll the location
+    '''
+
+    def __init__(self, vehicle : dk.Vehicle, frame : LocalFrame, arrival_distance_m : float = ARRIVAL_DISTANCE_M,
+                 on_arrival : Optional[Callable[[], None]] = None):
+        '''
+        Initialize the ArrivalMonitor object and start listening to the vehicle location
+
+        :param vehicle: Vehicle to monitor
+        :type: dk.Vehicle
+        :param frame: Local frame the targets are expressed in
+        :type: LocalFrame
+        :param arrival_distance_m: Distance at which a target counts as reached
+        :type: float
+        :param on_arrival: Optional callback run (on the MAVLink thread) when a target is reached
+        :type: Optional[Callable[[], None]]
+        '''
+        self.vehicle = vehicle
+        self.frame = frame
+        self.on_arrival = on_arrival
+
+        self._radius_sq = arrival_distance_m * arrival_distance_m
+        self._target_ne : Optional[Tuple[float, float]] = None
+        self._arrived = threading.Event()
+        self._lock = threading.Lock()
+
+        self.vehicle.add_attribute_listener('location.global_relative_frame', self._on_location)
+
+    def set_target(self, target_ne : Optional[Tuple[float, float]]) -> threading.Event:
+        '''
+        Start monitoring a new target
+
+        :param target_ne: Target in north/east meters of the local frame, None to stop monitoring
+        :type: Optional[Tuple[float, float]]
+        :return: Event set when the target is reached (or the monitor is aborted)
+        :rtype: threading.Event
+        '''
+        with self._lock:
+            self._arrived = threading.Event()
+            self._target_ne = target_ne
+            arrived = self._arrived
+
+        # The vehicle may already be there
+        self._on_location(self.vehicle, 'location.global_relative_frame', self.vehicle.location.global_relative_frame)
+        return arrived
+
+    def abort(self):
+        '''
+        Wake up the current wait
+        '''
+        with self._lock:
+            self._target_ne = None
+            self._arrived.set()
+
+    def close(self):
+        self.vehicle.remove_attribute_listener('location.global_relative_frame', self._on_location)
+
+    def _on_location(self, vehicle : dk.Vehicle, attr_name : str, location : Optional[dk.LocationGlobalRelative]):
+        if location is None or location.lat is None or location.lon is None:
+            return
+
+        north, east = self.frame.to_ne(location.lat, location.lon)
+
+        with self._lock:
+            if self._target_ne is None:
+                return
+            d_north = north - self._target_ne[0]
+            d_east = east - self._target_ne[1]
+            if d_north * d_north + d_east * d_east >= self._radius_sq:
+                return
+            self._target_ne = None
+            self._arrived.set()
+
+        if self.on_arrival is not None:
+            self.on_arrival()
+
+
+@dataclass
+class Mission:
+    '''
+    Declarative mission loaded from a mission JSON file
+    '''
+
+    name : str
+    arrival_distance_m : float
+    steps : List[Dict[str, Any]]
+
+
+def validate_mission_dict(mission_dict : Dict[str, Any]) -> bool:
+    '''
+    Validates a mission dictionary
+
+    :param mission_dict: The dictionary representation of the mission JSON file
+    :type: Dict[str, Any]
+    :return: True if the mission is valid, False otherwise
+    :rtype: bool
+    '''
+
+    if not isinstance(mission_dict, dict) or not isinstance(mission_dict.get("steps"), list):
+        print("Mission must contain a list of steps!")
+        return False
+
+    for step_idx, step in enumerate(mission_dict["steps"]):
+        if not isinstance(step, dict) or step.get("action") not in MISSION_ACTIONS:
+            print(f"Step {step_idx} does not have a valid action (options are: {', '.join(MISSION_ACTIONS.keys())})!")
+            return False
+
+        for key in MISSION_ACTIONS[step["action"]]:
+            if not isinstance(step.get(key), (int, float)):
+                print(f"Step {step_idx} ({step['action']}) requires a numeric {key}!")
+                return False
+
+        drone_offset = step.get("drone_offset", [0, 0])
+        if not isinstance(drone_offset, list) or len(drone_offset) != 2:
+            print(f"Step {step_idx} drone_offset must be [lat, lon] degrees per drone index!")
+            return False
+
+    return True
+
+
+def load_mission(mission_path : str) -> Optional[Mission]:
+    '''
+    Load and validate a mission JSON file
+
+    :param mission_path: Path of the mission file
+    :type: str
+    :return: Loaded mission, None if the file is not valid
+    :rtype: Optional[Mission]
+    '''
+    try:
+        with open(mission_path, 'r') as mission_file:
+            mission_dict = json.load(mission_file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Failed to load mission {mission_path} with error: {e}")
+        return None
+
+    if not validate_mission_dict(mission_dict):
+        return None
+
+    return Mission(name=mission_dict.get("name", os.path.splitext(os.path.basename(mission_path))[0]),
+                   arrival_distance_m=float(mission_dict.get("arrival_distance_m", ARRIVAL_DISTANCE_M)),
+                   steps=mission_dict["steps"])
+
+
+def make_event_wait(stop_event : threading.Event) -> WaitMethod:
+    '''
+    Create a wait method that blocks on the arrival event without any graph, used when several missions run in one process.
+    The mission executor sets the arrival event when aborted, so stopping does not need polling either.
+
+    :param stop_event: Event that aborts the wait (and the mission) when set
+    :type: threading.Event
+    :return: Wait method for MissionExecutor
+    :rtype: WaitMethod
+    '''
+
+    def wait(arrived : Optional[threading.Event], sleep_time : Optional[float]) -> bool:
+        if arrived is None:
+            return not stop_event.wait(sleep_time)
+        arrived.wait(sleep_time)
+        return not stop_event.is_set()
+
+    return wait
+
+
+class MissionExecutor:
+    '''
+    Flies a mission with a single vehicle. Waypoints (with the per-drone offsets) are converted to the
+    local frame once, arrival is detected by an ArrivalMonitor on position updates.
+    '''
+
+    def __init__(self, vehicle : dk.Vehicle, mission : Mission, drone_idx : int, wait_method : WaitMethod,
+                 on_arrival : Optional[Callable[[], None]] = None):
+        '''
+        Initialize the MissionExecutor object
+
+        :param vehicle: Connected vehicle to fly the mission with
+        :type: dk.Vehicle
+        :param mission: Mission to fly
+        :type: Mission
+        :param drone_idx: Index of the drone, multiplies the drone offset of every waypoint
+        :type: int
+        :param wait_method: Method that waits for an arrival or a time (and keeps the simulation/graph running)
+        :type: WaitMethod
+        :param on_arrival: Optional callback run when a waypoint is reached (e.g. to wake up a graph loop)
+        :type: Optional[Callable[[], None]]
+        '''
+        self.vehicle = vehicle
+        self.mission = mission
+        self.drone_idx = drone_idx
+        self.wait_method = wait_method
+        self.on_arrival = on_arrival
+
+        # Per-drone waypoint of every goto step (None for the other steps)
+        self.waypoints : List[Optional[dk.LocationGlobalRelative]] = []
+        for step in mission.steps:
+            if step["action"] != "goto":
+                self.waypoints.append(None)
+                continue
+            lat_offset, lon_offset = step.get("drone_offset", [0, 0])
+            self.waypoints.append(dk.LocationGlobalRelative(step["lat"] + lat_offset * drone_idx, step["lon"] + lon_offset * drone_idx, step["alt"]))
+
+        first_waypoint = next((waypoint for waypoint in self.waypoints if waypoint is not None), None)
+        if first_waypoint is not None:
+            self.frame = LocalFrame(first_waypoint.lat, first_waypoint.lon)
+        else:
+            location = vehicle.location.global_relative_frame
+            self.frame = LocalFrame(location.lat or 0.0, location.lon or 0.0)
+
+        self.waypoints_ne = [None if waypoint is None else self.frame.to_ne(waypoint.lat, waypoint.lon) for waypoint in self.waypoints]
+
+        self._monitor : Optional[ArrivalMonitor] = None
+        self._aborted = False
+
+    def run(self) -> bool:
+        '''
+        Fly every step of the mission
+
+        :return: True if the mission completed, False if it was aborted
+        :rtype: bool
+        '''
+        self._monitor = ArrivalMonitor(self.vehicle, self.frame, self.mission.arrival_distance_m, self.on_arrival)
+        try:
+            for step_idx, step in enumerate(self.mission.steps):
+                if self._aborted or not self._run_step(step_idx, step):
+                    return False
+            return True
+        finally:
+            self._monitor.close()
+
+    def abort(self):
+        '''
+        Abort the mission, the current wait returns immediately
+        '''
+        self._aborted = True
+        if self._monitor is not None:
+            self._monitor.abort()
+
+    def _wait_arrival(self, target_ne : Tuple[float, float], timeout : Optional[float]) -> bool:
+        arrived = self._monitor.set_target(target_ne)
+        if self._aborted:
+            arrived.set()
+        return self.wait_method(arrived, timeout)
+
+    def _run_step(self, step_idx : int, step : Dict[str, Any]) -> bool:
+        action = step["action"]
+        vehicle = self.vehicle
+
+        if action == "takeoff":
+            # Set vehicle mode to guided and wait for the armable state
+            vehicle.mode = dk.VehicleMode("GUIDED")
+            vehicle.wait_for_armable()
+
+            vehicle.arm()
+            print(f"Drone {self.drone_idx}: Taking off to {step['alt']}m")
+            vehicle.simple_takeoff(step["alt"])
+            return self.wait_method(None, step.get("hold", 0))
+
+        if action == "airspeed":
+            print(f"Drone {self.drone_idx}: Set default/target airspeed to {step['speed']}")
+            vehicle.airspeed = step["speed"]
+            return True
+
+        if action == "groundspeed":
+            print(f"Drone {self.drone_idx}: Set default/target groundspeed to {step['speed']}")
+            vehicle.groundspeed = step["speed"]
+            return True
+
+        if action == "goto":
+            waypoint = self.waypoints[step_idx]
+            print(f"Drone {self.drone_idx}: Going towards waypoint {step_idx} ({waypoint.lat:.6f}, {waypoint.lon:.6f})")
+            vehicle.simple_goto(waypoint, groundspeed=step.get("groundspeed"))
+
+            # Perform graph updates and simulations until the drone reaches the waypoint
+            if not self._wait_arrival(self.waypoints_ne[step_idx], step.get("timeout")):
+                return False
+            return step.get("hold", 0) <= 0 or self.wait_method(None, step["hold"])
+
+        if action == "hold":
+            return self.wait_method(None, step["time"])
+
+        if action == "rtl":
+            print(f"Drone {self.drone_idx}: Returning to Launch")
+            print(f"Drone {self.drone_idx}: Home location: {vehicle.home_location}")
+            vehicle.mode = dk.VehicleMode("RTL")
+
+            # Wait until the drone reaches the home location (or the timeout if the home location is unknown)
+            home = vehicle.home_location
+            if home is None:
+                return self.wait_method(None, step.get("timeout", 0))
+            return self._wait_arrival(self.frame.to_ne(home.lat, home.lon), None)
+
+        if action == "land":
+            print(f"Drone {self.drone_idx}: Landing")
+            vehicle.mode = dk.VehicleMode("LAND")
+            return self.wait_method(None, step.get("timeout", 0))
+
+        return True
+
+
+def run_mission(vehicle : dk.Vehicle, mission : Mission, drone_idx : int, wait_method : WaitMethod,
+                on_arrival : Optional[Callable[[], None]] = None) -> bool:
+    '''
+    Fly a mission (see MissionExecutor)
+
+    :param vehicle: Connected vehicle to fly the mission with
+    :type: dk.Vehicle
+    :param mission: Mission to fly
+    :type: Mission
+    :param drone_idx: Index of the drone, used to offset the waypoints
+    :type: int
+    :param wait_method: Method that waits for an arrival or a time (and keeps the simulation/graph running)
+    :type: WaitMethod
+    :param on_arrival: Optional callback run when a waypoint is reached
+    :type: Optional[Callable[[], None]]
+    :return: True if the mission completed, False if it was aborted
+    :rtype: bool
+    '''
+    return MissionExecutor(vehicle, mission, drone_idx, wait_method, on_arrival).run()
@@ -0,0 +1,266 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sim_data import PairData, OffloadingMethod, load_sim_data
+from energy_replay import DEFAULT_VOLTAGE, sample_cpu_utils, sample_watts
+from workload_model import WorkloadGenerator, WorkloadMode
+
+# Percentiles reported for the time to depletion
+DEPLETION_PERCENTILES = [5, 25, 50, 75, 95]
+
+
+@dataclass
+class TrialBatch:
+    '''
+    A batch of seeded trials for a single pair, executed by one worker process
+    '''
+
+    method : OffloadingMethod
+    pair : PairData
+    trials : int
+    seed : np.random.SeedSequence
+    capacity_mah : float
+    voltage : float
+    max_steps : int
+    block_steps : int
+    workload_mode : WorkloadMode = WorkloadMode.TRACE
+
+
+def run_trial_batch(batch : TrialBatch) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Simulate a batch of trials until every battery is depleted or max_steps is reached.
+    Steps are generated in blocks of shape (trials, block_steps) so memory stays bounded for long missions.
+    In the Markov workload mode (or for pairs stored without a bin ordering) every trial generates its own bins.
+
+    :param batch: Batch to simulate
+    :type: TrialBatch
+    :return: Step of depletion for every trial (NaN if the battery outlasted max_steps) and the mean wattage of every trial
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    '''
+
+    rng = np.random.default_rng(batch.seed)
+    pair = batch.pair
+    ordering_len = len(pair.bin_ordering)
+
+    workloads : List[WorkloadGenerator] = []
+    if batch.workload_mode == WorkloadMode.MARKOV or ordering_len == 0:
+        workloads = [WorkloadGenerator(pair.workload_model(), rng) for _ in range(batch.trials)]
+
+    capacity_j = batch.voltage * batch.capacity_mah * 3.6
+
+    used_j = np.zeros(batch.trials)
+    depletion_steps = np.full(batch.trials, np.nan)
+    alive = np.ones(batch.trials, dtype=bool)
+
+    step = 0
+    while step < batch.max_steps and alive.any():
+        block_len = min(batch.block_steps, batch.max_steps - step)
+        alive_idx = np.flatnonzero(alive)
+        if len(workloads) > 0:
+            bin_indices = np.stack([workloads[trial_idx].generate(block_len) for trial_idx in alive_idx])
+            cpu_utils = sample_cpu_utils(pair, bin_indices, rng)
+        else:
+            bin_indices = pair.bin_ordering[(step + np.arange(block_len)) % ordering_len]
+            cpu_utils = sample_cpu_utils(pair, bin_indices, rng, trials=len(alive_idx))
+        watts = sample_watts(pair, cpu_utils, rng)
+
+        # Energy used at the end of every step of the block
+        block_used_j = used_j[alive_idx, None] + np.cumsum(watts, axis=1)
+        depleted = block_used_j >= capacity_j
+        depleted_now = depleted.any(axis=1)
+
+        # Depleted trials stop drawing energy at the depletion step
+        first_depleted = np.argmax(depleted, axis=1)
+        depletion_steps[alive_idx[depleted_now]] = step + first_depleted[depleted_now]
+        used_j[alive_idx] = np.where(depleted_now, block_used_j[np.arange(len(alive_idx)), first_depleted], block_used_j[:, -1])
+        alive[alive_idx[depleted_now]] = False
+
+        step += block_len
+
+    steps_run = np.where(np.isnan(depletion_steps), step, depletion_steps + 1)
+    mean_watts = used_j / steps_run
+
+    return depletion_steps, mean_watts
+
+
+def depletion_percentiles(depletion_steps : np.ndarray) -> Dict[str, Optional[float]]:
+    '''
+    Depletion time percentiles over every trial, trials that did not deplete count as depleting after max_steps.
+    A percentile that depends on such a trial is only known to be beyond max_steps and is None.
+
+    :param depletion_steps: Step of depletion (in seconds) for every trial, NaN if the battery did not deplete
+    :type: np.ndarray
+    :return: Percentile (in seconds) or None for every value of DEPLETION_PERCENTILES
+    :rtype: Dict[str, Optional[float]]
+    '''
+
+    depleted_count = int(np.count_nonzero(~np.isnan(depletion_steps)))
+    sorted_steps = np.sort(np.where(np.isnan(depletion_steps), np.inf, depletion_steps))
+
+    percentiles : Dict[str, Optional[float]] = {}
+    for percentile in DEPLETION_PERCENTILES:
+        # Same linear interpolation as np.percentile, between the closest ranks
+        rank = percentile / 100 * (len(sorted_steps) - 1)
+        lower, upper = int(np.floor(rank)), int(np.ceil(rank))
+        if upper >= depleted_count:
+            percentiles[str(percentile)] = None
+        else:
+            percentiles[str(percentile)] = float(sorted_steps[lower] + (sorted_steps[upper] - sorted_steps[lower]) * (rank - lower))
+
+    return percentiles
+
+
+def summarize(depletion_steps : np.ndarray, mean_watts : np.ndarray, max_steps : int) -> Dict[str, object]:
+    '''
+    Summarize the trials of a pair into depletion time percentiles and a mean energy confidence interval
+
+    :param depletion_steps: Step of depletion (in seconds) for every trial, NaN if the battery did not deplete
+    :type: np.ndarray
+    :param mean_watts: Mean wattage (J/s) of every trial
+    :type: np.ndarray
+    :param max_steps: Maximum number of steps of every trial
+    :type: int
+    :return: Summary dictionary (JSON serializable)
+    :rtype: Dict[str, object]
+    '''
+
+    trials = len(mean_watts)
+    depleted = depletion_steps[~np.isnan(depletion_steps)]
+
+    watts_mean = float(mean_watts.mean())
+    watts_ci = float(1.96 * mean_watts.std(ddof=1) / np.sqrt(trials)) if trials > 1 else 0.0
+
+    summary : Dict[str, object] = {
+        "trials": trials,
+        "depleted": len(depleted),
+        "mean_watts": watts_mean,
+        "mean_watts_ci95": [watts_mean - watts_ci, watts_mean + watts_ci],
+        "max_s": max_steps,
+        # None for the percentiles beyond max_s
+        "depletion_s_percentiles": depletion_percentiles(depletion_steps),
+    }
+
+    return summary
+
+
+def run_monte_carlo(data_files : Dict[OffloadingMethod, Dict[str, PairData]], trials : int, capacity_mah : float,
+                    voltage : float = DEFAULT_VOLTAGE, max_steps : int = 24 * 3600, seed : int = 0,
+                    batch_trials : int = 64, block_steps : int = 4096, workers : Optional[int] = None,
+                    workload_mode : WorkloadMode = WorkloadMode.TRACE) -> Dict[str, Dict[str, Dict[str, object]]]:
+    '''
+    Run seeded trials for every pair of every offloading method, spread over a process pool
+
+    :param data_files: Pairs to simulate for every offloading method
+    :type: Dict[OffloadingMethod, Dict[str, PairData]]
+    :param trials: Number of trials per pair
+    :type: int
+    :param capacity_mah: Initial battery capacity in mAh
+    :type: float
+    :param voltage: Battery voltage used to convert mAh to Joules
+    :type: float
+    :param max_steps: Maximum number of 1 second steps per trial
+    :type: int
+    :param seed: Root seed, every batch gets an independent child seed
+    :type: int
+    :param batch_trials: Number of trials per worker task
+    :type: int
+    :param block_steps: Number of steps generated at once per batch
+    :type: int
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :type: Optional[int]
+    :param workload_mode: Replay the recorded bin orderings or generate independent bins per trial from the Markov models
+    :type: WorkloadMode
+    :return: Summary for every pair, indexed by offloading method value and pair name
+    :rtype: Dict[str, Dict[str, Dict[str, object]]]
+    '''
+
+    batch_specs : List[Tuple[OffloadingMethod, PairData, int]] = []
+    for method, pairs in data_files.items():
+        for pair in pairs.values():
+            for batch_start in range(0, trials, batch_trials):
+                batch_specs.append((method, pair, min(batch_trials, trials - batch_start)))
+
+    # One child seed per batch, batches are always created in the same order
+    child_seeds = np.random.SeedSequence(seed).spawn(len(batch_specs))
+    batches = [TrialBatch(method, pair, batch_size, child_seed, capacity_mah, voltage, max_steps, block_steps, workload_mode)
+               for (method, pair, batch_size), child_seed in zip(batch_specs, child_seeds)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        batch_results = list(executor.map(run_trial_batch, batches))
+
+    # Merge the batches of every pair
+    merged : Dict[Tuple[OffloadingMethod, str], List[Tuple[np.ndarray, np.ndarray]]] = {}
+    for batch, batch_result in zip(batches, batch_results):
+        merged.setdefault((batch.method, batch.pair.name), []).append(batch_result)
+
+    results : Dict[str, Dict[str, Dict[str, object]]] = {}
+    for (method, pair_name), pair_results in merged.items():
+        depletion_steps = np.concatenate([depletion for depletion, _ in pair_results])
+        mean_watts = np.concatenate([watts for _, watts in pair_results])
+        results.setdefault(method.value, {})[pair_name] = summarize(depletion_steps, mean_watts, max_steps)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Runs seeded Monte Carlo battery lifetime trials for every pair and offloading method")
+    parser.add_argument("--data", type=str, action="append", required=True,
+                        help="<method>=<data json or .npz path>, where method is 'onboard', 'partial' or 'full'. Can be repeated")
+    parser.add_argument("--trials", type=int, default=1000, help="Number of trials per pair")
+    parser.add_argument("--capacity-mah", type=float, default=1000, help="Initial battery capacity in mAh")
+    parser.add_argument("--voltage", type=float, default=DEFAULT_VOLTAGE, help="Battery voltage used to convert mAh to Joules")
+    parser.add_argument("--max-hours", type=float, default=24, help="Maximum simulated time per trial in hours")
+    parser.add_argument("--seed", type=int, default=0, help="Root seed for all trials")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (defaults to the CPU count)")
+    parser.add_argument("--workload", type=str, default="trace", choices=[mode.value for mode in WorkloadMode], help="Replay the recorded bin orderings ('trace') or generate bins from the Markov models ('markov')")
+    parser.add_argument("--output", type=str, default="monte_carlo_results.json", help="Path of the results file")
+
+    args = parser.parse_args()
+
+    if args.trials <= 0:
+        print("The number of trials must be positive!")
+        exit(1)
+
+    data_files : Dict[OffloadingMethod, Dict[str, PairData]] = {}
+    for data_arg in args.data:
+        method_str, _, data_json_path = data_arg.partition("=")
+        try:
+            method = OffloadingMethod(method_str)
+        except ValueError:
+            print(f"Offloading method {method_str} is not valid!")
+            exit(1)
+
+        if not os.path.exists(data_json_path):
+            print(f"{data_json_path} does not exist!")
+            exit(1)
+
+        sim_data = load_sim_data(data_json_path)
+        if sim_data is None:
+            print(f"Data JSON file {data_json_path} is not valid!")
+            exit(1)
+        data_files[method] = sim_data
+
+    start_time = time.perf_counter()
+    results = run_monte_carlo(data_files, args.trials, args.capacity_mah, args.voltage, int(args.max_hours * 3600), args.seed,
+                              workers=args.workers, workload_mode=WorkloadMode(args.workload))
+    elapsed = time.perf_counter() - start_time
+
+    with open(args.output, 'w') as results_file:
+        json.dump({"capacity_mah": args.capacity_mah, "voltage": args.voltage, "seed": args.seed, "results": results},
+                  results_file, separators=(',', ':'))
+
+    for method_value, pair_summaries in results.items():
+        for pair_name, summary in pair_summaries.items():
+            median_s = summary["depletion_s_percentiles"]["50"]
+            median = f"{median_s / 60:.1f} min" if median_s is not None else f"> {summary['max_s'] / 60:.1f} min"
+            print(f"{method_value:>8} {pair_name:>10}: median time to empty {median}, mean power {summary['mean_watts']:.3f} W")
+
+    print(f"Ran {args.trials} trials per pair in {elapsed:.2f} s, results written to {args.output}")
@@ -0,0 +1,88 @@
+import numpy as np
+from typing import List, Optional, Union
+
+# Number of values generated per refill
+NOISE_BLOCK_SIZE = 4096
+
+
+class NoiseSource:
+    '''
+    Seeded random stream of a single vehicle. Standard normal and uniform values are generated in blocks
+    by a numpy Generator and handed out one at a time as Python floats, so the per-sample path does not
+    call into the random generator. The same seed always gives the same stream.
+    '''
+
+    def __init__(self, seed : Optional[Union[int, np.random.SeedSequence]] = None, block_size : int = NOISE_BLOCK_SIZE):
+        '''
+        Initialize the NoiseSource object
+
+        :param seed: Seed (or seed sequence) of the stream, fresh OS entropy if not provided
+        :type: Optional[Union[int, np.random.SeedSequence]]
+        :param block_size: Number of values generated per refill
+        :type: int
+        '''
+        self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_seq)
+        self.block_size = block_size
+
+        self._normals : List[float] = []
+        self._normal_idx = 0
+        self._uniforms : List[float] = []
+        self._uniform_idx = 0
+
+    @classmethod
+    def for_drone(cls, seed : Optional[int], drone_idx : int, block_size : int = NOISE_BLOCK_SIZE) -> 'NoiseSource':
+        '''
+        Create the stream of a drone. Streams of different drones with the same seed are independent.
+
+        :param seed: Seed shared by every drone of a run, fresh OS entropy if not provided
+        :type: Optional[int]
+        :param drone_idx: Index of the drone
+        :type: int
+        :param block_size: Number of values generated per refill
+        :type: int
+        :return: Noise source of the drone
+        :rtype: NoiseSource
+        '''
+        return cls(np.random.SeedSequence(seed, spawn_key=(drone_idx,)), block_size)
+
+    def standard_normal(self) -> float:
+        '''
+        Next standard normal value
+
+        :return: Value drawn from N(0, 1)
+        :rtype: float
+        '''
+        if self._normal_idx == len(self._normals):
+            self._normals = self.rng.standard_normal(self.block_size).tolist()
+            self._normal_idx = 0
+        value = self._normals[self._normal_idx]
+        self._normal_idx += 1
+        return value
+
+    def normal(self, mean : float, std : float) -> float:
+        '''
+        Next normal value
+
+        :param mean: Mean of the distribution
+        :type: float
+        :param std: Standard deviation of the distribution
+        :type: float
+        :return: Value drawn from N(mean, std^2)
+        :rtype: float
+        '''
+        return mean + std * self.standard_normal()
+
+    def uniform(self) -> float:
+        '''
+        Next uniform value
+
+        :return: Value drawn from [0, 1)
+        :rtype: float
+        '''
+        if self._uniform_idx == len(self._uniforms):
+            self._uniforms = self.rng.random(self.block_size).tolist()
+            self._uniform_idx = 0
+        value = self._uniforms[self._uniform_idx]
+        self._uniform_idx += 1
+        return value
@@ -0,0 +1,292 @@
+#! /usr/bin/env python3.9
+
+import dronekit as dk
+import argparse
+import matplotlib
+import signal
+import threading
+import os
+from os import path
+from typing import Dict, List, Optional
+from energy_vehicle import EnergyVehicle
+from sim_data import OffloadingMethod, PairData, load_sim_data
+from workload_model import WorkloadMode
+from mission import DEFAULT_MISSION_PATH, Mission, MissionExecutor, load_mission, make_event_wait
+from telemetry_recorder import TelemetryRecorder
+from shared_telemetry import TelemetryPublisher, DEFAULT_FLEET_NAME
+from stream_config import StreamConfig, DEFAULT_STREAMS_PATH, load_stream_config
+from live_plot import HeadlessRenderer, graph_title
+import instrumentation
+
+
+class DroneWorker(threading.Thread):
+    '''
+    Thread that connects to a single vehicle and flies its mission, sharing the parsed simulation data with the other drones
+    '''
+
+    def __init__(self, drone_idx : int, sim_data : Dict[str, PairData], offloading_method : OffloadingMethod, mission : Mission,
+                 record_dir : Optional[str] = None, seed : Optional[int] = None, workload_mode : WorkloadMode = WorkloadMode.TRACE,
+                 render_dir : Optional[str] = None, frame_rate : float = 1, video_format : Optional[str] = None,
+                 fleet_name : Optional[str] = None, stream_config : Optional[StreamConfig] = None):
+        '''
+        Initialize the DroneWorker object
+
+        :param drone_idx: Index of the drone (selects the 14550 + 10 * idx port)
+        :type: int
+        :param sim_data: Loaded simulation data, shared between all workers (read only)
+        :type: Dict[str, PairData]
+        :param offloading_method: Offloading method used for the simulation
+        :type: OffloadingMethod
+        :param mission: Mission to fly (shared between all workers, waypoints are offset per drone)
+        :type: Mission
+        :param record_dir: Optional directory every energy sample is recorded to (one file per drone)
+        :type: Optional[str]
+        :param seed: Seed of the noise streams (independent per drone), fresh OS entropy if not provided
+        :type: Optional[int]
+        :param workload_mode: Replay the recorded bin orderings or generate bins from the Markov models
+        :type: WorkloadMode
+        :param render_dir: Optional directory the graph of the drone is rendered to off-screen (drone_<idx>.png snapshot)
+        :type: Optional[str]
+        :param frame_rate: Frames rendered per second
+        :type: float
+        :param video_format: Extension of the video file the frames are also encoded to with ffmpeg (e.g. "mp4")
+        :type: Optional[str]
+        :param fleet_name: If set, publish every energy sample to shared memory under this fleet name (see fleet_dashboard.py)
+        :type: Optional[str]
+        :param stream_config: If set, request only the configured message types at their rates (every message type is streamed otherwise)
+        :type: Optional[StreamConfig]
+        '''
+        super().__init__(name=f"drone-{drone_idx}")
+
+        self.drone_idx = drone_idx
+        self.sim_data = sim_data
+        self.offloading_method = offloading_method
+        self.mission = mission
+        self.record_dir = record_dir
+        self.seed = seed
+        self.workload_mode = workload_mode
+        self.render_dir = render_dir
+        self.frame_rate = frame_rate
+        self.video_format = video_format
+        self.fleet_name = fleet_name
+        self.stream_config = stream_config
+
+        # Set to abort the mission (shutdown or depleted battery)
+        self.stop_event = threading.Event()
+
+        self.vehicle : Optional[EnergyVehicle] = None
+        self.executor : Optional[MissionExecutor] = None
+        self.renderer : Optional[HeadlessRenderer] = None
+        self.error : Optional[Exception] = None
+        self.finished = False
+
+    def run(self):
+        drone_address = f"127.0.0.1:{14550 + 10 * self.drone_idx}" # 14550, 14560, 14570, etc.
+        print(f"Drone {self.drone_idx}: Connecting to drone at {drone_address}")
+
+        try:
+            self.vehicle = dk.connect(drone_address, wait_ready=True, vehicle_class=EnergyVehicle)
+            if self.stop_event.is_set():
+                return
+
+            if self.stream_config is not None:
+                self.vehicle.configure_streams(self.stream_config)
+
+            if self.record_dir is not None:
+                self.vehicle.recorder = TelemetryRecorder(path.join(self.record_dir, f"drone_{self.drone_idx}.telemetry"))
+
+            if self.fleet_name is not None:
+                self.vehicle.publisher = TelemetryPublisher(self.drone_idx, self.offloading_method, self.fleet_name)
+
+            self.vehicle.set_sim_data(self.sim_data, self.offloading_method, self.drone_idx, self.seed, self.workload_mode)
+            self.vehicle.battery_depleted_callback = self.stop
+
+            if self.render_dir is not None:
+                render_base = path.join(self.render_dir, f"drone_{self.drone_idx}")
+                self.renderer = HeadlessRenderer(self.vehicle.telemetry, graph_title(self.drone_idx, self.offloading_method), self.frame_rate,
+                                                 f"{render_base}.png", f"{render_base}.{self.video_format}" if self.video_format is not None else None)
+                self.renderer.start()
+
+            self.executor = MissionExecutor(self.vehicle, self.mission, self.drone_idx, make_event_wait(self.stop_event))
+            if self.stop_event.is_set():
+                return
+            self.executor.run()
+        except Exception as e:
+            print(f"Drone {self.drone_idx}: Mission failed with error: {e}")
+            self.error = e
+        finally:
+            self.finished = True
+            if self.vehicle is not None:
+                self.vehicle.close()
+            if self.renderer is not None:
+                self.renderer.stop()
+
+    def stop(self):
+        '''
+        Abort the mission, the connection is closed once the current wait returns
+        '''
+        self.stop_event.set()
+        if self.executor is not None:
+            self.executor.abort()
+
+    def status(self) -> str:
+        '''
+        One line status of the drone (latest battery percentage and CPU utilization)
+
+        :return: Status line
+        :rtype: str
+        '''
+        if self.vehicle is None:
+            return f"Drone {self.drone_idx}: connecting"
+
+        telemetry = self.vehicle.telemetry
+        if len(telemetry) == 0:
+            return f"Drone {self.drone_idx}: waiting for samples"
+
+        state = "finished" if self.finished else "flying"
+        return f"Drone {self.drone_idx}: {state}, battery {telemetry.battery_percents[-1]:.2f}%, CPU {telemetry.cpu_utils[-1]:.2f}%"
+
+
+def run_fleet(sim_data : Dict[str, PairData], offloading_method : OffloadingMethod, mission : Mission, drone_idxs : List[int],
+              status_interval : float = 5, record_dir : Optional[str] = None, seed : Optional[int] = None,
+              workload_mode : WorkloadMode = WorkloadMode.TRACE, render_dir : Optional[str] = None, frame_rate : float = 1,
+              video_format : Optional[str] = None, fleet_name : Optional[str] = None,
+              stream_configs : Optional[Dict[int, StreamConfig]] = None):
+    '''
+    Fly the missions of every drone concurrently in this process and print a combined status until all missions are done.
+    SIGINT, SIGTERM and SIGUSR1 stop every mission and close all vehicle connections.
+
+    :param sim_data: Loaded simulation data, shared by every drone
+    :type: Dict[str, PairData]
+    :param offloading_method: Offloading method used for the simulation
+    :type: OffloadingMethod
+    :param mission: Mission flown by every drone (waypoints are offset per drone)
+    :type: Mission
+    :param drone_idxs: Indices of the drones to connect to
+    :type: List[int]
+    :param status_interval: Time between two status prints in seconds
+    :type: float
+    :param record_dir: Optional directory every energy sample is recorded to (one file per drone)
+    :type: Optional[str]
+    :param seed: Seed of the noise streams (independent per drone), fresh OS entropy if not provided
+    :type: Optional[int]
+    :param workload_mode: Replay the recorded bin orderings or generate bins from the Markov models
+    :type: WorkloadMode
+    :param render_dir: Optional directory the graph of every drone is rendered to off-screen (one file per drone)
+    :type: Optional[str]
+    :param frame_rate: Frames rendered per second and drone
+    :type: float
+    :param video_format: Extension of the video files the frames are also encoded to with ffmpeg (e.g. "mp4")
+    :type: Optional[str]
+    :param fleet_name: If set, every drone publishes its energy samples to shared memory under this fleet name (see fleet_dashboard.py)
+    :type: Optional[str]
+    :param stream_configs: If set, the stream configuration of every drone index (every message type is streamed otherwise)
+    :type: Optional[Dict[int, StreamConfig]]
+    '''
+
+    stop_event = threading.Event()
+    workers = [DroneWorker(drone_idx, sim_data, offloading_method, mission, record_dir, seed, workload_mode,
+                           render_dir, frame_rate, video_format, fleet_name,
+                           stream_configs[drone_idx] if stream_configs is not None else None) for drone_idx in drone_idxs]
+
+    def stop_signal_handler(signum, frame):
+        print("Stopping all missions...")
+        stop_event.set()
+        for worker in workers:
+            worker.stop()
+
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+        signal.signal(signum, stop_signal_handler)
+
+    for worker in workers:
+        worker.start()
+
+    while any(worker.is_alive() for worker in workers):
+        if stop_event.wait(status_interval):
+            break
+        for worker in workers:
+            print(worker.status())
+
+    # Aborted missions return from their current wait immediately, connections are closed by the workers
+    for worker in workers:
+        worker.join()
+
+    failed = [worker.drone_idx for worker in workers if worker.error is not None]
+    if len(failed) > 0:
+        print(f"Missions failed for drones: {failed}")
+
+    # Final snapshot of the callback timings of every vehicle (if enabled)
+    instrumentation.dump()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Flies the missions of several drones from a single process")
+    parser.add_argument("data_json_path", type=str, help="The path to the created json (or converted .npz) file containing simulation data such as CPU bin info and linear regression equations")
+    parser.add_argument("num_drones", type=int, help="Number of drones to connect to (indices 0 to num_drones - 1)")
+    parser.add_argument("--off-method", type=str, default="onboard", help="The method of offboarding to simulate. Options are: 'onboard', 'partial', 'full'")
+    parser.add_argument("--mission", type=str, default=DEFAULT_MISSION_PATH, help="The mission JSON file every drone flies (defaults to missions/default.json)")
+    parser.add_argument("--status-interval", type=float, default=5, help="Time between two fleet status prints in seconds")
+    parser.add_argument("--record-dir", type=str, default=None, help="Optional directory every energy sample is recorded to (one file per drone)")
+    parser.add_argument("--render-dir", type=str, default=None, help="Optional directory the graph of every drone is rendered to off-screen (drone_<idx>.png, replaced on every frame)")
+    parser.add_argument("--frame-rate", type=float, default=1, help="Frames rendered per second and drone")
+    parser.add_argument("--video-format", type=str, default=None, help="Also encode the frames of every drone to drone_<idx>.<format> with ffmpeg (e.g. mp4, gif is not supported)")
+    parser.add_argument("--publish", action="store_true", help="Publish the energy samples of every drone to shared memory for the fleet dashboard (fleet_dashboard.py)")
+    parser.add_argument("--fleet-name", type=str, default=DEFAULT_FLEET_NAME, help="Fleet name the samples are published under with --publish")
+    parser.add_argument("--streams", type=str, nargs="?", const=DEFAULT_STREAMS_PATH, default=None, help="Request only the message types of a stream configuration JSON file (streams/default.json if no path is given, per drone overrides apply)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the CPU utilization and power noise, runs with the same seed are reproducible")
+    parser.add_argument("--workload", type=str, default="trace", choices=[mode.value for mode in WorkloadMode], help="Replay the recorded bin orderings ('trace') or generate endless bins from their Markov models ('markov')")
+    parser.add_argument("--instrument", action="store_true", help="Record callback latencies and message rates of every vehicle (dumped on SIGUSR2)")
+    parser.add_argument("--instrument-path", type=str, default=None, help="File instrumentation snapshots are appended to (printed if not provided)")
+    parser.add_argument("--instrument-interval", type=float, default=None, help="Time between two periodic instrumentation dumps in seconds")
+
+    args = parser.parse_args()
+
+    # Graphs are only rendered off-screen
+    matplotlib.use("Agg")
+
+    if args.off_method not in ["onboard", "partial", "full"]:
+        print(f"Offloading method {args.off_method} is not valid!")
+        exit(1)
+
+    if not path.exists(args.data_json_path):
+        print(f"{args.data_json_path} does not exist!")
+        exit(1)
+
+    # Pillow keeps every GIF frame in memory, a long fleet run would grow without bound
+    if args.video_format == "gif":
+        print("GIF videos are not supported, use mp4!")
+        exit(1)
+
+    # Enabled before connecting so the vehicle callbacks are wrapped
+    if args.instrument or args.instrument_path is not None or args.instrument_interval is not None:
+        instrumentation.enable(args.instrument_path, args.instrument_interval)
+
+    # Loaded once and shared by every drone
+    data_json_data = load_sim_data(args.data_json_path)
+
+    if data_json_data is None:
+        print("Data JSON file is not valid!")
+        exit(1)
+
+    mission = load_mission(args.mission)
+    if mission is None:
+        print(f"Mission file {args.mission} is not valid!")
+        exit(1)
+
+    stream_configs = None
+    if args.streams is not None:
+        stream_configs = {drone_idx: load_stream_config(args.streams, drone_idx) for drone_idx in range(args.num_drones)}
+        if any(stream_config is None for stream_config in stream_configs.values()):
+            print(f"Stream configuration {args.streams} is not valid!")
+            exit(1)
+
+    if args.record_dir is not None:
+        os.makedirs(args.record_dir, exist_ok=True)
+
+    if args.render_dir is not None:
+        os.makedirs(args.render_dir, exist_ok=True)
+
+    run_fleet(data_json_data, OffloadingMethod(args.off_method), mission, list(range(args.num_drones)), args.status_interval, args.record_dir, args.seed,
+              WorkloadMode(args.workload), args.render_dir, args.frame_rate, args.video_format, args.fleet_name if args.publish else None,
+              stream_configs)
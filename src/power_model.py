@@ -0,0 +1,150 @@
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+from sim_data import PairData
+
+# Odds of adding the poly std noise to a sample (same as random.randint(0, 10) == 5)
+POLY_STD_ODDS = 1 / 11
+
+
+class PowerModel:
+    '''
+    Compiled CPU utilization -> wattage regression of a single pair.
+    The coefficients and poly stds are stored once as contiguous arrays, the batch evaluation
+    reuses scratch buffers so repeated calls do not allocate (not thread safe).
+    '''
+
+    def __init__(self, coefs : np.ndarray, poly_stds : np.ndarray):
+        '''
+        Initialize the PowerModel object
+
+        :param coefs: Regression coefficients, highest power first (same as np.poly1d)
+        :type: np.ndarray
+        :param poly_stds: Wattage std for every integer CPU utilization (0-99)
+        :type: np.ndarray
+        '''
+
+        self.coefs = np.ascontiguousarray(coefs, dtype=np.float64)
+        self.poly_stds = np.ascontiguousarray(poly_stds, dtype=np.float64)
+
+        # Python floats for the scalar (per-heartbeat) path, avoids NumPy scalar overhead
+        self._coefs_list = self.coefs.tolist()
+        self._poly_stds_list = self.poly_stds.tolist()
+        self._max_std_idx = len(self._poly_stds_list) - 1
+
+        self._scratch_size = 0
+        self._noise_buf = np.empty(0)
+        self._std_buf = np.empty(0)
+        self._idx_buf = np.empty(0, dtype=np.int64)
+        self._mask_buf = np.empty(0, dtype=bool)
+
+    @classmethod
+    def from_regression(cls, regression : Dict[str, Any]) -> 'PowerModel':
+        '''
+        Compile a regression dictionary ("coefs" and "poly_stds") from the simulation data JSON
+
+        :param regression: Regression dictionary of a pair
+        :type: Dict[str, Any]
+        :return: Compiled power model
+        :rtype: PowerModel
+        '''
+        return cls(np.asarray(regression["coefs"]), np.asarray(regression["poly_stds"]))
+
+    @classmethod
+    def from_pair(cls, pair : PairData) -> 'PowerModel':
+        '''
+        Compile the regression of an array backed pair
+
+        :param pair: Pair to take the regression from
+        :type: PairData
+        :return: Compiled power model
+        :rtype: PowerModel
+        '''
+        return cls(pair.coefs, pair.poly_stds)
+
+    def base_watts(self, cpu_utilization : float) -> float:
+        '''
+        Evaluate the regression (without noise) for a single CPU utilization
+
+        :param cpu_utilization: CPU utilization to evaluate
+        :type: float
+        :return: Joules/second consumption
+        :rtype: float
+        '''
+        watts = 0.0
+        for coef in self._coefs_list:
+            watts = watts * cpu_utilization + coef
+        return watts
+
+    def poly_std(self, cpu_utilization : float) -> float:
+        '''
+        Get the wattage std for a single CPU utilization
+
+        :param cpu_utilization: CPU utilization to get the std for
+        :type: float
+        :return: Wattage std
+        :rtype: float
+        '''
+        cpu_std_idx = int(cpu_utilization) if cpu_utilization < self._max_std_idx + 1 else self._max_std_idx
+        return self._poly_stds_list[cpu_std_idx]
+
+    def watts_batch(self, cpu_utilizations : np.ndarray, rng : Optional[np.random.Generator] = None, out : Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        Evaluate the regression for an array of CPU utilizations, adding the poly std noise with the same odds as the per-heartbeat path
+
+        :param cpu_utilizations: CPU utilizations to evaluate (any shape)
+        :type: np.ndarray
+        :param rng: Random generator for the noise, no noise is added if not provided
+        :type: Optional[np.random.Generator]
+        :param out: Optional float64 array (same shape as cpu_utilizations) to write the wattages to
+        :type: Optional[np.ndarray]
+        :return: Joules/second consumption for every CPU utilization
+        :rtype: np.ndarray
+        '''
+
+        if out is None:
+            out = np.empty(np.shape(cpu_utilizations))
+
+        # Horner's method, in place
+        out.fill(self.coefs[0] if len(self.coefs) > 0 else 0)
+        for coef in self.coefs[1:]:
+            out *= cpu_utilizations
+            out += coef
+
+        if rng is None:
+            return out
+
+        noise, std, std_idx, noisy = self._scratch(out.shape)
+
+        rng.random(out=noise)
+        np.less(noise, POLY_STD_ODDS, out=noisy)
+
+        np.copyto(std_idx, cpu_utilizations, casting='unsafe')
+        np.clip(std_idx, 0, self._max_std_idx, out=std_idx)
+        np.take(self.poly_stds, std_idx, out=std)
+
+        rng.standard_normal(out=noise)
+        std *= noise
+        std *= noisy
+        out += std
+
+        return out
+
+    def _scratch(self, shape : Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Get scratch buffers of the given shape, growing them only when a larger batch is requested
+
+        :param shape: Shape of the batch
+        :type: Tuple[int, ...]
+        :return: Float noise buffer, float std buffer, int index buffer and bool mask buffer
+        :rtype: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        '''
+        size = int(np.prod(shape))
+        if size > self._scratch_size:
+            self._scratch_size = size
+            self._noise_buf = np.empty(size)
+            self._std_buf = np.empty(size)
+            self._idx_buf = np.empty(size, dtype=np.int64)
+            self._mask_buf = np.empty(size, dtype=bool)
+
+        return (self._noise_buf[:size].reshape(shape), self._std_buf[:size].reshape(shape),
+                self._idx_buf[:size].reshape(shape), self._mask_buf[:size].reshape(shape))
@@ -0,0 +1,258 @@
+import os
+import sys
+import time
+import numpy as np
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple
+from sim_data import OffloadingMethod
+
+# Segments of a fleet are named <fleet name>_drone_<drone index>
+DEFAULT_FLEET_NAME = "league_sim"
+
+# Samples kept per drone (18 hours of 1 second steps, 2 MB per drone)
+RING_CAPACITY = 1 << 16
+
+MAGIC = b"LSRING01"
+
+# Header at the start of every segment, the ring columns follow at HEADER_SIZE
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("capacity", np.int64),
+    # Number of samples published so far, sample i is stored in slot i % capacity
+    ("count", np.int64),
+    ("drone_idx", np.int64),
+    ("method", "S16"),
+    ("pid", np.int64),
+    # Wall time the segment was created at, tells a restarted drone apart from the previous one
+    ("started", np.float64),
+    # Wall time of the latest sample
+    ("updated", np.float64),
+    ("finished", np.int64),
+])
+HEADER_SIZE = 256
+
+# Columns of the ring, every column is stored contiguously (float64)
+COLUMNS = ("timestamp", "battery_percent", "cpu_util", "watts")
+
+
+def segment_name(fleet_name : str, drone_idx : int) -> str:
+    '''
+    Shared memory segment name of a drone
+
+    :param fleet_name: Name shared by every drone of the fleet
+    :type: str
+    :param drone_idx: Index of the drone
+    :type: int
+    :return: Segment name
+    :rtype: str
+    '''
+    return f"{fleet_name}_drone_{drone_idx}"
+
+
+def _map_segment(shm : SharedMemory) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    '''
+    Header record and column views of a segment (views of the shared buffer, no copies)
+    '''
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+    capacity = int(header["capacity"])
+    columns = {name: np.ndarray((capacity,), dtype=np.float64, buffer=shm.buf, offset=HEADER_SIZE + col_idx * capacity * 8)
+               for col_idx, name in enumerate(COLUMNS)}
+    return header, columns
+
+
+class TelemetryPublisher:
+    '''
+    Publishes the energy samples of a drone into a shared memory ring buffer, read by the fleet dashboard
+    (fleet_dashboard.py) without pickling or sockets. Single producer: the slot is written before the sample count
+    is published, readers detect samples overwritten while they copied them from the count.
+    '''
+
+    def __init__(self, drone_idx : int, offloading_method : OffloadingMethod, fleet_name : str = DEFAULT_FLEET_NAME,
+                 capacity : int = RING_CAPACITY):
+        '''
+        Initialize the TelemetryPublisher object and create its segment (replacing a stale one with the same name)
+
+        :param drone_idx: Index of the drone
+        :type: int
+        :param offloading_method: Offloading method used for the simulation
+        :type: OffloadingMethod
+        :param fleet_name: Name shared by every drone of the fleet
+        :type: str
+        :param capacity: Number of samples kept, older samples are overwritten
+        :type: int
+        '''
+        self.name = segment_name(fleet_name, drone_idx)
+        size = HEADER_SIZE + len(COLUMNS) * capacity * 8
+
+        try:
+            self._shm = SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a drone process that did not exit cleanly
+            stale_shm = SharedMemory(self.name)
+            stale_shm.close()
+            stale_shm.unlink()
+            self._shm = SharedMemory(self.name, create=True, size=size)
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._shm.buf)
+        header["capacity"] = capacity
+        header["count"] = 0
+        header["drone_idx"] = drone_idx
+        header["method"] = offloading_method.value.encode()
+        header["pid"] = os.getpid()
+        header["started"] = time.time()
+        header["finished"] = 0
+        # Written last, readers ignore segments without the magic
+        header["magic"] = MAGIC
+
+        self._header, columns = _map_segment(self._shm)
+        self._timestamps = columns["timestamp"]
+        self._battery_percents = columns["battery_percent"]
+        self._cpu_utils = columns["cpu_util"]
+        self._watts = columns["watts"]
+        self._capacity = capacity
+        self._count = 0
+
+    def publish(self, timestamp : float, battery_percent : float, cpu_util : float, watts : float):
+        '''
+        Publish a single energy sample
+
+        :param timestamp: Vehicle time (since boot) at the end of the sample in seconds
+        :type: float
+        :param battery_percent: Battery percentage after the sample
+        :type: float
+        :param cpu_util: Generated CPU utilization
+        :type: float
+        :param watts: Power drawn during the sample
+        :type: float
+        '''
+        slot = self._count % self._capacity
+        self._timestamps[slot] = timestamp
+        self._battery_percents[slot] = battery_percent
+        self._cpu_utils[slot] = cpu_util
+        self._watts[slot] = watts
+
+        # Only publish the sample once it is fully written
+        self._count += 1
+        self._header["updated"] = time.time()
+        self._header["count"] = self._count
+
+    def close(self, unlink : bool = True):
+        '''
+        Mark the drone as finished and close the segment. Dashboards already attached keep their mapping.
+
+        :param unlink: Remove the segment name, dashboards started later no longer find the drone
+        :type: bool
+        '''
+        if self._shm is None:
+            return
+
+        self._header["finished"] = 1
+
+        # Views of the buffer have to be released before it can be closed
+        self._header = self._timestamps = self._battery_percents = self._cpu_utils = self._watts = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+        self._shm = None
+
+
+class TelemetryReader:
+    '''
+    Read only view of the ring buffer of a drone (see TelemetryPublisher)
+    '''
+
+    def __init__(self, shm : SharedMemory):
+        '''
+        Initialize the TelemetryReader object, use TelemetryReader.attach to open a segment by drone index
+
+        :param shm: Attached segment
+        :type: SharedMemory
+        '''
+        self._shm = shm
+        self._header, self._columns = _map_segment(shm)
+        self.capacity = int(self._header["capacity"])
+        self.drone_idx = int(self._header["drone_idx"])
+        self.offloading_method = OffloadingMethod(self._header["method"].item().decode())
+        self.started = float(self._header["started"])
+
+    @classmethod
+    def attach(cls, drone_idx : int, fleet_name : str = DEFAULT_FLEET_NAME) -> Optional['TelemetryReader']:
+        '''
+        Attach to the segment of a drone
+
+        :param drone_idx: Index of the drone
+        :type: int
+        :param fleet_name: Name shared by every drone of the fleet
+        :type: str
+        :return: Reader, None if the drone has not published a segment (yet)
+        :rtype: Optional[TelemetryReader]
+        '''
+        name = segment_name(fleet_name, drone_idx)
+        try:
+            if sys.version_info >= (3, 13):
+                shm = SharedMemory(name, track=False)
+            else:
+                shm = SharedMemory(name)
+                # Attaching registers the segment with the resource tracker, which would unlink it when the reader exits
+                resource_tracker.unregister(shm._name, "shared_memory")
+        except FileNotFoundError:
+            return None
+
+        if shm.size < HEADER_SIZE or bytes(shm.buf[:len(MAGIC)]) != MAGIC:
+            # Still being created
+            shm.close()
+            return None
+        return cls(shm)
+
+    @property
+    def count(self) -> int:
+        '''
+        Number of samples published so far (including overwritten ones)
+        '''
+        return int(self._header["count"])
+
+    @property
+    def finished(self) -> bool:
+        return bool(self._header["finished"])
+
+    @property
+    def updated(self) -> float:
+        return float(self._header["updated"])
+
+    def window(self, max_samples : Optional[int] = None) -> Tuple[int, Dict[str, np.ndarray]]:
+        '''
+        Latest samples in order. Until the ring wraps around the columns are views of the shared buffer,
+        afterwards the two parts of the ring are copied and samples overwritten during the copy are dropped.
+
+        :param max_samples: Maximum number of samples, up to the ring capacity if not provided
+        :type: Optional[int]
+        :return: Index of the first returned sample and every column (see COLUMNS)
+        :rtype: Tuple[int, Dict[str, np.ndarray]]
+        '''
+        count = self.count
+        sample_count = min(count, self.capacity if max_samples is None else min(max_samples, self.capacity))
+        first_idx = count - sample_count
+
+        start_slot = first_idx % self.capacity
+        if start_slot + sample_count <= self.capacity:
+            return first_idx, {name: column[start_slot:start_slot + sample_count] for name, column in self._columns.items()}
+
+        split = self.capacity - start_slot
+        columns = {name: np.concatenate((column[start_slot:], column[:sample_count - split])) for name, column in self._columns.items()}
+
+        # The writer may have overwritten the oldest slots while they were copied
+        overwritten = max(self.count - self.capacity - first_idx, 0)
+        if overwritten > 0:
+            columns = {name: values[overwritten:] for name, values in columns.items()}
+        return first_idx + overwritten, columns
+
+    def close(self):
+        '''
+        Release the views and close the segment (the segment is not removed)
+        '''
+        if self._shm is None:
+            return
+        self._header = self._columns = None
+        self._shm.close()
+        self._shm = None
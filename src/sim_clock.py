@@ -0,0 +1,80 @@
+from typing import Optional
+
+# Length of one energy simulation step in seconds (bin orderings hold one CPU bin per second)
+SIM_STEP_S = 1.0
+
+# A vehicle time going back by more than this is treated as a reboot rather than reordered messages
+REBOOT_TOLERANCE_MS = 5000
+
+
+class SimClock:
+    '''
+    Fixed step clock driven by the vehicle's boot time (time_boot_ms of SYSTEM_TIME and other messages).
+    Steps advance with the simulated time, so energy integration stays correct when SITL runs faster
+    than real time and does not depend on when HEARTBEAT messages are received.
+    '''
+
+    def __init__(self, step_s : float = SIM_STEP_S):
+        '''
+        Initialize the SimClock object
+
+        :param step_s: Length of one step in vehicle seconds
+        :type: float
+        '''
+
+        self.step_s = step_s
+
+        # Latest vehicle time in ms, None until the first time_boot_ms is observed
+        self._latest_ms : Optional[int] = None
+
+        # Vehicle time in ms at which the next step ends
+        self._next_step_ms : float = 0.0
+
+        # Number of steps completed since the first observation
+        self.steps = 0
+
+    @property
+    def now_s(self) -> Optional[float]:
+        '''
+        Latest observed vehicle time in seconds (None if not observed yet)
+        '''
+        return None if self._latest_ms is None else self._latest_ms / 1000.0
+
+    @property
+    def sim_time_s(self) -> float:
+        '''
+        Vehicle time in seconds at the end of the last completed step
+        '''
+        return (self._next_step_ms / 1000.0) - self.step_s
+
+    def observe(self, time_boot_ms : int):
+        '''
+        Record a vehicle time. The first observation (and a reboot) only sets the start of the next step,
+        so no energy is integrated for the time before the connection.
+
+        :param time_boot_ms: Vehicle time since boot in ms
+        :type: int
+        '''
+        if self._latest_ms is None or time_boot_ms + REBOOT_TOLERANCE_MS < self._latest_ms:
+            self._latest_ms = time_boot_ms
+            self._next_step_ms = time_boot_ms + self.step_s * 1000.0
+        elif time_boot_ms > self._latest_ms:
+            self._latest_ms = time_boot_ms
+
+    def advance(self) -> int:
+        '''
+        Complete every step that ended before the latest vehicle time
+
+        :return: Number of steps completed by this call
+        :rtype: int
+        '''
+        # Read once, observe runs on the receive thread while advance runs on the energy worker
+        latest_ms = self._latest_ms
+        if latest_ms is None or latest_ms < self._next_step_ms:
+            return 0
+
+        step_ms = self.step_s * 1000.0
+        step_count = int((latest_ms - self._next_step_ms) // step_ms) + 1
+        self._next_step_ms += step_count * step_ms
+        self.steps += step_count
+        return step_count
@@ -0,0 +1,383 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+from typing import Dict, Any, List, Optional, Union
+from dataclasses import dataclass
+from enum import Enum
+from workload_model import WorkloadModel, fit_workload_model
+from sim_data_validation import load_sim_data_json, validate_data_json_file
+
+
+class OffloadingMethod(Enum):
+    NONE = "none"
+    ONBOARD = "onboard"
+    PARTIAL_OFFLOAD = "partial"
+    FULL_OFFLOAD = "full"
+
+
+@dataclass
+class PairData:
+    '''
+    Array representation of a single video pair from the simulation data JSON
+    '''
+
+    name : str
+
+    # Per-second CPU bin index
+    bin_ordering : np.ndarray
+
+    # CPU bin statistics, indexed by bin number (NaN for bins not present in the pair)
+    bin_means : np.ndarray
+    bin_stds : np.ndarray
+    bin_n : np.ndarray
+
+    # Regression coefficients (highest power first, same as np.poly1d) and per-utilization stds
+    coefs : np.ndarray
+    poly_stds : np.ndarray
+    r_2 : float
+
+    # Markov model of the bin ordering, stored in the data file or fitted on first use (see workload_model)
+    workload : Optional[WorkloadModel] = None
+
+    @property
+    def length(self) -> int:
+        '''
+        Number of seconds simulated for the pair before moving to the next one
+        '''
+        if len(self.bin_ordering) > 0 or self.workload is None:
+            return len(self.bin_ordering)
+        return self.workload.length
+
+    def workload_model(self) -> WorkloadModel:
+        '''
+        Get the Markov model of the pair, fitted from the bin ordering if the data file did not include one
+
+        :return: Workload model of the pair
+        :rtype: WorkloadModel
+        '''
+        if self.workload is None:
+            self.workload = fit_workload_model(self.bin_ordering, len(self.bin_means))
+        return self.workload
+
+
+def compile_pair(name : str, pair_dict : Dict[str, Any]) -> PairData:
+    '''
+    Convert a pair dictionary from the simulation data JSON into contiguous arrays
+
+    :param name: Name of the pair (key in the JSON file)
+    :type: str
+    :param pair_dict: Pair dictionary containing "cpu_bins", "bin_ordering" (or "workload_model") and "regression"
+    :type: Dict[str, Any]
+    :return: Array representation of the pair
+    :rtype: PairData
+    '''
+
+    cpu_bins : Dict[str, Dict[str, float]] = pair_dict["cpu_bins"]
+    bin_ordering = np.asarray(pair_dict.get("bin_ordering", []), dtype=np.int64)
+    workload = WorkloadModel.from_dict(pair_dict["workload_model"]) if "workload_model" in pair_dict else None
+
+    bin_count = max([int(bin_key) for bin_key in cpu_bins.keys()], default=-1) + 1
+    bin_means = np.full(bin_count, np.nan)
+    bin_stds = np.full(bin_count, np.nan)
+    bin_n = np.zeros(bin_count, dtype=np.int64)
+
+    for bin_key, bin_value in cpu_bins.items():
+        bin_means[int(bin_key)] = bin_value["mean"]
+        bin_stds[int(bin_key)] = bin_value["std"]
+        bin_n[int(bin_key)] = bin_value["n"]
+
+    regression = pair_dict["regression"]
+
+    return PairData(
+        name=name,
+        bin_ordering=bin_ordering,
+        bin_means=bin_means,
+        bin_stds=bin_stds,
+        bin_n=bin_n,
+        coefs=np.asarray(regression["coefs"], dtype=np.float64),
+        poly_stds=np.asarray(regression["poly_stds"], dtype=np.float64),
+        r_2=float(regression["r_2"]),
+        workload=workload,
+    )
+
+
+def compact_pair_dict(pair_dict : Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Replace the bin ordering of a pair dictionary with its Markov model (see workload_model)
+
+    :param pair_dict: Pair dictionary containing "cpu_bins", "bin_ordering" and "regression"
+    :type: Dict[str, Any]
+    :return: Pair dictionary containing "cpu_bins", "workload_model" and "regression"
+    :rtype: Dict[str, Any]
+    '''
+    if "bin_ordering" not in pair_dict:
+        return pair_dict
+
+    bin_count = max([int(bin_key) for bin_key in pair_dict["cpu_bins"].keys()], default=-1) + 1
+    workload = fit_workload_model(np.asarray(pair_dict["bin_ordering"], dtype=np.int64), bin_count)
+
+    compact_dict = {key: value for key, value in pair_dict.items() if key != "bin_ordering"}
+    compact_dict["workload_model"] = workload.to_dict()
+    return compact_dict
+
+
+def save_sim_data_npz(pairs : Dict[str, PairData], npz_path : str, source_hash : str = "", model_only : bool = False):
+    '''
+    Save array backed pairs to an uncompressed .npz file. All pairs are packed into a few flat arrays:
+    the bin orderings are concatenated (with offsets), bin statistics and regressions are padded 2D arrays.
+    Workload models are saved as padded 3D arrays when the orderings are left out (or a pair has no ordering).
+
+    :param pairs: Pairs to save, by name
+    :type: Dict[str, PairData]
+    :param npz_path: Path of the .npz file
+    :type: str
+    :param source_hash: SHA-256 of the JSON file the pairs were converted from
+    :type: str
+    :param model_only: Save the workload model of every pair instead of its bin ordering
+    :type: bool
+    '''
+    pair_list = list(pairs.values())
+
+    workload_arrays : Dict[str, np.ndarray] = {}
+    if model_only or any(len(pair.bin_ordering) == 0 and pair.workload is not None for pair in pair_list):
+        workload_arrays = _workload_arrays(pair_list)
+    if model_only:
+        pair_list = [dataclasses.replace(pair, bin_ordering=np.zeros(0, dtype=np.int64)) for pair in pair_list]
+
+    ordering_offsets = np.zeros(len(pair_list) + 1, dtype=np.int64)
+    ordering_offsets[1:] = np.cumsum([len(pair.bin_ordering) for pair in pair_list])
+
+    bin_count = max([len(pair.bin_means) for pair in pair_list], default=0)
+    coef_count = max([len(pair.coefs) for pair in pair_list], default=0)
+    std_count = max([len(pair.poly_stds) for pair in pair_list], default=0)
+
+    bin_means = np.full((len(pair_list), bin_count), np.nan)
+    bin_stds = np.full((len(pair_list), bin_count), np.nan)
+    bin_n = np.zeros((len(pair_list), bin_count), dtype=np.int64)
+    # Coefficients are left padded with zeros (highest power first), which does not change the polynomial
+    coefs = np.zeros((len(pair_list), coef_count))
+    poly_stds = np.zeros((len(pair_list), std_count))
+
+    for pair_idx, pair in enumerate(pair_list):
+        bin_means[pair_idx, :len(pair.bin_means)] = pair.bin_means
+        bin_stds[pair_idx, :len(pair.bin_stds)] = pair.bin_stds
+        bin_n[pair_idx, :len(pair.bin_n)] = pair.bin_n
+        coefs[pair_idx, coef_count - len(pair.coefs):] = pair.coefs
+        poly_stds[pair_idx, :len(pair.poly_stds)] = pair.poly_stds
+
+    orderings = [pair.bin_ordering for pair in pair_list]
+    np.savez(npz_path,
+             pair_names=np.array([pair.name for pair in pair_list], dtype=str),
+             bin_ordering=np.concatenate(orderings).astype(np.int16) if len(orderings) > 0 else np.zeros(0, dtype=np.int16),
+             ordering_offsets=ordering_offsets,
+             bin_means=bin_means,
+             bin_stds=bin_stds,
+             bin_n=bin_n,
+             coefs=coefs,
+             poly_stds=poly_stds,
+             r_2=np.array([pair.r_2 for pair in pair_list]),
+             source_sha256=np.array(source_hash),
+             **workload_arrays)
+
+
+def _workload_arrays(pair_list : List[PairData]) -> Dict[str, np.ndarray]:
+    '''
+    Pack the workload models of the pairs: zero padded transition counts (zero counts do not change the model)
+    and concatenated dwell count rows with offsets
+    '''
+    models = [pair.workload_model() for pair in pair_list]
+
+    bin_count = max([model.bin_count for model in models], default=0)
+    transition_counts = np.zeros((len(models), bin_count, bin_count), dtype=np.int64)
+    for model_idx, model in enumerate(models):
+        transition_counts[model_idx, :model.bin_count, :model.bin_count] = model.transition_counts
+
+    dwell_offsets = np.zeros(len(models) + 1, dtype=np.int64)
+    dwell_offsets[1:] = np.cumsum([len(model.dwell_counts) for model in models])
+
+    return {
+        "workload_transition_counts": transition_counts,
+        "workload_dwell_counts": np.concatenate([model.dwell_counts for model in models]) if len(models) > 0 else np.zeros((0, 3), dtype=np.int64),
+        "workload_dwell_offsets": dwell_offsets,
+        "workload_lengths": np.array([model.length for model in models], dtype=np.int64),
+    }
+
+
+def _mmap_npz(npz_path : str) -> Dict[str, np.ndarray]:
+    '''
+    Memory map every array of an uncompressed .npz file (compressed members are read normally)
+
+    :param npz_path: Path of the .npz file
+    :type: str
+    :return: Arrays by name
+    :rtype: Dict[str, np.ndarray]
+    '''
+    arrays : Dict[str, np.ndarray] = {}
+
+    with zipfile.ZipFile(npz_path) as npz_zip, open(npz_path, 'rb') as npz_file:
+        for info in npz_zip.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                with npz_zip.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # Skip the zip local file header to the start of the .npy data
+            npz_file.seek(info.header_offset)
+            local_header = npz_file.read(30)
+            name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+            npz_file.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(npz_file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npz_file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npz_file)
+
+            if dtype.hasobject:
+                raise ValueError(f"{info.filename} in {npz_path} contains Python objects")
+
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(npz_file, dtype=dtype, mode='r', offset=npz_file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+
+    return arrays
+
+
+def _load_workload_model(arrays : Dict[str, np.ndarray], pair_idx : int) -> WorkloadModel:
+    dwell_offsets = arrays["workload_dwell_offsets"]
+    return WorkloadModel(arrays["workload_transition_counts"][pair_idx],
+                         arrays["workload_dwell_counts"][dwell_offsets[pair_idx]:dwell_offsets[pair_idx + 1]],
+                         arrays["workload_lengths"][pair_idx])
+
+
+def load_sim_data_npz(npz_path : str) -> Dict[str, PairData]:
+    '''
+    Load pairs saved with save_sim_data_npz. The arrays are memory mapped, every PairData holds views into them.
+    The data was validated when it was converted, so it is not validated again.
+
+    :param npz_path: Path of the .npz file
+    :type: str
+    :return: Pairs by name
+    :rtype: Dict[str, PairData]
+    '''
+    arrays = _mmap_npz(npz_path)
+
+    pairs : Dict[str, PairData] = {}
+    ordering_offsets = arrays["ordering_offsets"]
+    for pair_idx, pair_name in enumerate(arrays["pair_names"]):
+        pair_name = str(pair_name)
+        pairs[pair_name] = PairData(
+            name=pair_name,
+            bin_ordering=arrays["bin_ordering"][ordering_offsets[pair_idx]:ordering_offsets[pair_idx + 1]],
+            bin_means=arrays["bin_means"][pair_idx],
+            bin_stds=arrays["bin_stds"][pair_idx],
+            bin_n=arrays["bin_n"][pair_idx],
+            coefs=arrays["coefs"][pair_idx],
+            poly_stds=arrays["poly_stds"][pair_idx],
+            r_2=float(arrays["r_2"][pair_idx]),
+            workload=_load_workload_model(arrays, pair_idx) if "workload_lengths" in arrays else None,
+        )
+
+    return pairs
+
+
+def load_sim_data(data_path : str) -> Optional[Dict[str, PairData]]:
+    '''
+    Load simulation data from either the JSON source format or the converted .npz format
+
+    :param data_path: Path of a .json or .npz file
+    :type: str
+    :return: Pairs by name, None if the JSON data is not valid
+    :rtype: Optional[Dict[str, PairData]]
+    '''
+    if data_path.endswith(".npz"):
+        return load_sim_data_npz(data_path)
+
+    data_json_data = load_sim_data_json(data_path)
+    if data_json_data is None:
+        return None
+
+    return {key: compile_pair(key, value) for key, value in data_json_data.items()}
+
+
+def convert_json_to_npz(json_path : str, npz_path : str, model_only : bool = False) -> bool:
+    '''
+    Validate a simulation data JSON file and convert it to the .npz format
+
+    :param json_path: Path of the source JSON file
+    :type: str
+    :param npz_path: Path of the .npz file to create
+    :type: str
+    :param model_only: Save the workload model of every pair instead of its bin ordering
+    :type: bool
+    :return: True if the file was converted, False if the JSON data is not valid
+    :rtype: bool
+    '''
+    data_json_data = load_sim_data_json(json_path)
+    if data_json_data is None:
+        return False
+
+    with open(json_path, 'rb') as sim_data_file:
+        source_hash = hashlib.sha256(sim_data_file.read()).hexdigest()
+
+    pairs = {key: compile_pair(key, value) for key, value in data_json_data.items()}
+    save_sim_data_npz(pairs, npz_path, source_hash, model_only)
+    return True
+
+
+def compact_json(json_path : str, compact_path : str) -> bool:
+    '''
+    Validate a simulation data JSON file and write a copy with the bin ordering of every pair replaced by its workload model
+
+    :param json_path: Path of the source JSON file
+    :type: str
+    :param compact_path: Path of the JSON file to create
+    :type: str
+    :return: True if the file was written, False if the JSON data is not valid
+    :rtype: bool
+    '''
+    data_json_data = load_sim_data_json(json_path)
+    if data_json_data is None:
+        return False
+
+    with open(compact_path, 'w') as compact_file:
+        json.dump({key: compact_pair_dict(value) for key, value in data_json_data.items()}, compact_file)
+    return True
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Converts a simulation data JSON file to the binary .npz format")
+    parser.add_argument("data_json_path", type=str, help="The path to the json file containing simulation data")
+    parser.add_argument("npz_path", type=str, nargs='?', default=None, help="The path of the .npz file to create (defaults to the JSON path with a .npz extension)")
+    parser.add_argument("--model-only", action="store_true", help="Store the Markov workload model of every pair instead of its bin ordering (a .json output path writes a compact JSON file)")
+
+    args = parser.parse_args()
+
+    npz_path : str = args.npz_path if args.npz_path is not None else os.path.splitext(args.data_json_path)[0] + ".npz"
+
+    if not os.path.exists(args.data_json_path):
+        print(f"{args.data_json_path} does not exist!")
+        exit(1)
+
+    if args.model_only and npz_path.endswith(".json"):
+        converted = compact_json(args.data_json_path, npz_path)
+    else:
+        converted = convert_json_to_npz(args.data_json_path, npz_path, args.model_only)
+
+    if not converted:
+        print("Data JSON file is not valid!")
+        exit(1)
+
+    print(f"Converted {args.data_json_path} to {npz_path}")
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+# Version of the validation rules, increment it whenever validate_data_json_file changes so files are validated again
+VALIDATOR_VERSION = 2
+
+# File recording the content hashes of simulation data JSON files that passed validate_data_json_file (with the validator version)
+VALIDATION_CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                     "league_sim", "validated_sim_data.json")
+
+
+def validate_data_json_file(data_json_dict : Dict[str, Any]) -> bool:
+    '''
+    Validates the data JSON file to ensure that it has the correct format.
+    :param data_json_dict: The dictionary representation of the data JSON file.
+    :type: Dict[str, Any]
+    :return: True if the data JSON file is valid, False otherwise.
+    '''
+
+
+    # Validate linear regression dictionary
+    def validate_lin_reg_dict(lin_reg_dict : Dict[str, Any]) -> bool:
+        if "coefs" not in lin_reg_dict:
+            return False
+        if "poly_stds" not in lin_reg_dict:
+            return False
+        if "r_2" not in lin_reg_dict:
+            return False
+        return True
+    
+    # Validate workload model dictionary
+    def validate_workload_model_dict(workload_model_dict : Dict[str, Any]) -> bool:
+        if not isinstance(workload_model_dict, dict):
+            return False
+        if not isinstance(workload_model_dict.get("transition_counts"), list):
+            return False
+        if not isinstance(workload_model_dict.get("dwell_counts"), list):
+            return False
+        if not isinstance(workload_model_dict.get("length"), int):
+            return False
+        return True
+
+    # Validate CPU bin/data dictionary
+    def validate_cpu_bin_dict(cpu_bin_dict : Dict[str, Any]) -> bool:
+        if not isinstance(cpu_bin_dict, dict):
+                return False
+        if "cpu_bins" not in cpu_bin_dict:
+            print(f"CPU bins for {key} are not present!")
+            return False
+        if "bin_ordering" not in cpu_bin_dict and "workload_model" not in cpu_bin_dict:
+            print(f"CPU bin ordering or workload model for {key} is not present!")
+            return False
+        if "regression" not in cpu_bin_dict:
+            print(f"Regression for {key} is not present!")
+            return False
+        
+        if not validate_lin_reg_dict(cpu_bin_dict["regression"]):
+            print(f"Regression dictionary for {key} is not valid!")
+            return False
+        
+        if not isinstance(cpu_bin_dict["cpu_bins"], dict):
+            return False
+        
+        if "bin_ordering" in cpu_bin_dict and not isinstance(cpu_bin_dict["bin_ordering"], list):
+            return False
+
+        if "workload_model" in cpu_bin_dict and not validate_workload_model_dict(cpu_bin_dict["workload_model"]):
+            print(f"Workload model dictionary for {key} is not valid!")
+            return False
+        
+        for bin_key, bin_value in cpu_bin_dict["cpu_bins"].items():
+            if not bin_key.isdigit():
+                return False
+            if not isinstance(bin_value, dict):
+                return False
+            if list(bin_value.keys()) != ["mean", "std", "n"]:
+                print(f"At least one CPU bin ({bin_key}) does not include mean, std, or/and n keys for {key}!")
+                return False
+            
+        return True
+    
+
+    for key, value in data_json_dict.items():
+        if not validate_cpu_bin_dict(value):
+            print(f"CPU bin dictionary for {key} is not valid!")
+            return False
+    
+    return True
+
+
+def _validation_cache() -> Dict[str, bool]:
+    try:
+        with open(VALIDATION_CACHE_PATH, 'r') as cache_file:
+            return json.load(cache_file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _add_to_validation_cache(content_hash : str):
+    # Entries of other validator versions are never matched again
+    validation_cache = {key: valid for key, valid in _validation_cache().items() if key.startswith(f"{VALIDATOR_VERSION}:")}
+    validation_cache[content_hash] = True
+
+    try:
+        os.makedirs(os.path.dirname(VALIDATION_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{VALIDATION_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(validation_cache, cache_file)
+        os.replace(tmp_path, VALIDATION_CACHE_PATH)
+    except OSError as oe:
+        print(f"Failed to update the validation cache ({VALIDATION_CACHE_PATH}) with error: {oe}")
+
+
+def load_sim_data_json(json_path : str) -> Optional[Dict[str, Any]]:
+    '''
+    Load a simulation data JSON file, skipping validate_data_json_file if a file with the same content was already validated
+
+    :param json_path: Path of the JSON file
+    :type: str
+    :return: Parsed JSON data, None if the data is not valid
+    :rtype: Optional[Dict[str, Any]]
+    '''
+    with open(json_path, 'rb') as sim_data_file:
+        content = sim_data_file.read()
+
+    # A file validated by another version of the rules is validated again
+    content_hash = f"{VALIDATOR_VERSION}:{hashlib.sha256(content).hexdigest()}"
+    data_json_data = json.loads(content)
+
+    if content_hash in _validation_cache():
+        return data_json_data
+
+    if not validate_data_json_file(data_json_data):
+        return None
+
+    _add_to_validation_cache(content_hash)
+    return data_json_data
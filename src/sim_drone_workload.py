@@ -8,24 +8,47 @@ from energy_vehicle import EnergyVehicle, OffloadingMethod
 import argparse
 from os import path
 import json
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 import sys
 import signal
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mtick
 import matplotlib
-from queue import Queue
+from event_queue import BoundedEventQueue
+import threading
 import numpy as np
-from geopy import distance
-
-matplotlib.use("Qt5agg") # Use Qt4 backend for matplotlib
+from live_plot import HeadlessRenderer, LivePlotRenderer, graph_title
+from sim_data import PairData, load_sim_data
+from workload_model import WorkloadMode
+from mission import Mission, DEFAULT_MISSION_PATH, load_mission, run_mission
+from telemetry_recorder import TelemetryRecorder
+from shared_telemetry import TelemetryPublisher, DEFAULT_FLEET_NAME
+from stream_config import StreamConfig, DEFAULT_STREAMS_PATH, load_stream_config
+import instrumentation
 
 # HERELINK_TELEM
 
 vehicle : Optional[EnergyVehicle] = None
-data_queue : Queue = Queue()
+# Maximum number of queued graph updates, sample ranges queued while it is full are merged
+DATA_QUEUE_SIZE = 16
+
+def _merge_ranges(queued_item : Optional[Tuple[int, int]], item : Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    '''
+    Merge two queued graph updates, None items (arrival wake ups) are implied by any other item
+    '''
+    if queued_item is None:
+        return item
+    if item is None:
+        return queued_item
+    return (queued_item[0], item[1])
 
-ax1, ax2, fig = None, None, None
+data_queue : BoundedEventQueue = BoundedEventQueue(DATA_QUEUE_SIZE, merge=_merge_ranges)
+
+renderer : Optional[LivePlotRenderer] = None
+
+# Off-screen renderer thread, replaces the interactive graph in headless mode
+headless_renderer : Optional[HeadlessRenderer] = None
+
+# Minimum time in seconds between two graph frames
+graph_min_interval : float = 0
 
 def exit_signal_handler(signal, frame):
     print("Exiting...")
@@ -33,60 +56,68 @@ def exit_signal_handler(signal, frame):
 
 
 
-def wait_update_graph(test_location : Optional[Union[dk.LocationGlobalRelative, dk.LocationGlobal]], sleep_time : Optional[float]):
+def wait_update_graph(arrived : Optional[threading.Event], sleep_time : Optional[float]) -> bool:
     '''
-    Wait and update the graph until the vehicle reaches the test location or until the sleep time has elapsed.
+    Wait and update the graph until the vehicle reaches the current waypoint or until the sleep time has elapsed.
+    Arrival is detected on position updates (see mission.ArrivalMonitor), which also wake up this loop.
     
 
-    :param test_location: The location to test for. If the vehicle reaches this location, the graph will stop updating.
-    :type: test_location: Optional[Union[dk.LocationGlobalRelative, dk.LocationGlobal]]
+    :param arrived: Event set once the vehicle reaches the waypoint. If it is set, the graph will stop updating.
+    :type: arrived: Optional[threading.Event]
     :param sleep_time: The time to wait before stopping the graph update.
     :type sleep_time: Optional[float]
+    :return: True once the waypoint is reached or the time elapsed, False if neither was provided
+    :rtype: bool
     '''
 
     global data_queue
 
-    if sleep_time is None and test_location is None:
-        print("Must provide either a test location or a sleep time!")
-        return
+    if sleep_time is None and arrived is None:
+        print("Must provide either a waypoint or a sleep time!")
+        return False
 
     start_time = time.time()
     while True:
 
-        # Fetch battery percentages and CPU utilization from the queue
-        graph_bat_percents, graph_cpu_utils = data_queue.get(block=True)
+        if arrived is not None and arrived.is_set():
+            return True
 
-        # Update the graph
-        _update_graph(graph_bat_percents, graph_cpu_utils)
+        # Wait for new samples (or an arrival), then coalesce everything already queued into a single update
+        timeout = None if sleep_time is None else max(sleep_time - (time.time() - start_time), 0)
+        queue_items = data_queue.get_all(timeout)
+        if len(queue_items) > 0:
+            instrumentation.record_depth("data_queue", len(queue_items))
 
-        # Check if the vehicle has reached the test location
-        if test_location is not None:
-            real_loc = (vehicle.location.global_relative_frame.lat, vehicle.location.global_relative_frame.lon)
-            test_loc = (test_location.lat, test_location.lon)
-            real_dist = distance.distance(real_loc, test_loc).meters
-            # print(f"Distance to test location: {real_dist} meters")
-            if real_dist < 1.5:
-                break
+        # None items only wake up the loop (arrival)
+        # In headless mode the renderer thread reads the telemetry on its own
+        sample_ranges = [queue_item for queue_item in queue_items if queue_item is not None]
+        if len(sample_ranges) > 0 and headless_renderer is None:
+            stop_idx = sample_ranges[-1][1]
+
+            # Update the graph
+            frame_start = time.perf_counter()
+            if _update_graph(vehicle.telemetry.battery_percents[:stop_idx], vehicle.telemetry.cpu_utils[:stop_idx]):
+                instrumentation.record_latency("graph_frame", time.perf_counter() - frame_start)
 
         # Check if the sleep time has elapsed
         if sleep_time is not None:
-            if time.time() - start_time > sleep_time:
-                break
+            if time.time() - start_time >= sleep_time:
+                return True
 
-def _update_queue(graph_bat_percents : np.ndarray, graph_cpu_utils : np.ndarray):
+def _update_queue(start_idx : int, stop_idx : int):
     '''
-    Add the battery percentages and CPU utilization to the queue.
+    Add the index range of new samples in the vehicle telemetry buffer to the queue.
 
-    :param graph_bat_percents: The battery percentages to add to the queue, must be a value not reference
-    :type graph_bat_percents: np.ndarray
-    :param graph_cpu_utils: The CPU utilization to add to the queue, must be a value not reference
-    :type graph_cpu_utils: np.ndarray
+    :param start_idx: Index of the first new sample
+    :type start_idx: int
+    :param stop_idx: Index after the last new sample
+    :type stop_idx: int
     '''
 
     global data_queue
-    data_queue.put((graph_bat_percents, graph_cpu_utils))
+    data_queue.put((start_idx, stop_idx))
 
-def _update_graph(graph_battery_percents : np.ndarray, graph_cpu_utils : np.ndarray):
+def _update_graph(graph_battery_percents : np.ndarray, graph_cpu_utils : np.ndarray) -> bool:
     '''
     Update the graph with the given battery percentages and CPU utilization.
 
@@ -94,201 +125,140 @@ def _update_graph(graph_battery_percents : np.ndarray, graph_cpu_utils : np.ndar
     :type graph_battery_percents: np.ndarray
     :param graph_cpu_utils: The CPU utilization to update the graph with
     :type graph_cpu_utils: np.ndarray
+    :return: True if a frame was rendered
+    :rtype: bool
     '''
 
 
-    global ax1, ax2, fig
-
-    color_red = 'tab:red'
-    color_blue = 'tab:blue'
-
-    bat_percents = graph_battery_percents
-    cpu_utils = graph_cpu_utils
-
-    batt_percents_count = len(bat_percents)
-    cpu_percents_count = len(cpu_utils)
+    global renderer
 
     # If the graph has not been initialized yet, initialize it
-    if batt_percents_count == 1 and cpu_percents_count == 1:
-        plt.ion()
-
-        fig, ax1 = plt.subplots()
+    if renderer is None:
         offload_method = vehicle.offloading_method
-        plt.get_current_fig_manager().set_window_title(f"Drone {vehicle.drone_idx} Battery & CPU Graph ({offload_method.value})")
-
-        method_name = offload_method.value.capitalize()
-        if offload_method == OffloadingMethod.FULL_OFFLOAD or offload_method == OffloadingMethod.PARTIAL_OFFLOAD:
-            method_name += " Offloading"
-
-        plt.title(f"Drone {vehicle.drone_idx}, {method_name} Method")
-
-        ax1.set_xlabel('Running Time')
-        ax1.set_ylabel('Battery Percentage', color=color_blue)  # we already handled the x-label with ax1
-        ax1.tick_params(axis='y', labelcolor=color_blue)
-        ax1.yaxis.set_major_formatter(mtick.PercentFormatter(xmax=100, decimals=2))
-
-        
-
-
-        ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
-        ax2.set_ylabel('CPU Utilization', color=color_red)
-        ax2.tick_params(axis='y', labelcolor=color_red)
-        ax2.yaxis.set_major_formatter(mtick.PercentFormatter(xmax=100, decimals=2))
-
-        fig.tight_layout()  # otherwise the right y-label is slightly clipped
-        plt.show()
-
-
-    # Update the graph    
-    ax1.plot(list(range(batt_percents_count)), bat_percents, color_blue)
-    ax2.plot(list(range(cpu_percents_count)), cpu_utils, color_red)
-
-    fig.canvas.draw()
-    fig.canvas.flush_events()
-
-def main(sim_data : Dict[str, Any], offloading_method : OffloadingMethod, drone_idx : int):   
+        renderer = LivePlotRenderer(graph_title(vehicle.drone_idx, offload_method),
+                                    f"Drone {vehicle.drone_idx} Battery & CPU Graph ({offload_method.value})",
+                                    graph_min_interval)
+
+    # Update the graph
+    return renderer.update(graph_battery_percents, graph_cpu_utils)
+
+def main(sim_data : Dict[str, PairData], offloading_method : OffloadingMethod, drone_idx : int, mission : Mission,
+         msg_spill_path : Optional[str] = None, record_path : Optional[str] = None, seed : Optional[int] = None,
+         workload_mode : WorkloadMode = WorkloadMode.TRACE, headless_frame_rate : Optional[float] = None,
+         snapshot_path : Optional[str] = None, video_path : Optional[str] = None, fleet_name : Optional[str] = None,
+         stream_config : Optional[StreamConfig] = None):   
     '''
     Main function for the simulation. Connects to the drone, sets the simulation data, and runs the simulation.
 
-    :param sim_data: The simulation data to pass to the vehicle, loaded from the JSON file
-    :type sim_data: Dict[str, Any]
+    :param sim_data: The simulation data to pass to the vehicle, loaded from the JSON or .npz file
+    :type sim_data: Dict[str, PairData]
     :param offloading_method: The offloading method to use for the simulation
     :type offloading_method: OffloadingMethod
     :param drone_idx: The index of the drone to connect to
     :type drone_idx: int
+    :param mission: The mission to fly (see missions/default.json)
+    :type mission: Mission
+    :param msg_spill_path: Optional tlog file that MAVLink messages evicted from memory are appended to
+    :type msg_spill_path: Optional[str]
+    :param record_path: Optional file every energy sample is recorded to (see telemetry_recorder.py)
+    :type record_path: Optional[str]
+    :param seed: Optional seed of the CPU utilization and power noise (combined with the drone index)
+    :type seed: Optional[int]
+    :param workload_mode: Replay the recorded bin orderings or generate bins from the Markov models
+    :type workload_mode: WorkloadMode
+    :param headless_frame_rate: If set, render the graph off-screen on a background thread at this frame rate instead of showing it
+    :type headless_frame_rate: Optional[float]
+    :param snapshot_path: PNG file replaced with the latest headless frame
+    :type snapshot_path: Optional[str]
+    :param video_path: Video file the headless frames are encoded to
+    :type video_path: Optional[str]
+    :param fleet_name: If set, publish every energy sample to shared memory under this fleet name (see fleet_dashboard.py)
+    :type fleet_name: Optional[str]
+    :param stream_config: If set, request only the configured message types at their rates (every message type is streamed otherwise)
+    :type stream_config: Optional[StreamConfig]
     '''
 
-    global vehicle 
+    global vehicle, headless_renderer
 
-    drone_address = f"127.0.0.1:145{5+drone_idx}0" # 14550, 14560, 14570, etc.
+    drone_address = f"127.0.0.1:{14550 + 10 * drone_idx}" # 14550, 14560, 14570, etc.
     print(f"Connecting to drone at {drone_address}")
     vehicle = dk.connect(drone_address, wait_ready=True, vehicle_class=EnergyVehicle)
 
-    # Pass JSON data to vehicle
-    vehicle.set_sim_data(sim_data, offloading_method, drone_idx)
-
-    # Set method for queueing graph data
-    vehicle.queue_method = _update_queue
-
-
-    # Set vehicle mode to guided and wait for the armable state
-    vehicle.mode    = dk.VehicleMode("GUIDED")
-    vehicle.wait_for_armable()
+    if stream_config is not None:
+        vehicle.configure_streams(stream_config)
 
-    vehicle.arm()
-    vehicle.simple_takeoff(20) # Take off to 20m above ground
+    if msg_spill_path is not None:
+        vehicle.configure_message_store(spill_path=msg_spill_path)
 
-    # Perform graph updates and simulations for 50 seconds
-    wait_update_graph(None, sleep_time=50)
+    if record_path is not None:
+        vehicle.recorder = TelemetryRecorder(record_path)
 
-    print("Set default/target airspeed to 3")
-    vehicle.airspeed = 3
+    if fleet_name is not None:
+        vehicle.publisher = TelemetryPublisher(drone_idx, offloading_method, fleet_name)
 
-    print("Going towards first point for 30 seconds ...")
-    offset = drone_idx * 0.0001
-    point1 = dk.LocationGlobalRelative(-35.361354 + offset, 149.165218 + offset, 20)
-    vehicle.simple_goto(point1)
+    # Pass JSON data to vehicle
+    vehicle.set_sim_data(sim_data, offloading_method, drone_idx, seed, workload_mode)
 
-    # Perform graph updates and simulations until the drone reaches the first point
-    wait_update_graph(point1, None)
+    # Set method for queueing graph data
+    vehicle.queue_method = _update_queue
 
-    print("Going towards second point for 30 seconds (groundspeed set to 10 m/s) ...")
-    point2 = dk.LocationGlobalRelative(-35.363244 - offset, 149.168801 - offset, 20)
-    vehicle.simple_goto(point2, groundspeed=10)
+    if headless_frame_rate is not None:
+        headless_renderer = HeadlessRenderer(vehicle.telemetry, graph_title(drone_idx, offloading_method), headless_frame_rate,
+                                             snapshot_path, video_path)
+        headless_renderer.start()
 
-    # Perform graph updates and simulations until the drone reaches the second point
-    wait_update_graph(point2, None)
+    # Perform the mission while updating the graph and simulation, arrivals wake up the graph loop
+    try:
+        run_mission(vehicle, mission, drone_idx, wait_update_graph, lambda: data_queue.put(None))
+    finally:
+        # Also finish the video, flush the recording and close the spill file and shared memory when the mission
+        # is interrupted (SIGUSR1 on a depleted battery, Ctrl+C)
+        if headless_renderer is not None:
+            headless_renderer.stop()
+            print(f"Rendered {headless_renderer.frames} frames")
 
-    
-    print("Returning to Launch")
-    print(f"Home location: {vehicle.home_location}")
-    vehicle.mode = dk.VehicleMode("RTL")
-    
+        # Close vehicle object before exiting script
+        vehicle.close()
 
-    # Perform graph updates and simulations until the drone reaches the home location (or 50 seconds)
-    if vehicle.home_location is None:
-        wait_update_graph(None, 50)
-    else:
-        wait_update_graph(vehicle.home_location, None)
+        # Final snapshot of the callback/graph timings (if enabled)
+        instrumentation.dump()
 
-    # Close vehicle object before exiting script
-    vehicle.close()
+    if headless_renderer is not None:
+        return
 
     input("Press any key to exit...")
         
 
-def validate_data_json_file(data_json_dict : Dict[str, Any]) -> bool:
-    '''
-    Validates the data JSON file to ensure that it has the correct format.
-    :param data_json_dict: The dictionary representation of the data JSON file.
-    :type: Dict[str, Any]
-    :return: True if the data JSON file is valid, False otherwise.
-    '''
-
-
-    # Validate linear regression dictionary
-    def validate_lin_reg_dict(lin_reg_dict : Dict[str, Any]) -> bool:
-        if "coefs" not in lin_reg_dict:
-            return False
-        if "poly_stds" not in lin_reg_dict:
-            return False
-        if "r_2" not in lin_reg_dict:
-            return False
-        return True
-    
-    # Validate CPU bin/data dictionary
-    def validate_cpu_bin_dict(cpu_bin_dict : Dict[str, Any]) -> bool:
-        if not isinstance(cpu_bin_dict, dict):
-                return False
-        if "cpu_bins" not in cpu_bin_dict:
-            print(f"CPU bins for {key} are not present!")
-            return False
-        if "bin_ordering" not in cpu_bin_dict:
-            print(f"CPU bin ordering for {key} is not present!")
-            return False
-        if "regression" not in cpu_bin_dict:
-            print(f"Regression for {key} is not present!")
-            return False
-        
-        if not validate_lin_reg_dict(cpu_bin_dict["regression"]):
-            print(f"Regression dictionary for {key} is not valid!")
-            return False
-        
-        if not isinstance(cpu_bin_dict["cpu_bins"], dict):
-            return False
-        
-        if not isinstance(cpu_bin_dict["bin_ordering"], list):
-            return False
-        
-        for bin_key, bin_value in cpu_bin_dict["cpu_bins"].items():
-            if not bin_key.isdigit():
-                return False
-            if not isinstance(bin_value, dict):
-                return False
-            if list(bin_value.keys()) != ["mean", "std", "n"]:
-                print(f"At least one CPU bin ({bin_key}) does not include mean, std, or/and n keys for {key}!")
-                return False
-            
-        return True
-    
-
-    for key, value in data_json_dict.items():
-        if not validate_cpu_bin_dict(value):
-            print(f"CPU bin dictionary for {key} is not valid!")
-            return False
-    
-    return True
-    
-
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Executes drone")
-    parser.add_argument("data_json_path", type=str, help="The path to the created json file containing simulation data such as CPU bin info and linear regression equations")
+    parser.add_argument("data_json_path", type=str, help="The path to the created json (or converted .npz) file containing simulation data such as CPU bin info and linear regression equations")
     parser.add_argument("--off-method", type=str, help="The method of offboarding to simulate. Options are: 'onboard', 'partial', 'full'")
     parser.add_argument("--drone-idx", type=int, help="The index of the drone to run the simulation on.")
+    parser.add_argument("--mission", type=str, default=DEFAULT_MISSION_PATH, help="The mission JSON file to fly (defaults to missions/default.json).")
+    parser.add_argument("--graph-rate", type=float, default=None, help="Maximum graph updates per second (defaults to every sample).")
+    parser.add_argument("--headless", action="store_true", help="Render the graph off-screen (Agg) on a background thread instead of showing it.")
+    parser.add_argument("--frame-rate", type=float, default=1, help="Frames rendered per second in headless mode.")
+    parser.add_argument("--snapshot-path", type=str, default=None, help="PNG file replaced with the latest frame in headless mode.")
+    parser.add_argument("--video-path", type=str, default=None, help="Video file the frames are encoded to with ffmpeg in headless mode (e.g. .mp4, GIF is not supported).")
+    parser.add_argument("--msg-spill-path", type=str, default=None, help="Optional tlog file that MAVLink messages evicted from memory are appended to.")
+    parser.add_argument("--record-path", type=str, default=None, help="Optional file every energy sample is recorded to.")
+    parser.add_argument("--publish", action="store_true", help="Publish every energy sample to shared memory for the fleet dashboard (fleet_dashboard.py).")
+    parser.add_argument("--fleet-name", type=str, default=DEFAULT_FLEET_NAME, help="Fleet name the samples are published under with --publish.")
+    parser.add_argument("--streams", type=str, nargs="?", const=DEFAULT_STREAMS_PATH, default=None, help="Request only the message types of a stream configuration JSON file (streams/default.json if no path is given), every message type is streamed otherwise.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the CPU utilization and power noise, runs with the same seed are reproducible.")
+    parser.add_argument("--workload", type=str, default="trace", choices=[mode.value for mode in WorkloadMode], help="Replay the recorded bin orderings ('trace') or generate endless bins from their Markov models ('markov').")
+    parser.add_argument("--instrument", action="store_true", help="Record callback latencies, message rates, queue depth and graph frame times (dumped on SIGUSR2).")
+    parser.add_argument("--instrument-path", type=str, default=None, help="File instrumentation snapshots are appended to (printed if not provided).")
+    parser.add_argument("--instrument-interval", type=float, default=None, help="Time between two periodic instrumentation dumps in seconds.")
 
     args = parser.parse_args()
 
+    if args.headless:
+        matplotlib.use("Agg")
+    else:
+        matplotlib.use("Qt5agg") # Use Qt4 backend for matplotlib (selected here so the module can be imported headless)
+
     data_json_path : str = args.data_json_path
     off_method_str : str = args.off_method
     drone_idx : int = args.drone_idx
@@ -309,16 +279,27 @@ if __name__ == "__main__":
         off_method = OffloadingMethod.FULL_OFFLOAD 
 
 
+    # Pillow keeps every GIF frame in memory, a long headless run would grow without bound
+    if args.video_path is not None and args.video_path.endswith(".gif"):
+        print("GIF videos are not supported, use an .mp4 path!")
+        exit(1)
+
+    if args.graph_rate is not None and args.graph_rate > 0:
+        graph_min_interval = 1 / args.graph_rate
+
     signal.signal(signal.SIGUSR1, exit_signal_handler)
 
+    # Enabled before connecting so the vehicle callbacks are wrapped
+    if args.instrument or args.instrument_path is not None or args.instrument_interval is not None:
+        instrumentation.enable(args.instrument_path, args.instrument_interval)
+
     if not path.exists(data_json_path):
         print(f"{data_json_path} does not exist!")
     
     try:
-        sim_data_file = open(data_json_path, 'r')
-        data_json_data = json.load(sim_data_file)
+        data_json_data = load_sim_data(data_json_path)
 
-        if not validate_data_json_file(data_json_data):
+        if data_json_data is None:
             print("Data JSON file is not valid!")
             exit(1)
 
@@ -329,4 +310,18 @@ if __name__ == "__main__":
         print(f"Failed to decode JSON in Data file. Is {data_json_path} a JSON file?")
         raise je
 
-    main(data_json_data, off_method, drone_idx)
+    mission = load_mission(args.mission)
+    if mission is None:
+        print(f"Mission file {args.mission} is not valid!")
+        exit(1)
+
+    stream_config = None
+    if args.streams is not None:
+        stream_config = load_stream_config(args.streams, drone_idx)
+        if stream_config is None:
+            print(f"Stream configuration {args.streams} is not valid!")
+            exit(1)
+
+    main(data_json_data, off_method, drone_idx, mission, args.msg_spill_path, args.record_path, args.seed, WorkloadMode(args.workload),
+         args.frame_rate if args.headless else None, args.snapshot_path, args.video_path, args.fleet_name if args.publish else None,
+         stream_config)
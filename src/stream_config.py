@@ -0,0 +1,183 @@
+import dronekit as dk
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+
+# Stream configuration used when no file is provided
+DEFAULT_STREAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streams", "default.json")
+
+# Message types the simulation and the missions depend on:
+# HEARTBEAT (energy steps, mode and armed state), SYS_STATUS (battery), GLOBAL_POSITION_INT (location and vehicle time),
+# GPS_RAW_INT and ATTITUDE (dronekit wait_ready), EKF_STATUS_REPORT (is_armable)
+REQUIRED_MESSAGE_TYPES = ["HEARTBEAT", "SYS_STATUS", "GLOBAL_POSITION_INT", "GPS_RAW_INT", "ATTITUDE", "EKF_STATUS_REPORT"]
+
+# Replies to requests (parameters, mission download, command results) are never streamed, they are always collected
+REPLY_MESSAGE_TYPES = ["PARAM_VALUE", "COMMAND_ACK", "MISSION_COUNT", "MISSION_ITEM", "MISSION_ITEM_INT", "AUTOPILOT_VERSION", "STATUSTEXT"]
+
+
+@dataclass
+class StreamConfig:
+    # Rate in Hz of every requested message type (0 disables a type)
+    message_rates : Dict[str, float]
+
+    # Legacy REQUEST_DATA_STREAM rates in Hz by stream name (e.g. "EXTENDED_STATUS"), for autopilots without SET_MESSAGE_INTERVAL
+    data_streams : Dict[str, float]
+
+    # Stop every default stream before the message rates are requested
+    stop_default_streams : bool = True
+
+    @property
+    def message_types(self) -> List[str]:
+        '''
+        Message types received with this configuration (requested types and request replies)
+        '''
+        return [msg_type for msg_type, rate in self.message_rates.items() if rate > 0] + REPLY_MESSAGE_TYPES
+
+
+def validate_stream_dict(stream_dict : Dict[str, Any]) -> bool:
+    '''
+    Validates a stream configuration dictionary
+
+    :param stream_dict: The dictionary representation of the stream configuration JSON file
+    :type: Dict[str, Any]
+    :return: True if the configuration is valid, False otherwise
+    :rtype: bool
+    '''
+
+    if not isinstance(stream_dict, dict) or not isinstance(stream_dict.get("message_rates"), dict):
+        print("Stream configuration must contain the message_rates of every message type!")
+        return False
+
+    rate_dicts = [("message_rates", stream_dict["message_rates"])]
+    for drone_key, drone_rates in stream_dict.get("drones", {}).items():
+        if not drone_key.isdigit() or not isinstance(drone_rates, dict):
+            print(f"Drone override {drone_key} must map a drone index to message rates!")
+            return False
+        rate_dicts.append((f"drones.{drone_key}", drone_rates))
+
+    for dict_name, rates in rate_dicts:
+        for msg_type, rate in rates.items():
+            if mavlink_message_id(msg_type) is None:
+                print(f"{dict_name}: {msg_type} is not a MAVLink message type!")
+                return False
+            if not isinstance(rate, (int, float)) or rate < 0:
+                print(f"{dict_name}: Rate of {msg_type} must be a non-negative number of Hz!")
+                return False
+
+    if not validate_required_types(stream_dict["message_rates"], "message_rates"):
+        return False
+
+    # The overrides are merged into message_rates, they can not disable a required type either
+    for drone_key, drone_rates in stream_dict.get("drones", {}).items():
+        if not validate_required_types({**stream_dict["message_rates"], **drone_rates}, f"message_rates with drones.{drone_key}"):
+            return False
+
+    for stream_name, rate in stream_dict.get("data_streams", {}).items():
+        if not hasattr(mavlink, f"MAV_DATA_STREAM_{stream_name}"):
+            print(f"data_streams: {stream_name} is not a MAV_DATA_STREAM!")
+            return False
+        if not isinstance(rate, (int, float)) or rate < 0:
+            print(f"data_streams: Rate of {stream_name} must be a non-negative number of Hz!")
+            return False
+
+    return True
+
+
+def validate_required_types(message_rates : Dict[str, float], dict_name : str) -> bool:
+    '''
+    Checks that every message type required by the simulation and dronekit is requested
+
+    :param message_rates: Rate in Hz of every message type
+    :type: Dict[str, float]
+    :param dict_name: Name of the rates in the error message
+    :type: str
+    :return: True if every required type has a positive rate
+    :rtype: bool
+    '''
+    missing_types = [msg_type for msg_type in REQUIRED_MESSAGE_TYPES if message_rates.get(msg_type, 0) <= 0]
+    if len(missing_types) > 0:
+        print(f"{dict_name} must request {', '.join(missing_types)} (required by the simulation and dronekit)!")
+        return False
+    return True
+
+
+def load_stream_config(stream_path : str, drone_idx : int) -> Optional[StreamConfig]:
+    '''
+    Load and validate a stream configuration JSON file, applying the overrides of a drone
+
+    :param stream_path: Path of the stream configuration file
+    :type: str
+    :param drone_idx: Index of the drone (selects the "drones" override)
+    :type: int
+    :return: Stream configuration of the drone, None if the file is not valid
+    :rtype: Optional[StreamConfig]
+    '''
+    try:
+        with open(stream_path, 'r') as stream_file:
+            stream_dict = json.load(stream_file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Failed to load stream configuration {stream_path} with error: {e}")
+        return None
+
+    if not validate_stream_dict(stream_dict):
+        return None
+
+    message_rates = dict(stream_dict["message_rates"])
+    message_rates.update(stream_dict.get("drones", {}).get(str(drone_idx), {}))
+    return StreamConfig(message_rates=message_rates, data_streams=dict(stream_dict.get("data_streams", {})),
+                        stop_default_streams=bool(stream_dict.get("stop_default_streams", True)))
+
+
+def mavlink_message_id(msg_type : str) -> Optional[int]:
+    '''
+    MAVLink message id of a message type
+
+    :param msg_type: Message type (e.g. "SYS_STATUS")
+    :type: str
+    :return: Message id, None if the type does not exist
+    :rtype: Optional[int]
+    '''
+    return getattr(mavlink, f"MAVLINK_MSG_ID_{msg_type}", None)
+
+
+def rate_to_interval_us(rate_hz : float) -> int:
+    '''
+    SET_MESSAGE_INTERVAL interval of a rate (-1 disables the message)
+    '''
+    return -1 if rate_hz <= 0 else int(round(1e6 / rate_hz))
+
+
+def apply_stream_config(vehicle : dk.Vehicle, config : StreamConfig):
+    '''
+    Ask the autopilot for the configured message types only: stop the default streams (REQUEST_DATA_STREAM),
+    request the legacy data streams and set the interval of every message type (SET_MESSAGE_INTERVAL).
+    Rejected intervals are reported when their COMMAND_ACK arrives.
+
+    :param vehicle: Connected vehicle
+    :type: dk.Vehicle
+    :param config: Stream configuration of the drone
+    :type: StreamConfig
+    '''
+    factory = vehicle.message_factory
+
+    def interval_ack_listener(self, name : str, message):
+        if message.command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL and message.result != mavlink.MAV_RESULT_ACCEPTED:
+            print(f"Autopilot rejected a message interval (result {message.result}), add data_streams to the stream configuration")
+
+    vehicle.add_message_listener('COMMAND_ACK', interval_ack_listener)
+
+    # Target system 0 like the dronekit commands (accepted by the connected autopilot)
+    if config.stop_default_streams:
+        vehicle.send_mavlink(factory.request_data_stream_encode(0, 0, mavlink.MAV_DATA_STREAM_ALL, 0, 0))
+
+    for stream_name, rate in config.data_streams.items():
+        vehicle.send_mavlink(factory.request_data_stream_encode(0, 0, getattr(mavlink, f"MAV_DATA_STREAM_{stream_name}"),
+                                                                int(round(rate)), 1 if rate > 0 else 0))
+
+    for msg_type, rate in config.message_rates.items():
+        vehicle.send_mavlink(factory.command_long_encode(0, 0, mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, 0,
+                                                         mavlink_message_id(msg_type), rate_to_interval_us(rate), 0, 0, 0, 0, 0))
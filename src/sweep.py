@@ -0,0 +1,618 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from multiprocessing import Process
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional, Tuple
+from sim_data import OffloadingMethod, PairData, load_sim_data
+from energy_replay import DEFAULT_VOLTAGE, replay_pair
+from workload_model import WorkloadMode
+
+# ArduPilot parameter file the SITL vehicles are started with (BATT_CAPACITY is the default swept capacity)
+DEFAULT_PARM_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "support_files", "gazebo-iris.parm")
+
+# Default port of the sweep queue server
+DEFAULT_SWEEP_PORT = 6150
+
+# Status of a point in the sweep store
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+# Points whose simulation raised an error (e.g. invalid or missing data), skipped on resume and reported by results
+STATUS_FAILED = "failed"
+
+# Chunk size used to hash the data files
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class SweepPoint:
+    '''
+    A single combination of the sweep grid, simulated offline with energy_replay.replay_pair.
+    The data file is identified by its content hash, its (resolved) path is only where the file is loaded from.
+    '''
+
+    method : str
+    data_path : str
+    data_hash : str
+    pair : str
+    capacity_mah : float
+    mission_s : int
+    workload : str
+    seed : int
+
+    @property
+    def key(self) -> str:
+        '''
+        Unique key of the point in the sweep store
+        '''
+        return f"{self.method}|{self.data_hash}|{self.pair}|{self.capacity_mah:g}|{self.mission_s}|{self.workload}|{self.seed}"
+
+
+def read_parm_value(parm_path : str, name : str) -> Optional[float]:
+    '''
+    Read a parameter from an ArduPilot parameter file ("NAME VALUE" lines, # comments)
+
+    :param parm_path: Path of the parameter file
+    :type: str
+    :param name: Name of the parameter
+    :type: str
+    :return: Value of the parameter, None if the file does not set it
+    :rtype: Optional[float]
+    '''
+    with open(parm_path, 'r') as parm_file:
+        for line in parm_file:
+            fields = line.split('#', 1)[0].replace(',', ' ').split()
+            if len(fields) >= 2 and fields[0] == name:
+                return float(fields[1])
+    return None
+
+
+def file_sha256(path : str) -> str:
+    '''
+    SHA-256 of the content of a file
+
+    :param path: Path of the file
+    :type: str
+    :return: Hex digest
+    :rtype: str
+    '''
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(HASH_CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def build_grid(data_paths : Dict[OffloadingMethod, str], pairs : Optional[List[str]], capacities_mah : List[float],
+               mission_lengths_s : List[int], workload_mode : WorkloadMode = WorkloadMode.TRACE, seed : int = 0) -> List[SweepPoint]:
+    '''
+    Build the cartesian grid of offloading methods (data files), pairs, battery capacities and mission lengths
+
+    :param data_paths: Simulation data file of every offloading method
+    :type: Dict[OffloadingMethod, str]
+    :param pairs: Pairs to sweep, every pair of every data file if not provided
+    :type: Optional[List[str]]
+    :param capacities_mah: Battery capacities (BATT_CAPACITY) in mAh
+    :type: List[float]
+    :param mission_lengths_s: Mission lengths in seconds
+    :type: List[int]
+    :param workload_mode: Replay the recorded bin orderings or generate bins from the Markov models
+    :type: WorkloadMode
+    :param seed: Seed shared by every point (combined with the point key)
+    :type: int
+    :return: Points of the grid
+    :rtype: List[SweepPoint]
+    '''
+    points : List[SweepPoint] = []
+    for method, data_path in data_paths.items():
+        sim_data = load_sim_data(data_path)
+        if sim_data is None:
+            raise ValueError(f"Data JSON file {data_path} is not valid!")
+
+        # The same file reached through another path or working directory gives the same points
+        real_path = os.path.realpath(data_path)
+        data_hash = file_sha256(real_path)
+
+        method_pairs = list(sim_data.keys()) if pairs is None else [pair for pair in pairs if pair in sim_data]
+        for pair, capacity_mah, mission_s in itertools.product(method_pairs, capacities_mah, mission_lengths_s):
+            points.append(SweepPoint(method.value, real_path, data_hash, pair, float(capacity_mah), int(mission_s), workload_mode.value, seed))
+
+    return points
+
+
+# Simulation data loaded by this process and its content hash, by path (worker processes run many points of the same files)
+_sim_data_cache : Dict[str, Tuple[str, Dict[str, PairData]]] = {}
+
+
+def run_point(point : SweepPoint) -> Dict[str, Any]:
+    '''
+    Simulate a sweep point offline. The random generator is seeded from the seed and the point key, so a point
+    gives the same result on any host and in any order.
+
+    :param point: Point to simulate
+    :type: SweepPoint
+    :return: Result of the point (JSON serializable)
+    :rtype: Dict[str, Any]
+    '''
+    if point.data_path not in _sim_data_cache:
+        data_hash = file_sha256(point.data_path)
+        sim_data = load_sim_data(point.data_path)
+        if sim_data is None:
+            raise ValueError(f"Data JSON file {point.data_path} is not valid!")
+        _sim_data_cache[point.data_path] = (data_hash, sim_data)
+
+    data_hash, sim_data = _sim_data_cache[point.data_path]
+    if data_hash != point.data_hash:
+        raise ValueError(f"Data file {point.data_path} changed since the point was added to the sweep!")
+
+    key_hash = int(hashlib.sha256(point.key.encode()).hexdigest()[:16], 16)
+    rng = np.random.default_rng(np.random.SeedSequence([point.seed, key_hash]))
+
+    start_time = time.perf_counter()
+    result = replay_pair(sim_data[point.pair], point.capacity_mah, DEFAULT_VOLTAGE, point.mission_s,
+                         rng=rng, workload_mode=WorkloadMode(point.workload))
+    elapsed_s = time.perf_counter() - start_time
+
+    if len(result.watts) == 0:
+        return {"depletion_s": None, "final_percent": 100.0, "mean_watts": 0.0, "mean_cpu_util": 0.0, "energy_j": 0.0, "elapsed_s": elapsed_s}
+
+    return {
+        "depletion_s": result.depletion_step,
+        "final_percent": float(result.battery_percents[-1]),
+        "mean_watts": float(result.watts.mean()),
+        "mean_cpu_util": float(result.cpu_utils.mean()),
+        "energy_j": float(result.watts.sum()),
+        "elapsed_s": elapsed_s,
+    }
+
+
+class SweepStore:
+    '''
+    SQLite store of the sweep points and their results, indexed by point key and parameters.
+    Finished points are never run again, so an interrupted sweep resumes where it stopped.
+    '''
+
+    def __init__(self, path : str):
+        '''
+        Initialize the SweepStore object, creating the tables if necessary
+
+        :param path: Path of the SQLite database
+        :type: str
+        :raises ValueError: If the store was created before the points were keyed by data file content
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute('''CREATE TABLE IF NOT EXISTS points (
+                                key TEXT PRIMARY KEY,
+                                method TEXT, data_path TEXT, data_hash TEXT, pair TEXT, capacity_mah REAL, mission_s INTEGER, workload TEXT, seed INTEGER,
+                                status TEXT NOT NULL, worker TEXT, result TEXT, updated REAL)''')
+        self._db.execute("CREATE INDEX IF NOT EXISTS points_params ON points (method, pair, capacity_mah, mission_s)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS points_status ON points (status)")
+        self._db.commit()
+
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(points)").fetchall()]
+        if "data_hash" not in columns:
+            self._db.close()
+            raise ValueError(f"{path} keys its points by data file path, start a new sweep store")
+
+    def close(self):
+        self._db.close()
+
+    def add_points(self, points : List[SweepPoint]) -> int:
+        '''
+        Add points to the sweep, points already in the store (finished or not) are kept as they are
+
+        :param points: Points to add
+        :type: List[SweepPoint]
+        :return: Number of new points
+        :rtype: int
+        '''
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany('''INSERT OR IGNORE INTO points (key, method, data_path, data_hash, pair, capacity_mah, mission_s, workload, seed,
+                                                                    status, updated)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                 [(point.key, point.method, point.data_path, point.data_hash, point.pair, point.capacity_mah, point.mission_s,
+                                   point.workload, point.seed, STATUS_PENDING, time.time()) for point in points])
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def reset_running(self, worker : Optional[str] = None) -> int:
+        '''
+        Return claimed points that never finished to the queue (interrupted sweep or disconnected worker)
+
+        :param worker: Only reset the points claimed by this worker, all if not provided
+        :type: Optional[str]
+        :return: Number of reset points
+        :rtype: int
+        '''
+        with self._lock:
+            if worker is None:
+                cursor = self._db.execute("UPDATE points SET status = ?, worker = NULL WHERE status = ?", (STATUS_PENDING, STATUS_RUNNING))
+            else:
+                cursor = self._db.execute("UPDATE points SET status = ?, worker = NULL WHERE status = ? AND worker = ?",
+                                          (STATUS_PENDING, STATUS_RUNNING, worker))
+            self._db.commit()
+            return cursor.rowcount
+
+    def claim(self, worker : str, count : int = 1) -> List[SweepPoint]:
+        '''
+        Mark pending points as running and return them
+
+        :param worker: Name of the worker claiming the points
+        :type: str
+        :param count: Maximum number of points to claim
+        :type: int
+        :return: Claimed points (empty when the sweep has no pending points left)
+        :rtype: List[SweepPoint]
+        '''
+        with self._lock:
+            rows = self._db.execute('''SELECT key, method, data_path, data_hash, pair, capacity_mah, mission_s, workload, seed FROM points
+                                       WHERE status = ? ORDER BY rowid LIMIT ?''', (STATUS_PENDING, count)).fetchall()
+            self._db.executemany("UPDATE points SET status = ?, worker = ?, updated = ? WHERE key = ?",
+                                 [(STATUS_RUNNING, worker, time.time(), row[0]) for row in rows])
+            self._db.commit()
+        return [SweepPoint(*row[1:]) for row in rows]
+
+    def complete(self, key : str, result : Dict[str, Any]):
+        '''
+        Store the result of a point and mark it as done
+
+        :param key: Key of the point
+        :type: str
+        :param result: Result of the point
+        :type: Dict[str, Any]
+        '''
+        with self._lock:
+            self._db.execute("UPDATE points SET status = ?, result = ?, updated = ? WHERE key = ?",
+                             (STATUS_DONE, json.dumps(result), time.time(), key))
+            self._db.commit()
+
+    def fail(self, key : str, error : str):
+        '''
+        Store the error of a point and mark it as failed, so it is not handed out again
+
+        :param key: Key of the point
+        :type: str
+        :param error: Description of the error
+        :type: str
+        '''
+        with self._lock:
+            self._db.execute("UPDATE points SET status = ?, result = ?, updated = ? WHERE key = ?",
+                             (STATUS_FAILED, json.dumps({"error": error}), time.time(), key))
+            self._db.commit()
+
+    def counts(self) -> Dict[str, int]:
+        '''
+        Number of points by status
+        '''
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM points GROUP BY status").fetchall()
+        counts = {STATUS_PENDING: 0, STATUS_RUNNING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self) -> List[Tuple[SweepPoint, Dict[str, Any]]]:
+        '''
+        Finished points and their results, ordered by parameters
+
+        :return: Point and result of every finished point
+        :rtype: List[Tuple[SweepPoint, Dict[str, Any]]]
+        '''
+        with self._lock:
+            rows = self._db.execute('''SELECT method, data_path, data_hash, pair, capacity_mah, mission_s, workload, seed, result FROM points
+                                       WHERE status = ? ORDER BY method, pair, capacity_mah, mission_s''', (STATUS_DONE,)).fetchall()
+        return [(SweepPoint(*row[:-1]), json.loads(row[-1])) for row in rows]
+
+    def failures(self) -> List[Tuple[SweepPoint, str]]:
+        '''
+        Failed points and their errors, ordered by parameters
+
+        :return: Point and error of every failed point
+        :rtype: List[Tuple[SweepPoint, str]]
+        '''
+        with self._lock:
+            rows = self._db.execute('''SELECT method, data_path, data_hash, pair, capacity_mah, mission_s, workload, seed, result FROM points
+                                       WHERE status = ? ORDER BY method, pair, capacity_mah, mission_s''', (STATUS_FAILED,)).fetchall()
+        return [(SweepPoint(*row[:-1]), json.loads(row[-1])["error"]) for row in rows]
+
+
+def print_progress(store : SweepStore):
+    counts = store.counts()
+    total = sum(counts.values())
+    print(f"{counts[STATUS_DONE]}/{total} points done, {counts[STATUS_RUNNING]} running, {counts[STATUS_PENDING]} pending, {counts[STATUS_FAILED]} failed")
+
+
+def describe_error(e : Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def run_local(store : SweepStore, workers : Optional[int] = None, chunk_size : int = 256):
+    '''
+    Run every pending point of the store on local worker processes. Results are written by this process
+    as soon as every point finishes, so an interrupted run loses only the points in progress.
+
+    :param store: Sweep store
+    :type: SweepStore
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :type: Optional[int]
+    :param chunk_size: Number of points claimed from the store at once
+    :type: int
+    '''
+    store.reset_running()
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            points = store.claim(worker_name, chunk_size)
+            if len(points) == 0:
+                break
+
+            futures = {executor.submit(run_point, point): point for point in points}
+            for future in as_completed(futures):
+                try:
+                    store.complete(futures[future].key, future.result())
+                except BrokenProcessPool:
+                    # A killed worker process, the claimed points go back to the queue on the next run
+                    raise
+                except Exception as e:
+                    store.fail(futures[future].key, describe_error(e))
+            print_progress(store)
+
+
+def serve(store : SweepStore, host : str, port : int, authkey : bytes):
+    '''
+    Hand out the pending points of the store to remote workers (see work) until every point is done.
+    Points claimed by a worker that disconnects go back to the queue.
+
+    :param store: Sweep store
+    :type: SweepStore
+    :param host: Address to listen on
+    :type: str
+    :param port: Port to listen on
+    :type: int
+    :param authkey: Key shared with the workers
+    :type: bytes
+    '''
+    store.reset_running()
+
+    def handle_worker(conn : Connection):
+        worker_name : Optional[str] = None
+        try:
+            while True:
+                request, payload = conn.recv()
+                if request == "claim":
+                    worker_name = payload
+                    points = store.claim(worker_name)
+                    conn.send(asdict(points[0]) if len(points) > 0 else None)
+                elif request == "result":
+                    key, result = payload
+                    store.complete(key, result)
+                elif request == "error":
+                    key, error = payload
+                    store.fail(key, error)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if worker_name is not None:
+                store.reset_running(worker_name)
+
+    listener = Listener((host, port), authkey=authkey)
+    print(f"Serving sweep {store.path} on {host}:{port}")
+
+    def accept_workers():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle_worker, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_workers, daemon=True).start()
+
+    try:
+        while True:
+            counts = store.counts()
+            if counts[STATUS_PENDING] == 0 and counts[STATUS_RUNNING] == 0:
+                break
+            print_progress(store)
+            time.sleep(5)
+    finally:
+        listener.close()
+
+    print_progress(store)
+
+
+def _work_loop(address : Tuple[str, int], authkey : bytes, worker_name : str):
+    conn = Client(address, authkey=authkey)
+    try:
+        while True:
+            conn.send(("claim", worker_name))
+            point_dict = conn.recv()
+            if point_dict is None:
+                return
+            point = SweepPoint(**point_dict)
+            # A failing point is reported instead of killing the worker (it would be handed out again otherwise)
+            try:
+                result = run_point(point)
+            except Exception as e:
+                conn.send(("error", (point.key, describe_error(e))))
+                continue
+            conn.send(("result", (point.key, result)))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def work(address : Tuple[str, int], authkey : bytes, workers : int = 1):
+    '''
+    Run points handed out by a sweep server until the sweep is done. The simulation data paths of the points
+    are opened on this host, so the workers need the same data files (e.g. the same repository checkout).
+
+    :param address: Host and port of the sweep server
+    :type: Tuple[str, int]
+    :param authkey: Key shared with the server
+    :type: bytes
+    :param workers: Number of worker processes on this host
+    :type: int
+    '''
+    host_name = socket.gethostname()
+    processes = [Process(target=_work_loop, args=(address, authkey, f"{host_name}:{os.getpid()}:{worker_idx}"))
+                 for worker_idx in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def export_csv(store : SweepStore, csv_path : str):
+    '''
+    Write every finished point and its result as a CSV row
+
+    :param store: Sweep store
+    :type: SweepStore
+    :param csv_path: Path of the CSV file
+    :type: str
+    '''
+    results = store.results()
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = None
+        for point, result in results:
+            row = {**asdict(point), **result}
+            if writer is None:
+                writer = csv.DictWriter(csv_file, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def add_grid_arguments(parser : argparse.ArgumentParser):
+    parser.add_argument("--data", type=str, action="append", default=None,
+                        help="<method>=<data json or .npz path>, where method is 'onboard', 'partial' or 'full'. Can be repeated (adds the grid to the store)")
+    parser.add_argument("--pairs", type=str, nargs='+', default=None, help="Pairs to sweep (defaults to every pair of every data file)")
+    parser.add_argument("--capacities-mah", type=float, nargs='+', default=None,
+                        help=f"Battery capacities (BATT_CAPACITY) in mAh (defaults to the value in {os.path.relpath(DEFAULT_PARM_PATH)})")
+    parser.add_argument("--mission-s", type=int, nargs='+', default=[600], help="Mission lengths in seconds")
+    parser.add_argument("--workload", type=str, default="trace", choices=[mode.value for mode in WorkloadMode],
+                        help="Replay the recorded bin orderings ('trace') or generate bins from the Markov models ('markov')")
+    parser.add_argument("--seed", type=int, default=0, help="Seed shared by every point (combined with the point parameters)")
+
+
+def add_grid(store : SweepStore, args : argparse.Namespace):
+    if args.data is None:
+        return
+
+    data_paths : Dict[OffloadingMethod, str] = {}
+    for data_arg in args.data:
+        method_str, _, data_path = data_arg.partition("=")
+        try:
+            method = OffloadingMethod(method_str)
+        except ValueError:
+            print(f"Offloading method {method_str} is not valid!")
+            exit(1)
+        if not os.path.exists(data_path):
+            print(f"{data_path} does not exist!")
+            exit(1)
+        data_paths[method] = data_path
+
+    capacities_mah = args.capacities_mah
+    if capacities_mah is None:
+        parm_capacity = read_parm_value(DEFAULT_PARM_PATH, "BATT_CAPACITY")
+        if parm_capacity is None:
+            print(f"BATT_CAPACITY is not set in {DEFAULT_PARM_PATH}, use --capacities-mah")
+            exit(1)
+        capacities_mah = [parm_capacity]
+
+    try:
+        points = build_grid(data_paths, args.pairs, capacities_mah, args.mission_s, WorkloadMode(args.workload), args.seed)
+    except ValueError as ve:
+        print(ve)
+        exit(1)
+
+    print(f"Added {store.add_points(points)} new points ({len(points)} in the grid)")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Sweeps battery capacity, pair, offloading method and mission length with offline energy replays")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the pending points of a sweep on local worker processes")
+    run_parser.add_argument("store_path", type=str, help="SQLite sweep store (created if it does not exist, resumed otherwise)")
+    add_grid_arguments(run_parser)
+    run_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (defaults to the CPU count)")
+
+    serve_parser = subparsers.add_parser("serve", help="Hand out the pending points of a sweep to workers on other hosts")
+    serve_parser.add_argument("store_path", type=str, help="SQLite sweep store (created if it does not exist, resumed otherwise)")
+    add_grid_arguments(serve_parser)
+    serve_parser.add_argument("--host", type=str, default="0.0.0.0", help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SWEEP_PORT, help="Port to listen on")
+    serve_parser.add_argument("--authkey", type=str, default=None, help="Key shared with the workers (defaults to $SWEEP_AUTHKEY)")
+
+    work_parser = subparsers.add_parser("work", help="Run points handed out by a sweep server")
+    work_parser.add_argument("server", type=str, help="host:port of the sweep server")
+    work_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (defaults to the CPU count)")
+    work_parser.add_argument("--authkey", type=str, default=None, help="Key shared with the server (defaults to $SWEEP_AUTHKEY)")
+
+    results_parser = subparsers.add_parser("results", help="Print the progress of a sweep and export its results")
+    results_parser.add_argument("store_path", type=str, help="SQLite sweep store")
+    results_parser.add_argument("--csv", type=str, default=None, help="CSV file the finished points are written to")
+
+    args = parser.parse_args()
+
+    if args.command in ("serve", "work"):
+        authkey_str = args.authkey if args.authkey is not None else os.environ.get("SWEEP_AUTHKEY")
+        if authkey_str is None:
+            print("An authkey is required (--authkey or $SWEEP_AUTHKEY)")
+            exit(1)
+        authkey = authkey_str.encode()
+
+    if args.command == "work":
+        host, _, port_str = args.server.rpartition(":")
+        work((host, int(port_str)), authkey, args.workers)
+        exit(0)
+
+    if args.command == "results" and not os.path.exists(args.store_path):
+        print(f"{args.store_path} does not exist!")
+        exit(1)
+
+    try:
+        sweep_store = SweepStore(args.store_path)
+    except ValueError as ve:
+        print(ve)
+        exit(1)
+
+    if args.command == "run":
+        add_grid(sweep_store, args)
+        start_time = time.perf_counter()
+        run_local(sweep_store, args.workers)
+        print(f"Sweep finished in {time.perf_counter() - start_time:.2f} s")
+    elif args.command == "serve":
+        add_grid(sweep_store, args)
+        serve(sweep_store, args.host, args.port, authkey)
+    else:
+        print_progress(sweep_store)
+        for point, error in sweep_store.failures():
+            print(f"Failed: {point.method} {point.pair} {point.capacity_mah:g} mAh {point.mission_s} s ({point.data_path}): {error}")
+        if args.csv is not None:
+            export_csv(sweep_store, args.csv)
+            print(f"Results written to {args.csv}")
+
+    sweep_store.close()
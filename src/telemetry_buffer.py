@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class TelemetryBuffer:
+    '''
+    Growable, array backed buffer of the generated battery percentages and CPU utilizations.
+    Appends are amortized O(1) (the arrays double when full) and readers get views instead of copies.
+    Single producer: a reader on another thread only sees fully written samples.
+    '''
+
+    def __init__(self, initial_capacity : int = 4096):
+        '''
+        Initialize the TelemetryBuffer object
+
+        :param initial_capacity: Number of samples preallocated
+        :type: int
+        '''
+
+        self._battery_percents = np.empty(max(initial_capacity, 1))
+        self._cpu_utils = np.empty(max(initial_capacity, 1))
+        self._length = 0
+
+    def append(self, battery_percent : float, cpu_util : float) -> int:
+        '''
+        Append a sample
+
+        :param battery_percent: Battery percentage of the sample
+        :type: float
+        :param cpu_util: CPU utilization of the sample
+        :type: float
+        :return: Index of the appended sample
+        :rtype: int
+        '''
+        idx = self._length
+        if idx == len(self._battery_percents):
+            self._grow()
+
+        self._battery_percents[idx] = battery_percent
+        self._cpu_utils[idx] = cpu_util
+
+        # Only publish the sample once it is fully written
+        self._length = idx + 1
+        return idx
+
+    @property
+    def battery_percents(self) -> np.ndarray:
+        '''
+        View of all battery percentages appended so far (do not modify)
+        '''
+        length = self._length
+        return self._battery_percents[:length]
+
+    @property
+    def cpu_utils(self) -> np.ndarray:
+        '''
+        View of all CPU utilizations appended so far (do not modify)
+        '''
+        length = self._length
+        return self._cpu_utils[:length]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _grow(self):
+        '''
+        Double the capacity of the buffer. The new arrays are filled before they replace the old ones
+        '''
+        new_capacity = len(self._battery_percents) * 2
+
+        battery_percents = np.empty(new_capacity)
+        battery_percents[:self._length] = self._battery_percents[:self._length]
+        cpu_utils = np.empty(new_capacity)
+        cpu_utils[:self._length] = self._cpu_utils[:self._length]
+
+        self._battery_percents = battery_percents
+        self._cpu_utils = cpu_utils
@@ -0,0 +1,195 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import json
+import mmap
+import struct
+import threading
+import numpy as np
+from queue import Queue, Full
+from typing import Dict, Optional
+
+# File layout: MAGIC, u32 schema length, JSON schema, then chunks of
+# (u32 row count, every column's values stored contiguously in schema order)
+MAGIC = b"LSTELEM1"
+
+# Columns recorded for every energy sample
+SAMPLE_DTYPE = np.dtype([
+    ("timestamp", np.float64),
+    ("drone_idx", np.int16),
+    ("pair_idx", np.int16),
+    ("bin_idx", np.int32),
+    ("cpu_util", np.float32),
+    ("watts", np.float32),
+    ("joules_delta", np.float32),
+    ("capacity_j", np.float64),
+    ("lat", np.float64),
+    ("lon", np.float64),
+    ("alt", np.float32),
+])
+
+
+class TelemetryRecorder:
+    '''
+    Appends energy samples to a chunked columnar file. Samples are collected in a fixed size in-memory chunk,
+    full chunks are written by a background thread so recording never blocks on disk I/O.
+    '''
+
+    def __init__(self, path : str, chunk_rows : int = 4096, max_pending_chunks : int = 8):
+        '''
+        Initialize the TelemetryRecorder object and start its writer thread
+
+        :param path: Path of the file to create (overwritten if it exists)
+        :type: str
+        :param chunk_rows: Number of samples per chunk
+        :type: int
+        :param max_pending_chunks: Maximum number of full chunks waiting to be written, chunks are dropped when exceeded
+        :type: int
+        '''
+
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.dropped_chunks = 0
+
+        self._chunk = np.zeros(chunk_rows, dtype=SAMPLE_DTYPE)
+        self._chunk_len = 0
+        self._lock = threading.Lock()
+
+        self._file = open(path, 'wb')
+        schema = json.dumps({"columns": [[name, SAMPLE_DTYPE[name].str] for name in SAMPLE_DTYPE.names]}).encode()
+        self._file.write(MAGIC + struct.pack('<I', len(schema)) + schema)
+
+        self._write_queue : Queue = Queue(maxsize=max_pending_chunks)
+        self._writer = threading.Thread(target=self._write_loop, name="telemetry-recorder", daemon=True)
+        self._writer.start()
+
+    def record(self, timestamp : float, drone_idx : int, pair_idx : int, bin_idx : int, cpu_util : float, watts : float,
+               joules_delta : float, capacity_j : float, lat : Optional[float] = None, lon : Optional[float] = None, alt : Optional[float] = None):
+        '''
+        Record a single energy sample (safe to call from the MAVLink callback thread)
+
+        :param timestamp: Vehicle time (since boot) at the end of the sample in seconds
+        :type: float
+        :param drone_idx: Index of the drone
+        :type: int
+        :param pair_idx: Index of the pair used for the sample
+        :type: int
+        :param bin_idx: Index in the bin ordering of the pair
+        :type: int
+        :param cpu_util: Generated CPU utilization
+        :type: float
+        :param watts: Joules/second consumption
+        :type: float
+        :param joules_delta: Energy consumed since the previous sample
+        :type: float
+        :param capacity_j: Remaining battery capacity in Joules
+        :type: float
+        :param lat: Latitude of the vehicle (NaN if unknown)
+        :type: Optional[float]
+        :param lon: Longitude of the vehicle (NaN if unknown)
+        :type: Optional[float]
+        :param alt: Relative altitude of the vehicle (NaN if unknown)
+        :type: Optional[float]
+        '''
+        with self._lock:
+            self._chunk[self._chunk_len] = (timestamp, drone_idx, pair_idx, bin_idx, cpu_util, watts, joules_delta, capacity_j,
+                                            np.nan if lat is None else lat, np.nan if lon is None else lon, np.nan if alt is None else alt)
+            self._chunk_len += 1
+
+            if self._chunk_len == self.chunk_rows:
+                self._flush_chunk()
+
+    def close(self):
+        '''
+        Write the partial chunk, wait for the writer thread and close the file
+        '''
+        with self._lock:
+            if self._file is None:
+                return
+            if self._chunk_len > 0:
+                self._flush_chunk()
+
+        self._write_queue.put(None)
+        self._writer.join()
+        self._file.close()
+        self._file = None
+
+    def _flush_chunk(self):
+        '''
+        Hand the current chunk to the writer thread and start a new one (must hold the lock)
+        '''
+        try:
+            self._write_queue.put_nowait(self._chunk[:self._chunk_len])
+        except Full:
+            self.dropped_chunks += 1
+            print(f"Telemetry recorder is falling behind, dropped {self._chunk_len} samples")
+
+        self._chunk = np.zeros(self.chunk_rows, dtype=SAMPLE_DTYPE)
+        self._chunk_len = 0
+
+    def _write_loop(self):
+        while True:
+            chunk = self._write_queue.get()
+            if chunk is None:
+                return
+
+            self._file.write(struct.pack('<I', len(chunk)))
+            for name in SAMPLE_DTYPE.names:
+                self._file.write(np.ascontiguousarray(chunk[name]).tobytes())
+            self._file.flush()
+
+
+def read_telemetry(path : str) -> Dict[str, np.ndarray]:
+    '''
+    Load a file written by TelemetryRecorder as one array per column
+
+    :param path: Path of the recorded file
+    :type: str
+    :return: Arrays by column name
+    :rtype: Dict[str, np.ndarray]
+    '''
+    with open(path, 'rb') as telemetry_file:
+        with mmap.mmap(telemetry_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a telemetry recording")
+
+            offset = len(MAGIC)
+            schema_len, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            schema = json.loads(data[offset:offset + schema_len])
+            offset += schema_len
+
+            columns = [(name, np.dtype(dtype_str)) for name, dtype_str in schema["columns"]]
+            column_chunks : Dict[str, list] = {name: [] for name, _ in columns}
+
+            # A chunk cut short by a crash is ignored
+            while offset + 4 <= len(data):
+                row_count, = struct.unpack_from('<I', data, offset)
+                chunk_size = sum(row_count * dtype.itemsize for _, dtype in columns)
+                if offset + 4 + chunk_size > len(data):
+                    break
+                offset += 4
+
+                for name, dtype in columns:
+                    column_chunks[name].append(np.frombuffer(data, dtype=dtype, count=row_count, offset=offset).copy())
+                    offset += row_count * dtype.itemsize
+
+            return {name: np.concatenate(chunks) if len(chunks) > 0 else np.zeros(0, dtype=dtype)
+                    for (name, dtype), chunks in zip(columns, column_chunks.values())}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Summarizes a recorded telemetry file")
+    parser.add_argument("telemetry_path", type=str, help="The path of the file written by the telemetry recorder")
+
+    args = parser.parse_args()
+
+    telemetry = read_telemetry(args.telemetry_path)
+    print(f"{len(telemetry['timestamp'])} samples")
+
+    for drone_idx in np.unique(telemetry["drone_idx"]):
+        drone_mask = telemetry["drone_idx"] == drone_idx
+        duration = telemetry["timestamp"][drone_mask].max() - telemetry["timestamp"][drone_mask].min()
+        print(f"Drone {drone_idx}: {drone_mask.sum()} samples over {duration:.1f} s, "
+              f"{telemetry['joules_delta'][drone_mask].sum():.2f} J used, mean CPU {telemetry['cpu_util'][drone_mask].mean():.2f}%")
@@ -0,0 +1,303 @@
+import numpy as np
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+# Number of bins generated per refill of WorkloadGenerator.next_bin
+WORKLOAD_BLOCK_SIZE = 4096
+
+# Maximum number of runs generated at once (the estimate of the needed runs is capped to this)
+RUN_BLOCK_SIZE = 4096
+
+# Minimum number of runs generated at once, short requests still amortize the block setup
+MIN_RUN_BLOCK_SIZE = 64
+
+
+class WorkloadMode(Enum):
+    # Replay the recorded bin ordering of every pair, wrapping around at its end
+    TRACE = "trace"
+    # Generate bins from the Markov model of every pair (always used for pairs stored without a bin ordering)
+    MARKOV = "markov"
+
+
+@dataclass
+class WorkloadModel:
+    '''
+    Run level Markov chain of a pair's CPU bin ordering. The ordering is split into runs of the same bin,
+    the bin of the next run depends on the bin of the current one and the length of every run (dwell time)
+    is drawn from the dwell times observed for its bin.
+    '''
+
+    # Number of transitions from the run bin (row) to the next run bin (column)
+    transition_counts : np.ndarray
+
+    # Observed dwell times as (bin, dwell time in seconds, number of runs) rows, sorted by bin and dwell time
+    dwell_counts : np.ndarray
+
+    # Length in seconds of the ordering the model was fitted on (pairs are cycled after this many steps)
+    length : int
+
+    # Inverse cumulative distributions as lookup tables, one entry per counted run: entry floor(u * total) of a table
+    # is the value bisect would find for the uniform u in the cumulative counts, so a block is drawn with one gather.
+    # The first run bin is drawn from initial_table (bins weighted by their number of runs)
+    initial_table : np.ndarray = field(init=False, repr=False)
+
+    # Next run bins of every run bin, starting at transition_offsets[bin] (transition_totals[bin] entries).
+    # A trailing 0 keeps the indices of bins without transitions (never reached) in range
+    transition_table : np.ndarray = field(init=False, repr=False)
+    transition_offsets : np.ndarray = field(init=False, repr=False)
+    transition_totals : np.ndarray = field(init=False, repr=False)
+
+    # Observed dwell times of every bin (in dwell_counts order), starting at dwell_offsets[bin] (dwell_totals[bin] entries)
+    dwell_table : np.ndarray = field(init=False, repr=False)
+    dwell_offsets : np.ndarray = field(init=False, repr=False)
+    dwell_totals : np.ndarray = field(init=False, repr=False)
+
+    # Mean dwell time over every run, used to estimate the number of runs to generate
+    mean_dwell : float = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.transition_counts = np.asarray(self.transition_counts, dtype=np.int64)
+        if self.transition_counts.ndim != 2:
+            self.transition_counts = self.transition_counts.reshape(0, 0)
+        self.dwell_counts = np.asarray(self.dwell_counts, dtype=np.int64).reshape(-1, 3)
+        self.length = int(self.length)
+
+        # Rows are sorted by bin, so the runs of every bin are a contiguous slice of the tables
+        dwell_bins = self.dwell_counts[:, 0]
+        self.initial_table = np.repeat(dwell_bins, self.dwell_counts[:, 2])
+        self.dwell_table = np.repeat(self.dwell_counts[:, 1], self.dwell_counts[:, 2])
+        self.dwell_totals = np.bincount(dwell_bins, weights=self.dwell_counts[:, 2], minlength=self.bin_count).astype(np.int64)
+        self.dwell_offsets = np.cumsum(self.dwell_totals) - self.dwell_totals
+
+        self.transition_totals = self.transition_counts.sum(axis=1)
+        self.transition_offsets = np.cumsum(self.transition_totals) - self.transition_totals
+        next_bins = np.tile(np.arange(self.bin_count), self.bin_count)
+        self.transition_table = np.append(np.repeat(next_bins, self.transition_counts.ravel()), 0)
+
+        run_count = self.dwell_counts[:, 2].sum()
+        self.mean_dwell = float((self.dwell_counts[:, 1] * self.dwell_counts[:, 2]).sum() / run_count) if run_count > 0 else 1.0
+
+    @property
+    def bin_count(self) -> int:
+        return len(self.transition_counts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        '''
+        JSON representation of the model (the "workload_model" entry of a pair in the simulation data JSON)
+
+        :return: Model dictionary
+        :rtype: Dict[str, Any]
+        '''
+        return {
+            "transition_counts": self.transition_counts.tolist(),
+            "dwell_counts": self.dwell_counts.tolist(),
+            "length": self.length,
+        }
+
+    @classmethod
+    def from_dict(cls, model_dict : Dict[str, Any]) -> 'WorkloadModel':
+        '''
+        Create a model from its JSON representation (see to_dict)
+
+        :param model_dict: Model dictionary
+        :type: Dict[str, Any]
+        :return: Workload model
+        :rtype: WorkloadModel
+        '''
+        return cls(model_dict["transition_counts"], model_dict["dwell_counts"], model_dict["length"])
+
+
+def encode_runs(bin_ordering : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Run length encode a bin ordering
+
+    :param bin_ordering: Per-second CPU bin index
+    :type: np.ndarray
+    :return: Bin and length of every run
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    '''
+    bin_ordering = np.asarray(bin_ordering)
+    if len(bin_ordering) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(bin_ordering)) + 1))
+    run_lengths = np.diff(np.append(run_starts, len(bin_ordering)))
+    return bin_ordering[run_starts].astype(np.int64), run_lengths.astype(np.int64)
+
+
+def fit_workload_model(bin_ordering : np.ndarray, bin_count : int) -> WorkloadModel:
+    '''
+    Fit the run level Markov chain of a bin ordering. The ordering is treated as cyclic (it wraps around when
+    replayed), so the last run transitions to the first one.
+
+    :param bin_ordering: Per-second CPU bin index
+    :type: np.ndarray
+    :param bin_count: Number of CPU bins of the pair
+    :type: int
+    :return: Fitted model
+    :rtype: WorkloadModel
+    '''
+    run_bins, run_lengths = encode_runs(bin_ordering)
+    bin_count = max(bin_count, int(run_bins.max()) + 1 if len(run_bins) > 0 else 0)
+
+    transition_counts = np.zeros((bin_count, bin_count), dtype=np.int64)
+    if len(run_bins) > 1:
+        np.add.at(transition_counts, (run_bins, np.roll(run_bins, -1)), 1)
+        # First and last runs of the same bin merge when the ordering wraps around, that is not a transition
+        if run_bins[0] == run_bins[-1]:
+            transition_counts[run_bins[-1], run_bins[0]] -= 1
+
+    # Bins without an outgoing transition (a single run in the whole ordering) stay in the same bin
+    for run_bin in np.unique(run_bins):
+        if transition_counts[run_bin].sum() == 0:
+            transition_counts[run_bin, run_bin] = 1
+
+    # Unique (bin, dwell time) rows are sorted by bin, then by dwell time
+    dwell_keys, dwell_run_counts = np.unique(np.stack([run_bins, run_lengths], axis=1), axis=0, return_counts=True)
+    dwell_counts = np.column_stack([dwell_keys, dwell_run_counts]) if len(run_bins) > 0 else np.zeros((0, 3), dtype=np.int64)
+
+    return WorkloadModel(transition_counts, dwell_counts, len(bin_ordering))
+
+
+def _table_index(uniforms : np.ndarray, totals : np.ndarray) -> np.ndarray:
+    '''
+    Index in a lookup table of totals entries for every uniform (uniforms close to 1 can round up to totals)
+    '''
+    return np.minimum((uniforms * totals).astype(np.int64), totals - 1)
+
+
+class WorkloadGenerator:
+    '''
+    Endless stream of CPU bins generated from a WorkloadModel in blocks of runs drawn with NumPy. Only the bin of the
+    last generated run and the seconds generated past the previous request are kept between calls, so the memory
+    does not depend on the number of generated bins.
+    '''
+
+    def __init__(self, model : WorkloadModel, rng : np.random.Generator, block_size : int = WORKLOAD_BLOCK_SIZE):
+        '''
+        Initialize the WorkloadGenerator object
+
+        :param model: Model to generate bins from
+        :type: WorkloadModel
+        :param rng: Random generator used for the transitions and dwell times
+        :type: np.random.Generator
+        :param block_size: Number of bins generated per refill of next_bin
+        :type: int
+        '''
+        self.model = model
+        self.rng = rng
+        self.block_size = block_size
+
+        # Bin of the last generated run (None before the first run) and the generated seconds not returned yet
+        self._run_bin : Optional[int] = None
+        self._pending = np.zeros(0, dtype=np.int64)
+
+        self._block : List[int] = []
+        self._block_idx = 0
+
+    def _walk(self, start_bin : int, uniforms : np.ndarray) -> np.ndarray:
+        '''
+        Bins of the runs following a run of start_bin. Every uniform selects a transition function (the next bin for every
+        current bin), the functions are composed pairwise in a tree and the bin before every subtree is then resolved from
+        the root down, so the walk takes 2 * log2(runs) vectorized steps instead of one Python step per run.
+
+        :param start_bin: Bin of the run before the first generated one
+        :type: int
+        :param uniforms: One uniform per generated run
+        :type: np.ndarray
+        :return: Bin of every generated run
+        :rtype: np.ndarray
+        '''
+        model = self.model
+        run_count = len(uniforms)
+        if run_count == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # steps[i, b] is the bin of run i after a run of bin b (columns of bins without transitions are never reached),
+        # padded to a power of two with identity functions
+        padded_count = 1 << (run_count - 1).bit_length()
+        steps = np.tile(np.arange(model.bin_count, dtype=np.int64), (padded_count, 1))
+        steps[:run_count] = model.transition_table[model.transition_offsets + _table_index(uniforms[:, None], model.transition_totals)]
+
+        # levels[l][k] is the composition of the functions of runs k * 2^l to (k + 1) * 2^l - 1 (flat indices into
+        # contiguous tables are faster than two dimensional fancy indexing)
+        bin_count = model.bin_count
+        levels = [steps]
+        while len(levels[-1]) > 1:
+            functions = levels[-1]
+            pair_count = len(functions) // 2
+            second_rows = (np.arange(pair_count) * (2 * bin_count) + bin_count)[:, None]
+            levels.append(functions.ravel()[functions[0::2] + second_rows])
+
+        # Bin before every subtree, from the root (before the first run) down to the single runs
+        before = np.array([start_bin], dtype=np.int64)
+        for functions in reversed(levels[:-1]):
+            first_rows = np.arange(len(before)) * (2 * bin_count)
+            before = np.stack([before, functions.ravel()[first_rows + before]], axis=1).ravel()
+
+        return steps.ravel()[np.arange(run_count) * bin_count + before[:run_count]]
+
+    def _generate_runs(self, run_count : int) -> np.ndarray:
+        '''
+        Generate the next runs of the chain
+
+        :param run_count: Number of runs
+        :type: int
+        :return: CPU bin for every second of the runs
+        :rtype: np.ndarray
+        '''
+        model = self.model
+        uniforms = self.rng.random(2 * run_count)
+        transition_uniforms, dwell_uniforms = uniforms[:run_count], uniforms[run_count:]
+
+        if self._run_bin is None:
+            first_bin = int(model.initial_table[_table_index(transition_uniforms[0], len(model.initial_table))])
+            run_bins = np.concatenate(([first_bin], self._walk(first_bin, transition_uniforms[1:])))
+        else:
+            run_bins = self._walk(self._run_bin, transition_uniforms)
+        self._run_bin = int(run_bins[-1])
+
+        dwells = model.dwell_table[model.dwell_offsets[run_bins] + _table_index(dwell_uniforms, model.dwell_totals[run_bins])]
+        return np.repeat(run_bins, dwells)
+
+    def generate(self, count : int) -> np.ndarray:
+        '''
+        Generate the next bins of the stream
+
+        :param count: Number of bins (seconds) to generate
+        :type: int
+        :return: CPU bin for every second
+        :rtype: np.ndarray
+        '''
+        model = self.model
+        if count <= 0 or model.bin_count == 0 or model.length == 0:
+            return np.zeros(max(count, 0), dtype=np.int64)
+
+        blocks = [self._pending]
+        total = len(self._pending)
+
+        while total < count:
+            # Slightly more runs than expected to be needed, the rest of the last block is returned by the next call
+            run_count = int(min(max((count - total) / model.mean_dwell * 1.1 + 1, MIN_RUN_BLOCK_SIZE), RUN_BLOCK_SIZE))
+            block = self._generate_runs(run_count)
+            blocks.append(block)
+            total += len(block)
+
+        bins = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+        self._pending = bins[count:].copy()
+        return bins[:count]
+
+    def next_bin(self) -> int:
+        '''
+        Next bin of the stream (generated in blocks)
+
+        :return: CPU bin of the next second
+        :rtype: int
+        '''
+        if self._block_idx == len(self._block):
+            self._block = self.generate(self.block_size).tolist()
+            self._block_idx = 0
+        value = self._block[self._block_idx]
+        self._block_idx += 1
+        return value
@@ -0,0 +1,188 @@
+#! /usr/bin/env python3.9
+
+import argparse
+import math
+import os
+import xml.etree.ElementTree as ET
+from typing import List, Tuple
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Hand written three drone world and the drone model every generated model is derived from
+TEMPLATE_WORLD_PATH = os.path.join(PROJECT_DIR, "worlds", "river.world")
+TEMPLATE_MODEL_DIR = os.path.join(PROJECT_DIR, "models", "drone1_with_camera")
+
+# Generated models and worlds (added to GAZEBO_MODEL_PATH by launch/river_headless.launch)
+DEFAULT_OUTPUT_DIR = os.path.join(PROJECT_DIR, "generated")
+
+# ArduPilot SITL instance -I<idx> talks to the Gazebo plugin on these ports (same stride as the MAVLink ports)
+FDM_BASE_PORT = 9002
+PORT_STRIDE = 10
+
+# Drones are placed on a grid starting at the position of the first hand placed drone (drone1_with_camera in river.world).
+# Columns grow towards +x and rows towards -y, away from the Jackal UGV spawned at (43, -6) by launch/river_headless.launch
+GRID_ORIGIN = (38.0, -10.0, 12.5)
+GRID_SPACING_M = 2.5
+
+
+def fdm_ports(drone_idx : int) -> Tuple[int, int]:
+    '''
+    Ports of the ArduPilot Gazebo plugin of a drone (SITL instance -I<drone_idx>)
+
+    :param drone_idx: Index of the drone
+    :type: int
+    :return: fdm_port_in and fdm_port_out
+    :rtype: Tuple[int, int]
+    '''
+    port_in = FDM_BASE_PORT + PORT_STRIDE * drone_idx
+    return port_in, port_in + 1
+
+
+def drone_model_name(drone_idx : int, camera : bool) -> str:
+    '''
+    Name of the model of a drone (drone numbers start at 1, like the hand written models)
+
+    :param drone_idx: Index of the drone
+    :type: int
+    :param camera: Whether the model has the camera sensor
+    :type: bool
+    :return: Model name
+    :rtype: str
+    '''
+    return f"drone{drone_idx + 1}_with_camera" if camera else f"drone{drone_idx + 1}"
+
+
+def drone_pose(drone_idx : int, num_drones : int) -> Tuple[float, float, float]:
+    '''
+    Spawn position of a drone on a square grid (rows towards -y, so no drone spawns on the Jackal)
+
+    :param drone_idx: Index of the drone
+    :type: int
+    :param num_drones: Number of drones in the world
+    :type: int
+    :return: x, y and z in meters
+    :rtype: Tuple[float, float, float]
+    '''
+    cols = math.ceil(math.sqrt(num_drones))
+    return (GRID_ORIGIN[0] + GRID_SPACING_M * (drone_idx % cols), GRID_ORIGIN[1] - GRID_SPACING_M * (drone_idx // cols), GRID_ORIGIN[2])
+
+
+def _parse(path : str) -> ET.ElementTree:
+    # Comments (e.g. the alternative physics settings) are kept in the generated files
+    return ET.parse(path, parser=ET.XMLParser(target=ET.TreeBuilder(insert_comments=True)))
+
+
+def generate_model(drone_idx : int, camera : bool, output_dir : str, template_dir : str = TEMPLATE_MODEL_DIR) -> str:
+    '''
+    Write the model of a drone: the template model with its own name and plugin ports, optionally without the camera
+
+    :param drone_idx: Index of the drone
+    :type: int
+    :param camera: Keep the camera sensor (rendered by Gazebo even without a GUI)
+    :type: bool
+    :param output_dir: Directory the model directory is created in
+    :type: str
+    :param template_dir: Model directory the drone is derived from
+    :type: str
+    :return: Name of the model
+    :rtype: str
+    '''
+    name = drone_model_name(drone_idx, camera)
+    model_dir = os.path.join(output_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+
+    sdf = _parse(os.path.join(template_dir, "model.sdf"))
+    model = sdf.getroot().find("model")
+    model.set("name", name)
+
+    if not camera:
+        for link in model.findall("link"):
+            if link.find("sensor[@type='camera']") is not None:
+                model.remove(link)
+                for joint in model.findall("joint"):
+                    if joint.findtext("child") == link.get("name"):
+                        model.remove(joint)
+
+    port_in, port_out = fdm_ports(drone_idx)
+    plugin = model.find("plugin[@name='arducopter_plugin']")
+    plugin.find("fdm_port_in").text = str(port_in)
+    plugin.find("fdm_port_out").text = str(port_out)
+    sdf.write(os.path.join(model_dir, "model.sdf"), encoding="unicode", xml_declaration=True)
+
+    config = _parse(os.path.join(template_dir, "model.config"))
+    config.getroot().find("name").text = name
+    if not camera:
+        config.getroot().find("description").text = "A copy of the 3DR Iris model without the camera sensor"
+    config.write(os.path.join(model_dir, "model.config"), encoding="unicode", xml_declaration=True)
+
+    return name
+
+
+def generate_world(model_names : List[str], output_path : str, template_path : str = TEMPLATE_WORLD_PATH):
+    '''
+    Write the river world with the given drone models instead of the three hand placed drones
+
+    :param model_names: Model of every drone (in drone index order)
+    :type: List[str]
+    :param output_path: Path of the world file
+    :type: str
+    :param template_path: World the terrain, lighting and physics are taken from
+    :type: str
+    '''
+    world_tree = _parse(template_path)
+    world = world_tree.getroot().find("world")
+
+    # Drop the hand placed drones, the terrain and the other models stay
+    drone_models = [model for model in world.findall("model") if model.get("name").startswith("drone")]
+    insert_idx = list(world).index(drone_models[0]) if len(drone_models) > 0 else len(world)
+    for model in drone_models:
+        world.remove(model)
+
+    for drone_idx, name in enumerate(model_names):
+        model = ET.Element("model", name=name)
+        x, y, z = drone_pose(drone_idx, len(model_names))
+        ET.SubElement(model, "pose").text = f"{x:g} {y:g} {z:g} 0 0 0"
+        include = ET.SubElement(model, "include")
+        ET.SubElement(include, "uri").text = f"model://{name}"
+        # Where the hand placed drones were (after the sun, before the ocean and terrain)
+        world.insert(insert_idx + drone_idx, model)
+
+    ET.indent(world_tree, space="  ")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    world_tree.write(output_path, encoding="unicode", xml_declaration=True)
+
+
+def generate(num_drones : int, camera : bool, output_dir : str = DEFAULT_OUTPUT_DIR) -> str:
+    '''
+    Generate the models and the world of an N drone simulation
+
+    :param num_drones: Number of drones
+    :type: int
+    :param camera: Keep the camera sensor of every drone
+    :type: bool
+    :param output_dir: Directory the models (models/) and the world (worlds/) are written to
+    :type: str
+    :return: Path of the world file
+    :rtype: str
+    '''
+    model_names = [generate_model(drone_idx, camera, os.path.join(output_dir, "models")) for drone_idx in range(num_drones)]
+    world_path = os.path.join(output_dir, "worlds", f"river_{num_drones}{'' if camera else '_no_camera'}.world")
+    generate_world(model_names, world_path)
+    return world_path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generates the river world and port consistent drone models for N drones")
+    parser.add_argument("num_drones", type=int, help="Number of drones (SITL instances -I0 to -I<num_drones - 1>)")
+    parser.add_argument("--no-camera", action="store_true", help="Drop the camera sensor of every drone (no rendering needed)")
+    parser.add_argument("--output-dir", type=str, default=DEFAULT_OUTPUT_DIR, help="Directory the models/ and worlds/ are written to (defaults to generated/)")
+
+    args = parser.parse_args()
+
+    if args.num_drones <= 0:
+        print("Number of drones must be positive!")
+        exit(1)
+
+    world_path = generate(args.num_drones, not args.no_camera, args.output_dir)
+    print(f"Generated {args.num_drones} drone models in {os.path.join(args.output_dir, 'models')} and {world_path}")
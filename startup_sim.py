@@ -1,15 +1,25 @@
+import argparse
 import os
+import signal
+import subprocess
 import sys
+import time
 
-if __name__ == "__main__":
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
 
-    args = sys.argv[1:]
+from world_generator import generate
+
+# Working directories (eeprom, logs) and console output of the headless SITL instances
+SITL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sitl")
 
-    if len(args) != 1:
-        print("Usage: python startup_sim.py <num_drones>")
-        exit(1)
 
-    num_drones = int(args[0])
+def start_gui(num_drones : int):
+    '''
+    Start Gazebo with its GUI (river.world, three drones) and every SITL instance in a labeled terminal window
+    '''
+    if num_drones > 3:
+        print(f"river.world only contains 3 drones, use --headless to generate a world with {num_drones} drones")
+
     if os.system("gnome-terminal -- roslaunch league_sim river.launch") != 0:
         print("Error launching river.launch")
         exit(1)
@@ -19,6 +29,87 @@ if __name__ == "__main__":
             print("Error launching sim_vehicle.py for drone " + str(i))
             exit(1)
 
-    
 
-    
\ No newline at end of file
+def start_headless(num_drones : int, camera : bool, no_rebuild : bool, stagger_s : float, jackal : bool):
+    '''
+    Generate the N drone world, start gzserver without a GUI and every SITL instance in the background
+    (output in sitl/drone_<idx>/console.log). Waits until interrupted, then stops every process.
+    '''
+    world_path = generate(num_drones, camera)
+    print(f"Generated {world_path}")
+
+    processes = []
+    os.makedirs(SITL_DIR, exist_ok=True)
+
+    def stop_processes(exit_code : int):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        exit(exit_code)
+
+    def stop_signal_handler(signum, frame):
+        print("Stopping every simulator process...")
+        stop_processes(0)
+
+    signal.signal(signal.SIGINT, stop_signal_handler)
+    signal.signal(signal.SIGTERM, stop_signal_handler)
+
+    gazebo_log = open(os.path.join(SITL_DIR, "gazebo.log"), 'w')
+    processes.append(subprocess.Popen(["roslaunch", "league_sim", "river_headless.launch", f"num_drones:={num_drones}",
+                                       f"camera:={str(camera).lower()}", f"jackal:={str(jackal).lower()}"],
+                                      stdout=gazebo_log, stderr=subprocess.STDOUT))
+
+    for i in range(num_drones):
+        # Separate working directories, instances would share eeprom.bin and logs otherwise
+        drone_dir = os.path.join(SITL_DIR, f"drone_{i}")
+        os.makedirs(drone_dir, exist_ok=True)
+
+        command = ["sim_vehicle.py", "-v", "ArduCopter", "-f", "gazebo-iris", f"-I{i}", "--use-dir", drone_dir,
+                   "--mavproxy-args=--daemon --non-interactive"]
+        if no_rebuild:
+            command.append("--no-rebuild")
+
+        console_log = open(os.path.join(drone_dir, "console.log"), 'w')
+        try:
+            processes.append(subprocess.Popen(command, stdout=console_log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL))
+        except OSError as e:
+            print(f"Error launching sim_vehicle.py for drone {i}: {e}")
+            stop_processes(1)
+        print(f"Drone {i}: MAVLink on 127.0.0.1:{14550 + 10 * i}, console in {drone_dir}/console.log")
+
+        # Gazebo and the previous instances get to start before the next one competes for the CPU
+        time.sleep(stagger_s)
+
+    print("All vehicles started, press Ctrl+C to stop them")
+    while all(process.poll() is None for process in processes):
+        time.sleep(1)
+
+    print("A simulator process exited, stopping the others")
+    stop_processes(1)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Starts Gazebo and one ArduPilot SITL instance per drone")
+    parser.add_argument("num_drones", type=int, help="Number of drones (SITL instances -I0 to -I<num_drones - 1>)")
+    parser.add_argument("--headless", action="store_true", help="Generate an N drone world (src/world_generator.py) and run gzserver and SITL without any GUI or terminal windows")
+    parser.add_argument("--camera", action="store_true", help="Keep the camera sensor of every drone in headless mode (rendered off-screen)")
+    parser.add_argument("--no-rebuild", action="store_true", help="Do not rebuild ArduCopter for every instance in headless mode (build it once beforehand)")
+    parser.add_argument("--stagger", type=float, default=2, help="Seconds between two SITL instance starts in headless mode")
+    parser.add_argument("--no-jackal", action="store_true", help="Do not spawn the Jackal UGV in headless mode")
+
+    args = parser.parse_args()
+
+    if args.num_drones <= 0:
+        print("Number of drones must be positive!")
+        exit(1)
+
+    if args.headless:
+        start_headless(args.num_drones, args.camera, args.no_rebuild, args.stagger, not args.no_jackal)
+    else:
+        start_gui(args.num_drones)